@@ -0,0 +1,8 @@
+"""Sweep file to run an input file for several temperatures and widths, for instance as:
+freepaths simple_nanowire.py --sweep sweep_temperature_and_width.py
+Specific heat capacity depends on temperature, so they are swept together"""
+
+SWEEP = {
+    ("T", "SPECIFIC_HEAT_CAPACITY"): [(4, 0.0176), (10, 0.275), (300, 714)],
+    "WIDTH": [200e-9, 500e-9],
+}
@@ -2,8 +2,7 @@
 
 import argparse
 
-import freepaths.main_tracing
-import freepaths.main_mfp_sampling
+from freepaths.config import Config
 
 __version__ = "1.4"
 
@@ -15,15 +14,38 @@ parser = argparse.ArgumentParser(
                 )
 parser.add_argument('input_file', nargs='?', default=None, help='The input file')
 parser.add_argument("-s", "--sampling", help="Run in MFP sampling mode", action="store_true")
-args = parser.parse_args()
+parser.add_argument("-r", "--resume", help="Continue the simulation from the last checkpoint", action="store_true")
+parser.add_argument("-f", "--force", help="Recompute the results even if they are in the cache", action="store_true")
+parser.add_argument("--clear-cache", help="Delete all the cached results and exit", action="store_true")
+parser.add_argument("--sweep", metavar="SWEEP_FILE", help="Run the input file for all parameter values in the sweep file")
 
 
 def run():
-    """Run the program depending on the mode"""
-    if args.sampling:
-        freepaths.main_mfp_sampling.main(args.input_file)
+    """Read the input file and run the program depending on the mode"""
+    args = parser.parse_args()
+
+    if args.clear_cache:
+        from freepaths.cache import clear_cache
+        clear_cache()
+        return
+
+    # If a file is provided, overwrite the default values:
+    if args.input_file:
+        cf = Config.from_file(args.input_file)
+    else:
+        print("You didn't provide any input file, so let's run a demo simulation!\n")
+        cf = Config.from_dict()
+
+    # Import only the selected mode to start faster:
+    if args.sweep:
+        from freepaths import sweep
+        sweep.main(cf, args.input_file, args.sweep, args.sampling)
+    elif args.sampling:
+        from freepaths import main_mfp_sampling
+        main_mfp_sampling.main(cf, args.input_file, args.force)
     else:
-        freepaths.main_tracing.main(args.input_file)
+        from freepaths import main_tracing
+        main_tracing.main(cf, args.input_file, args.resume, args.force)
 
 
 if __name__ == "__main__":
@@ -7,22 +7,17 @@ import imageio
 import numpy as np
 import matplotlib.pyplot as plt
 
-from freepaths.config import cf
+from freepaths.data import read_phonon_paths
 from freepaths.output_structure import draw_structure
 
 
-def generate_frames_xy():
+def generate_frames_xy(cf):
     """Generate animation frames with phonon paths"""
 
-    data = np.genfromtxt("Data/Phonon paths.csv",
-                         unpack=False,
-                         delimiter=',',
-                         skip_header=1,
-                         encoding='utf-8')
+    paths = read_phonon_paths()
 
     # Create XY plots for each timestep where all phonon shown at the same time:
-    number_of_steps = np.shape(data)[0]
-    number_of_phonons = np.shape(data)[1]//3
+    number_of_steps = max([path.shape[0] for path in paths], default=0)
 
     for step in range(1, number_of_steps):
         fig, ax = plt.subplots()
@@ -33,10 +28,8 @@ def generate_frames_xy():
             ax.add_patch(patch)
 
         # Draw the paths:
-        for phonon_num in range(number_of_phonons):
-            x_coords = np.trim_zeros(data[:, 3 * phonon_num], trim='b')
-            y_coords = np.trim_zeros(data[:, 3 * phonon_num + 1], trim='b')
-            ax.plot(x_coords[:step], y_coords[:step], linewidth=0.5)
+        for path in paths:
+            ax.plot(path[:step, 0], path[:step, 1], linewidth=0.5)
 
         # Plot settings:
         ax.set_xlim([-0.55*cf.width*1e6, 0.55*cf.width*1e6])
@@ -54,10 +47,9 @@ def generate_frames_xy():
     # Create XY plots for each step for each phonon one by one:
     # cmap = plt.get_cmap("tab10")
     # frame_number = 0
-    # number_of_phonons = np.shape(data)[1]//3
-    # for phonon_num in range(number_of_phonons):
-        # x_coords = np.trim_zeros(data[:, 3 * phonon_num], trim='b')
-        # y_coords = np.trim_zeros(data[:, 3 * phonon_num + 1], trim='b')
+    # for phonon_num, path in enumerate(paths):
+        # x_coords = path[:, 0]
+        # y_coords = path[:, 1]
         # steps = np.shape(x_coords)[0]
         # for step in range(1, steps):
             # fig, ax = plt.subplots()
@@ -73,7 +65,7 @@ def generate_frames_xy():
             # frame_number += 1
 
 
-def generate_animation_xy():
+def generate_animation_xy(cf):
     """Generate animation of phonon path in XY plane"""
     sys.stdout.write(f"\rAnimation: creating animation file")
     images = []
@@ -99,8 +91,8 @@ def delete_frames():
     shutil.rmtree(folder_path)
 
 
-def create_animation():
+def create_animation(cf):
     """Main function that creates the animation"""
-    generate_frames_xy()
-    generate_animation_xy()
+    generate_frames_xy(cf)
+    generate_animation_xy(cf)
     # delete_frames()
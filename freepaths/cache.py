@@ -0,0 +1,151 @@
+"""Module that stores results of simulations and reuses them when the same simulation is run again"""
+
+import os
+import enum
+import glob
+import pickle
+import hashlib
+import numpy as np
+
+from freepaths.checkpoint import restore_accumulators, write_snapshot
+
+
+# Parameters that do not change the simulated data:
+IGNORED_PARAMETERS = [
+    "output_folder_name",
+    "plots_in_terminal",
+    "output_structure_color",
+    "output_animation_fps",
+    "checkpoint_every_n_phonons",
+    "checkpoint_every_n_minutes",
+    "use_memory_mapped_maps",
+    "use_result_cache",
+    "result_cache_size_limit",
+    "output_stage_profile",
+    "number_of_processes",
+]
+
+
+# Parameters that are names of files, whose content also changes the simulated data:
+DATA_FILE_PARAMETERS = [
+    "custom_dispersion_file",
+    "custom_relaxation_time_file",
+]
+
+
+def canonical_value(value):
+    """Convert a parameter into a form whose representation is unique and stable between runs"""
+    if isinstance(value, np.ndarray):
+        return (value.dtype.str, value.shape, value.tobytes())
+    if isinstance(value, enum.Enum):
+        return value.name
+    if isinstance(value, (list, tuple)):
+        return [canonical_value(element) for element in value]
+    if isinstance(value, dict):
+        return sorted((key, canonical_value(element)) for key, element in value.items())
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def code_version():
+    """Hash of the source code of the program, so that any change of the code invalidates the cache"""
+    sha = hashlib.sha256()
+    for filename in sorted(glob.glob(os.path.join(os.path.dirname(__file__), "*.py"))):
+        with open(filename, "rb") as file:
+            sha.update(file.read())
+    return sha.hexdigest()
+
+
+def configuration_hash(cf, mode, ignored_parameters=()):
+    """Calculate the hash of all parameters of the simulation, including the random seed, code version,
+    and content of data files. Some parameters can be additionally ignored if they do not affect this mode"""
+    parameters = sorted((name, canonical_value(value)) for name, value in vars(cf).items()
+                        if name not in IGNORED_PARAMETERS and name not in ignored_parameters)
+    sha = hashlib.sha256()
+    sha.update(mode.encode("utf-8"))
+    sha.update(code_version().encode("utf-8"))
+    sha.update(repr(parameters).encode("utf-8"))
+    for name in DATA_FILE_PARAMETERS:
+        if getattr(cf, name, None) is not None:
+            with open(getattr(cf, name), "rb") as file:
+                sha.update(file.read())
+    return sha.hexdigest()
+
+
+def is_cache_enabled(cf):
+    """Check if the results of this simulation can be cached. Simulations without RANDOM_SEED are
+    independent samples, so a new run should trace new phonons instead of repeating the previous ones"""
+    return cf.use_result_cache and cf.random_seed is not None
+
+
+def load_cached_results(filename, accumulators):
+    """Restore the accumulated data from the cache, return False if these results were never cached"""
+    # Other simulations may trim the cache at any moment, so the file can disappear before it is opened:
+    try:
+        with open(filename, "rb") as file:
+            saved_accumulators = pickle.load(file)
+    except FileNotFoundError:
+        return False
+    restore_accumulators(accumulators, saved_accumulators)
+
+    # Recently used results are deleted last when the cache is trimmed:
+    try:
+        os.utime(filename)
+    except FileNotFoundError:
+        pass
+    return True
+
+
+def save_results_to_cache(writer, filename, accumulators, size_limit=None):
+    """Take a snapshot of the accumulated data and write it into the cache in the background,
+    then trim the cache to the size limit in MB"""
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    snapshot = pickle.dumps(accumulators, protocol=pickle.HIGHEST_PROTOCOL)
+    writer.submit(write_snapshot, filename, snapshot)
+    if size_limit is not None:
+        writer.submit(trim_cache, os.path.dirname(filename), size_limit)
+
+
+def trim_cache(folder, size_limit):
+    """Delete the least recently used results until the cache is smaller than the size limit in MB.
+    The latest results are always kept. Simulations of a sweep trim the same cache at the same time,
+    so files deleted by another simulation are skipped"""
+    files = []
+    for filename in glob.glob(os.path.join(folder, "*.pickle")):
+        try:
+            files.append((os.path.getmtime(filename), os.path.getsize(filename), filename))
+        except FileNotFoundError:
+            continue
+    files.sort()
+    total_size = sum(size for _, size, _ in files)
+    for _, size, filename in files[:-1]:
+        if total_size <= size_limit * 1024**2:
+            break
+        try:
+            os.remove(filename)
+        except FileNotFoundError:
+            pass
+        total_size -= size
+
+
+def clear_cache(folder="Results/Cache"):
+    """Delete all the cached results, skipping files that are deleted by running simulations at the same time"""
+    if not os.path.exists(folder):
+        print("The cache is already empty.")
+        return
+    size = 0
+    for filename in glob.glob(os.path.join(folder, "*")):
+        try:
+            file_size = os.path.getsize(filename)
+            os.remove(filename)
+        except FileNotFoundError:
+            continue
+        size += file_size
+
+    # The folder stays if a running simulation has just added new results:
+    try:
+        os.rmdir(folder)
+    except OSError:
+        pass
+    print(f"The cache was cleared, {size / 1024**2:.1f} MB were freed.")
@@ -0,0 +1,88 @@
+"""Module that saves and restores the state of the simulation to continue it after an interruption"""
+
+import os
+import time
+import random
+import pickle
+import numpy as np
+
+
+FILENAME = "Data/Checkpoint.pickle"
+
+
+class Checkpoint:
+    """Periodic snapshots of all accumulated data and of the random number generator"""
+
+    def __init__(self, cf):
+        """Start counting time until the next checkpoint"""
+        self.cf = cf
+        self.time_of_last_save = time.time()
+
+    def is_due(self, number_of_finished_phonons):
+        """Check if enough phonons were traced or enough time passed since the last checkpoint"""
+        every_n_phonons = self.cf.checkpoint_every_n_phonons
+        every_n_minutes = self.cf.checkpoint_every_n_minutes
+        if every_n_phonons and number_of_finished_phonons % every_n_phonons == 0:
+            return True
+        if every_n_minutes and time.time() - self.time_of_last_save >= 60 * every_n_minutes:
+            return True
+        return False
+
+    def save(self, writer, number_of_finished_phonons, accumulators):
+        """Take a snapshot of the current state and write it into the file in the background"""
+        state = {
+            "number_of_finished_phonons": number_of_finished_phonons,
+            "random_state": random.getstate(),
+            "accumulators": accumulators,
+        }
+        snapshot = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        writer.submit(write_snapshot, FILENAME, snapshot)
+        self.time_of_last_save = time.time()
+
+
+def write_snapshot(filename, snapshot):
+    """Write the snapshot into a temporary file and then replace the previous file,
+    so that an interruption during writing never leaves a broken file"""
+    with open(filename + ".tmp", "wb") as file:
+        file.write(snapshot)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(filename + ".tmp", filename)
+
+
+def load_checkpoint(accumulators):
+    """Restore the accumulated data and the random number generator from the last checkpoint
+    and return the number of phonons that were already traced"""
+    if not os.path.exists(FILENAME):
+        print("WARNING: No checkpoint was found, so the simulation starts from the beginning.\n")
+        return 0
+
+    with open(FILENAME, "rb") as file:
+        state = pickle.load(file)
+    random.setstate(state["random_state"])
+
+    restore_accumulators(accumulators, state["accumulators"])
+
+    number_of_finished_phonons = state["number_of_finished_phonons"]
+    print(f"Resuming from the checkpoint after {number_of_finished_phonons} phonons.\n")
+    return number_of_finished_phonons
+
+
+def restore_accumulators(accumulators, saved_accumulators):
+    """Copy the saved data into existing objects, arrays are copied in place to keep memory maps.
+    The configuration of the current run is kept"""
+    for name, accumulator in accumulators.items():
+        for attribute, value in vars(saved_accumulators[name]).items():
+            if attribute == "cf":
+                continue
+            current_value = getattr(accumulator, attribute, None)
+            if isinstance(current_value, np.ndarray) and current_value.shape == np.shape(value):
+                current_value[...] = value
+            else:
+                setattr(accumulator, attribute, value)
+
+
+def delete_checkpoint():
+    """Delete the checkpoint once the simulation is complete"""
+    if os.path.exists(FILENAME):
+        os.remove(FILENAME)
@@ -1,149 +1,222 @@
 """Module that reads the user input file, provides default values, and converts the variables into enums"""
 
+import os
 import sys
-import argparse
+import copy
+import math
 
-from freepaths.options import Materials, Distributions
+import freepaths.default_config
+from freepaths.options import Materials, Distributions, SamplingMethods
 
-# Import a default input file:
-from freepaths.default_config import *
 
+def default_parameters():
+    """Return a fresh copy of all the parameters of the default input file"""
+    return {name: copy.deepcopy(value) for name, value in vars(freepaths.default_config).items() if name.isupper()}
 
-# Parse user arguments:
-WEBSITE = 'https://anufrievroman.gitbook.io/freepaths'
-parser = argparse.ArgumentParser(prog='FreePATHS', description='Monte Carlo simulator',
-                                 epilog=f'For more information, visit: {WEBSITE}')
-parser.add_argument('input_file', nargs='?', default=None, help='The input file')
-parser.add_argument("-s", "--sampling", help="Run in MFP sampling mode", action="store_true")
-args = parser.parse_args()
 
+class InputNamespace(dict):
+    """Namespace in which the input file is executed. Assignments to the fixed names are ignored,
+    so that the values given by the user are also used by the parameters derived from them in the file"""
 
-# If a file is provided, overwrite the default values:
-if args.input_file:
-    exec(open(args.input_file, encoding='utf-8').read(), globals())
-else:
-    print("You didn't provide any input file, so let's run a demo simulation!\n")
+    def __init__(self, values, fixed_names):
+        """Start with the given values and the names that the input file cannot change"""
+        super().__init__(values)
+        self.fixed_names = set(fixed_names)
+
+    def __setitem__(self, name, value):
+        """Assign the value unless the name is fixed"""
+        if name not in self.fixed_names:
+            super().__setitem__(name, value)
 
 
 class Config:
     """Class that contains all the settings for the simulation"""
 
-    def __init__(self):
-        """Initiate all the parameters from global variables"""
+    def __init__(self, parameters):
+        """Initiate all the parameters from a dictionary of upper case parameters as in the input files"""
 
         # General parameters:
-        self.output_folder_name = OUTPUT_FOLDER_NAME
-        self.number_of_phonons = NUMBER_OF_PHONONS
-        self.number_of_timesteps = NUMBER_OF_TIMESTEPS
-        self.number_of_nodes = NUMBER_OF_NODES
-        self.timestep = TIMESTEP
-        self.temp = T
-        self.plots_in_terminal = PLOTS_IN_TERMINAL
-        self.output_scattering_map = OUTPUT_SCATTERING_MAP
-        self.output_raw_thermal_map = OUTPUT_RAW_THERMAL_MAP
-        self.output_trajectories_of_first = OUTPUT_TRAJECTORIES_OF_FIRST
-        self.output_structure_color = OUTPUT_STRUCTURE_COLOR
-        self.number_of_length_segments = NUMBER_OF_LENGTH_SEGMENTS
-        self.phonon_source_angle_distribution = PHONON_SOURCE_ANGLE_DISTRIBUTION
+        self.output_folder_name = parameters["OUTPUT_FOLDER_NAME"]
+        self.number_of_phonons = parameters["NUMBER_OF_PHONONS"]
+        self.number_of_timesteps = parameters["NUMBER_OF_TIMESTEPS"]
+        self.number_of_nodes = parameters["NUMBER_OF_NODES"]
+        self.timestep = parameters["TIMESTEP"]
+        self.temp = parameters["T"]
+        self.plots_in_terminal = parameters["PLOTS_IN_TERMINAL"]
+        self.output_scattering_map = parameters["OUTPUT_SCATTERING_MAP"]
+        self.output_raw_thermal_map = parameters["OUTPUT_RAW_THERMAL_MAP"]
+        self.output_trajectories_of_first = parameters["OUTPUT_TRAJECTORIES_OF_FIRST"]
+        self.output_structure_color = parameters["OUTPUT_STRUCTURE_COLOR"]
+        self.number_of_length_segments = parameters["NUMBER_OF_LENGTH_SEGMENTS"]
+        self.phonon_source_angle_distribution = parameters["PHONON_SOURCE_ANGLE_DISTRIBUTION"]
+        self.phonon_source_sampling = parameters["PHONON_SOURCE_SAMPLING"]
+        self.random_seed = parameters["RANDOM_SEED"]
+        self.use_result_cache = parameters["USE_RESULT_CACHE"]
+        self.result_cache_size_limit = parameters["RESULT_CACHE_SIZE_LIMIT"]
+        self.output_stage_profile = parameters["OUTPUT_STAGE_PROFILE"]
+
+        # Checkpoints:
+        self.checkpoint_every_n_phonons = parameters["CHECKPOINT_EVERY_N_PHONONS"]
+        self.checkpoint_every_n_minutes = parameters["CHECKPOINT_EVERY_N_MINUTES"]
+
+        # Target precision:
+        self.transmission_tolerance = parameters["TRANSMISSION_TOLERANCE"]
+        self.detector_tolerance = parameters["DETECTOR_TOLERANCE"]
+        self.conductivity_tolerance = parameters["CONDUCTIVITY_TOLERANCE"]
+        self.confidence_level = parameters["CONFIDENCE_LEVEL"]
+        self.precision_batch_size = parameters["PRECISION_BATCH_SIZE"]
+
+        # Parameter sweeps:
+        self.number_of_processes = parameters["NUMBER_OF_PROCESSES"]
+
+        # Adaptive MFP sampling:
+        self.mfp_sampling_adaptive = parameters["MFP_SAMPLING_ADAPTIVE"]
+        self.mfp_sampling_initial_intervals = parameters["MFP_SAMPLING_INITIAL_INTERVALS"]
+        self.mfp_sampling_tolerance = parameters["MFP_SAMPLING_TOLERANCE"]
+
+        # Repeated MFP sampling:
+        self.mfp_sampling_point_error = parameters["MFP_SAMPLING_POINT_ERROR"]
+        self.mfp_sampling_max_repeats = parameters["MFP_SAMPLING_MAX_REPEATS"]
+        self.mfp_sampling_temperatures = parameters["MFP_SAMPLING_TEMPERATURES"]
 
         # Animation:
-        self.output_path_animation = OUTPUT_PATH_ANIMATION
-        self.output_animation_fps = OUTPUT_ANIMATION_FPS
+        self.output_path_animation = parameters["OUTPUT_PATH_ANIMATION"]
+        self.output_animation_fps = parameters["OUTPUT_ANIMATION_FPS"]
 
         # Map & profiles parameters:
-        self.number_of_pixels_x = NUMBER_OF_PIXELS_X
-        self.number_of_pixels_y = NUMBER_OF_PIXELS_Y
-        self.number_of_timeframes = NUMBER_OF_TIMEFRAMES
+        self.number_of_pixels_x = parameters["NUMBER_OF_PIXELS_X"]
+        self.number_of_pixels_y = parameters["NUMBER_OF_PIXELS_Y"]
+        self.number_of_timeframes = parameters["NUMBER_OF_TIMEFRAMES"]
+        self.use_memory_mapped_maps = parameters["USE_MEMORY_MAPPED_MAPS"]
 
         # Material parameters:
-        self.media = MEDIA
-        self.specific_heat_capacity = SPECIFIC_HEAT_CAPACITY
+        self.media = parameters["MEDIA"]
+        self.specific_heat_capacity = parameters["SPECIFIC_HEAT_CAPACITY"]
+        self.custom_dispersion_file = parameters["CUSTOM_DISPERSION_FILE"]
+        self.custom_relaxation_time_file = parameters["CUSTOM_RELAXATION_TIME_FILE"]
+        self.custom_density = parameters["CUSTOM_DENSITY"]
 
         # Internal scattering:
-        self.include_internal_scattering = INCLUDE_INTERNAL_SCATTERING
-        self.use_gray_approximation_mfp = USE_GRAY_APPROXIMATION_MFP
-        self.gray_approximation_mfp = GRAY_APPROXIMATION_MFP
+        self.include_internal_scattering = parameters["INCLUDE_INTERNAL_SCATTERING"]
+        self.use_gray_approximation_mfp = parameters["USE_GRAY_APPROXIMATION_MFP"]
+        self.gray_approximation_mfp = parameters["GRAY_APPROXIMATION_MFP"]
 
         # System dimensions:
-        self.thickness = THICKNESS
-        self.width = WIDTH
-        self.length = LENGTH
-        self.include_right_sidewall = INCLUDE_RIGHT_SIDEWALL
-        self.include_left_sidewall = INCLUDE_LEFT_SIDEWALL
-        self.include_top_sidewall = INCLUDE_TOP_SIDEWALL
-        self.include_bottom_sidewall = INCLUDE_BOTTOM_SIDEWALL
+        self.thickness = parameters["THICKNESS"]
+        self.width = parameters["WIDTH"]
+        self.length = parameters["LENGTH"]
+        self.include_right_sidewall = parameters["INCLUDE_RIGHT_SIDEWALL"]
+        self.include_left_sidewall = parameters["INCLUDE_LEFT_SIDEWALL"]
+        self.include_top_sidewall = parameters["INCLUDE_TOP_SIDEWALL"]
+        self.include_bottom_sidewall = parameters["INCLUDE_BOTTOM_SIDEWALL"]
 
         # Hot side positions:
-        self.hot_side_position_top = HOT_SIDE_POSITION_TOP
-        self.hot_side_position_bottom = HOT_SIDE_POSITION_BOTTOM
-        self.hot_side_position_right = HOT_SIDE_POSITION_RIGHT
-        self.hot_side_position_left = HOT_SIDE_POSITION_LEFT
-
-        self.frequency_detector_size = FREQUENCY_DETECTOR_SIZE
-        self.frequency_detector_center = FREQUENCY_DETECTOR_CENTER
-        self.frequency_detector_size_2 = FREQUENCY_DETECTOR_2_SIZE
-        self.frequency_detector_center_2 = FREQUENCY_DETECTOR_2_CENTER 
-        self.frequency_detector_size_3 = FREQUENCY_DETECTOR_3_SIZE
-        self.frequency_detector_center_3 = FREQUENCY_DETECTOR_3_CENTER
-        self.phonon_source_x = PHONON_SOURCE_X
-        self.phonon_source_y = PHONON_SOURCE_Y
-        self.phonon_source_width_x = PHONON_SOURCE_WIDTH_X
-        self.phonon_source_width_y = PHONON_SOURCE_WIDTH_Y
+        self.hot_side_position_top = parameters["HOT_SIDE_POSITION_TOP"]
+        self.hot_side_position_bottom = parameters["HOT_SIDE_POSITION_BOTTOM"]
+        self.hot_side_position_right = parameters["HOT_SIDE_POSITION_RIGHT"]
+        self.hot_side_position_left = parameters["HOT_SIDE_POSITION_LEFT"]
+
+        self.frequency_detector_size = parameters["FREQUENCY_DETECTOR_SIZE"]
+        self.frequency_detector_center = parameters["FREQUENCY_DETECTOR_CENTER"]
+        self.frequency_detector_size_2 = parameters["FREQUENCY_DETECTOR_2_SIZE"]
+        self.frequency_detector_center_2 = parameters["FREQUENCY_DETECTOR_2_CENTER"]
+        self.frequency_detector_size_3 = parameters["FREQUENCY_DETECTOR_3_SIZE"]
+        self.frequency_detector_center_3 = parameters["FREQUENCY_DETECTOR_3_CENTER"]
+        self.phonon_source_x = parameters["PHONON_SOURCE_X"]
+        self.phonon_source_y = parameters["PHONON_SOURCE_Y"]
+        self.phonon_source_width_x = parameters["PHONON_SOURCE_WIDTH_X"]
+        self.phonon_source_width_y = parameters["PHONON_SOURCE_WIDTH_Y"]
+        self.phonon_source_bias_angle = parameters["PHONON_SOURCE_BIAS_ANGLE"]
+        self.phonon_source_bias_width = parameters["PHONON_SOURCE_BIAS_WIDTH"]
+        self.phonon_source_bias_fraction = parameters["PHONON_SOURCE_BIAS_FRACTION"]
+        self.roulette_steps = parameters["ROULETTE_STEPS"]
+        self.roulette_survival_probability = parameters["ROULETTE_SURVIVAL_PROBABILITY"]
+        self.roulette_weight_threshold = parameters["ROULETTE_WEIGHT_THRESHOLD"]
 
         # Cold side positions:
-        self.cold_side_position_top = COLD_SIDE_POSITION_TOP
-        self.cold_side_position_bottom = COLD_SIDE_POSITION_BOTTOM
-        self.cold_side_position_right = COLD_SIDE_POSITION_RIGHT
-        self.cold_side_position_left = COLD_SIDE_POSITION_LEFT
+        self.cold_side_position_top = parameters["COLD_SIDE_POSITION_TOP"]
+        self.cold_side_position_bottom = parameters["COLD_SIDE_POSITION_BOTTOM"]
+        self.cold_side_position_right = parameters["COLD_SIDE_POSITION_RIGHT"]
+        self.cold_side_position_left = parameters["COLD_SIDE_POSITION_LEFT"]
 
         # Roughness:
-        self.side_wall_roughness = SIDE_WALL_ROUGHNESS
-        self.hole_roughness = HOLE_ROUGHNESS
-        self.pillar_roughness = PILLAR_ROUGHNESS
-        self.top_roughness = TOP_ROUGHNESS
-        self.bottom_roughness = BOTTOM_ROUGHNESS
-        self.pillar_top_roughness = PILLAR_TOP_ROUGHNESS
+        self.side_wall_roughness = parameters["SIDE_WALL_ROUGHNESS"]
+        self.hole_roughness = parameters["HOLE_ROUGHNESS"]
+        self.pillar_roughness = parameters["PILLAR_ROUGHNESS"]
+        self.top_roughness = parameters["TOP_ROUGHNESS"]
+        self.bottom_roughness = parameters["BOTTOM_ROUGHNESS"]
+        self.pillar_top_roughness = parameters["PILLAR_TOP_ROUGHNESS"]
 
         # Parabolic boundary:
-        self.include_top_parabola = INCLUDE_TOP_PARABOLA
-        self.top_parabola_tip = TOP_PARABOLA_TIP
-        self.top_parabola_focus = TOP_PARABOLA_FOCUS
-        self.include_bottom_parabola = INCLUDE_BOTTOM_PARABOLA
-        self.bottom_parabola_tip = BOTTOM_PARABOLA_TIP
-        self.bottom_parabola_focus = BOTTOM_PARABOLA_FOCUS
+        self.include_top_parabola = parameters["INCLUDE_TOP_PARABOLA"]
+        self.top_parabola_tip = parameters["TOP_PARABOLA_TIP"]
+        self.top_parabola_focus = parameters["TOP_PARABOLA_FOCUS"]
+        self.include_bottom_parabola = parameters["INCLUDE_BOTTOM_PARABOLA"]
+        self.bottom_parabola_tip = parameters["BOTTOM_PARABOLA_TIP"]
+        self.bottom_parabola_focus = parameters["BOTTOM_PARABOLA_FOCUS"]
 
         # Hole array parameters:
-        self.include_holes = INCLUDE_HOLES
-        self.circular_hole_diameter = CIRCULAR_HOLE_DIAMETER
-        self.rectangular_hole_side_x = RECTANGULAR_HOLE_SIDE_X
-        self.rectangular_hole_side_y = RECTANGULAR_HOLE_SIDE_Y
-        self.period_x = PERIOD_X
-        self.period_y = PERIOD_Y
+        self.include_holes = parameters["INCLUDE_HOLES"]
+        self.circular_hole_diameter = parameters["CIRCULAR_HOLE_DIAMETER"]
+        self.rectangular_hole_side_x = parameters["RECTANGULAR_HOLE_SIDE_X"]
+        self.rectangular_hole_side_y = parameters["RECTANGULAR_HOLE_SIDE_Y"]
+        self.period_x = parameters["PERIOD_X"]
+        self.period_y = parameters["PERIOD_Y"]
         
         # New parameter:
-        self.inner_circular_hole_diameter = INNER_CIRCULAR_HOLE_DIAMETER
-        self.alphaARC = ALPHA_ARC
-        self.angle0 = ANGLE0 
+        self.inner_circular_hole_diameter = parameters["INNER_CIRCULAR_HOLE_DIAMETER"]
+        self.alphaARC = parameters["ALPHA_ARC"]
+        self.angle0 = parameters["ANGLE0"]
         
         # New parameters: factor of scaling to the original parameter
-        self.scale_angle_v= SCALE_ANGLE_V
-        self.scale_angle_h = SCALE_ANGLE_H
-        self.scale_angle_h_reverse = SCALE_ANGLE_H_REVERSE
-        self.scaling_factor_radius = SCALING_FACTOR_RADIUS 
-        self.scaling_factor_inner_radius = SCALING_FACTOR_INNER_RADIUS
-        self.scale_angle_m = SCALE_ANGLE
+        self.scale_angle_v= parameters["SCALE_ANGLE_V"]
+        self.scale_angle_h = parameters["SCALE_ANGLE_H"]
+        self.scale_angle_h_reverse = parameters["SCALE_ANGLE_H_REVERSE"]
+        self.scaling_factor_radius = parameters["SCALING_FACTOR_RADIUS"]
+        self.scaling_factor_inner_radius = parameters["SCALING_FACTOR_INNER_RADIUS"]
+        self.scale_angle_m = parameters["SCALE_ANGLE"]
         
 
         # Lattice of holes:
-        self.hole_coordinates = HOLE_COORDINATES
-        self.hole_shapes = HOLE_SHAPES
+        self.hole_coordinates = parameters["HOLE_COORDINATES"]
+        self.hole_shapes = parameters["HOLE_SHAPES"]
 
         # Pillar array parameters [m]
-        self.include_pillars = INCLUDE_PILLARS
-        self.pillar_coordinates = PILLAR_COORDINATES
-        self.pillar_height = PILLAR_HEIGHT
-        self.pillar_wall_angle = PILLAR_WALL_ANGLE
-
+        self.include_pillars = parameters["INCLUDE_PILLARS"]
+        self.pillar_coordinates = parameters["PILLAR_COORDINATES"]
+        self.pillar_height = parameters["PILLAR_HEIGHT"]
+        self.pillar_wall_angle = parameters["PILLAR_WALL_ANGLE"]
+
+
+    @classmethod
+    def from_dict(cls, user_parameters=None):
+        """Create the config from default parameters overwritten by the given upper case parameters,
+        for example Config.from_dict({"T": 4.0, "NUMBER_OF_PHONONS": 100})"""
+        parameters = default_parameters()
+        parameters.update(user_parameters or {})
+        config = cls(parameters)
+        config.convert_to_enums()
+        config.check_parameter_validity()
+        config.check_depricated_parameters(parameters)
+        return config
+
+    @classmethod
+    def from_file(cls, filename, user_parameters=None):
+        """Create the config from the input file, optionally overwriting some of its parameters.
+        The overwritten parameters are set before the input file runs, so that the parameters
+        derived from them in the file, e.g. PHONON_SOURCE_WIDTH_X = WIDTH, take the new values"""
+        user_parameters = user_parameters or {}
+        values = {name: value for name, value in vars(freepaths.default_config).items() if not name.startswith("_")}
+        values.update(default_parameters())
+
+        # The file works on copies, so that it cannot modify the user values, e.g. arrays, in place:
+        values.update(copy.deepcopy(user_parameters))
+        namespace = InputNamespace(values, user_parameters.keys())
+        with open(filename, encoding='utf-8') as file:
+            exec(file.read(), namespace)
+        parameters = {name: value for name, value in namespace.items() if name.isupper()}
+        parameters.update(user_parameters)
+        return cls.from_dict(parameters)
 
     def convert_to_enums(self):
         """Convert some user generated parameters into enums"""
@@ -158,6 +231,16 @@ class Config:
             print(*valid_distributions, sep = ", ")
             sys.exit()
 
+        # Sampling methods:
+        valid_sampling_methods = [member.name.lower() for member in SamplingMethods]
+        if self.phonon_source_sampling in valid_sampling_methods:
+            self.phonon_source_sampling = SamplingMethods[self.phonon_source_sampling.upper()]
+        else:
+            print("ERROR: Parameter PHONON_SOURCE_SAMPLING is not set correctly.")
+            print("PHONON_SOURCE_SAMPLING should be one of the following:")
+            print(*valid_sampling_methods, sep = ", ")
+            sys.exit()
+
         # Materials:
         valid_materials = [member.name for member in Materials]
         if self.media in valid_materials:
@@ -198,6 +281,85 @@ class Config:
         if self.output_path_animation and self.number_of_timesteps > 5000:
             print("WARNING: NUMBER_OF_TIMESTEPS is rather large for animation.\n")
 
+        if self.media == Materials.Custom:
+            if self.custom_dispersion_file is None or not os.path.exists(self.custom_dispersion_file):
+                print("ERROR: Custom material requires an existing CUSTOM_DISPERSION_FILE.\n")
+                sys.exit()
+            if self.custom_density is None:
+                print("ERROR: Custom material requires CUSTOM_DENSITY.\n")
+                sys.exit()
+            if self.custom_relaxation_time_file is None and not self.use_gray_approximation_mfp:
+                print("ERROR: Custom material requires CUSTOM_RELAXATION_TIME_FILE or USE_GRAY_APPROXIMATION_MFP.\n")
+                sys.exit()
+            if self.custom_relaxation_time_file is not None and not os.path.exists(self.custom_relaxation_time_file):
+                print("ERROR: CUSTOM_RELAXATION_TIME_FILE does not exist.\n")
+                sys.exit()
+
+            # The simulation runs in the results folder, so the files are referred to by absolute paths:
+            self.custom_dispersion_file = os.path.abspath(self.custom_dispersion_file)
+            if self.custom_relaxation_time_file is not None:
+                self.custom_relaxation_time_file = os.path.abspath(self.custom_relaxation_time_file)
+
+        if self.phonon_source_bias_angle is not None:
+            if self.phonon_source_angle_distribution == Distributions.DIRECTIONAL:
+                print("ERROR: Directional phonon source cannot be biased with PHONON_SOURCE_BIAS_ANGLE.\n")
+                sys.exit()
+            if not 0 < self.phonon_source_bias_fraction < 1:
+                print("ERROR: Parameter PHONON_SOURCE_BIAS_FRACTION must be between 0 and 1.\n")
+                sys.exit()
+            if not 0 < self.phonon_source_bias_width <= 2 * math.pi:
+                print("ERROR: Parameter PHONON_SOURCE_BIAS_WIDTH must be between 0 and 2 pi.\n")
+                sys.exit()
+
+        if self.roulette_steps is not None:
+            if not 0 < self.roulette_survival_probability <= 1:
+                print("ERROR: Parameter ROULETTE_SURVIVAL_PROBABILITY must be between 0 and 1.\n")
+                sys.exit()
+            if not self.roulette_weight_threshold > 0:
+                print("ERROR: Parameter ROULETTE_WEIGHT_THRESHOLD must be positive.\n")
+                sys.exit()
+            if any(step >= self.number_of_timesteps for step in self.roulette_steps):
+                print("WARNING: Some of ROULETTE_STEPS exceed NUMBER_OF_TIMESTEPS and will never be reached.\n")
+
+        if self.phonon_source_sampling == SamplingMethods.SOBOL and self.precision_batch_size & (self.precision_batch_size - 1):
+            print("WARNING: Sobol points are balanced only if PRECISION_BATCH_SIZE is a power of two, e.g. 128.\n")
+
+        if self.result_cache_size_limit is not None and self.result_cache_size_limit <= 0:
+            print("ERROR: Parameter RESULT_CACHE_SIZE_LIMIT must be positive or None.\n")
+            sys.exit()
+
+        if not 0 < self.confidence_level < 1:
+            print("ERROR: Parameter CONFIDENCE_LEVEL must be between 0 and 1.\n")
+            sys.exit()
+
+        if self.precision_batch_size < 1:
+            print("ERROR: Parameter PRECISION_BATCH_SIZE must be at least 1.\n")
+            sys.exit()
+
+        if self.number_of_processes is not None and self.number_of_processes < 1:
+            print("ERROR: Parameter NUMBER_OF_PROCESSES must be at least 1.\n")
+            sys.exit()
+
+        if self.mfp_sampling_adaptive and self.mfp_sampling_initial_intervals < 1:
+            print("ERROR: Parameter MFP_SAMPLING_INITIAL_INTERVALS must be at least 1.\n")
+            sys.exit()
+
+        if self.mfp_sampling_adaptive and self.mfp_sampling_point_error is not None:
+            print("ERROR: Parameter MFP_SAMPLING_POINT_ERROR cannot be used with the adaptive MFP sampling.\n")
+            sys.exit()
+
+        if self.mfp_sampling_adaptive and self.mfp_sampling_temperatures is not None:
+            print("ERROR: Parameter MFP_SAMPLING_TEMPERATURES cannot be used with the adaptive MFP sampling.\n")
+            sys.exit()
+
+        if self.mfp_sampling_point_error is not None and self.mfp_sampling_max_repeats < 2:
+            print("ERROR: Parameter MFP_SAMPLING_MAX_REPEATS must be at least 2 to estimate the error.\n")
+            sys.exit()
+
+        if self.mfp_sampling_adaptive and self.number_of_phonons < 2 * self.mfp_sampling_initial_intervals:
+            print("ERROR: Adaptive MFP sampling needs NUMBER_OF_PHONONS of at least two per initial interval.\n")
+            sys.exit()
+
         if (self.cold_side_position_top and self.include_top_sidewall or
             self.hot_side_position_top and self.include_top_sidewall or
             self.cold_side_position_top and self.hot_side_position_top):
@@ -223,33 +385,28 @@ class Config:
             sys.exit()
 
 
-    def check_depricated_parameters(self):
+    def check_depricated_parameters(self, parameters):
         """Check for depricated parameters and warn about them"""
 
-        if 'COLD_SIDE_POSITION' in globals():
+        if 'COLD_SIDE_POSITION' in parameters:
             print("WARNING: parameter COLD_SIDE_POSITION is depricated. ")
             print("Use specific boolean parameters like COLD_SIDE_POSITION_TOP = True.\n")
 
-        if 'HOT_SIDE_POSITION' in globals():
+        if 'HOT_SIDE_POSITION' in parameters:
             print("WARNING: parameter HOT_SIDE_POSITION is depricated. ")
             print("Use specific boolean parameters like HOT_SIDE_POSITION_BOTTOM = True.\n")
 
-        if 'HOT_SIDE_X' in globals():
+        if 'HOT_SIDE_X' in parameters:
             print("WARNING: parameter HOT_SIDE_X was renamed to PHONON_SOURCE_X.\n")
 
-        if 'HOT_SIDE_Y' in globals():
+        if 'HOT_SIDE_Y' in parameters:
             print("WARNING: parameter HOT_SIDE_Y was renamed to PHONON_SOURCE_Y.\n")
 
-        if 'HOT_SIDE_WIDTH_X' in globals():
+        if 'HOT_SIDE_WIDTH_X' in parameters:
             print("WARNING: parameter HOT_SIDE_WIDTH_X was renamed to PHONON_SOURCE_WIDTH_X.\n")
 
-        if 'HOT_SIDE_WIDTH_Y' in globals():
+        if 'HOT_SIDE_WIDTH_Y' in parameters:
             print("WARNING: parameter HOT_SIDE_WIDTH_Y was renamed to PHONON_SOURCE_WIDTH_Y.\n")
 
-        if 'HOT_SIDE_ANGLE_DISTRIBUTION' in globals():
+        if 'HOT_SIDE_ANGLE_DISTRIBUTION' in parameters:
             print("WARNING: parameter HOT_SIDE_ANGLE_DISTRIBUTION was renamed to PHONON_SOURCE_ANGLE_DISTRIBUTION.\n")
-
-cf = Config()
-cf.convert_to_enums()
-cf.check_parameter_validity()
-cf.check_depricated_parameters()
@@ -2,7 +2,6 @@
 
 import numpy as np
 
-from freepaths.config import cf
 from freepaths.scattering_types import Scattering
 
 class PathData:
@@ -16,21 +15,31 @@ class PathData:
         """Save the path to list of all paths"""
         self.phonon_paths.append(flight.path)
 
-    @property
-    def length_of_longest_path(self):
-        """Calculate the number of points in the longest path"""
-        return max([path.number_of_path_points for path in self.phonon_paths])
+    def merge(self, other):
+        """Add the paths recorded by another process"""
+        self.phonon_paths.extend(other.phonon_paths)
 
     def write_into_files(self):
-        """Write all the path coordinates into a file"""
-        filename = "Data/Phonon paths.csv"
-        data = np.zeros((self.length_of_longest_path, 3*len(self.phonon_paths)))
-        for index, path in enumerate(self.phonon_paths):
-            for point_n, (x, y, z) in enumerate(zip(path.x, path.y, path.z)):
-                data[point_n, 0 + index*3] = x*1e6
-                data[point_n, 1 + index*3] = y*1e6
-                data[point_n, 2 + index*3] = z*1e6
-        np.savetxt(filename, data, fmt='%2.4f', delimiter=",", header="X (μm), Y (μm), Z (μm)", encoding='utf-8')
+        """Write all the path coordinates into a binary file as one flat array of points [um]
+        and an array of offsets, where the path number i spans points offsets[i]:offsets[i+1]"""
+        filename = "Data/Phonon paths.npz"
+        lengths = [path.number_of_path_points for path in self.phonon_paths]
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(lengths)
+        coordinates = np.zeros((offsets[-1], 3))
+        if self.phonon_paths:
+            coordinates[:, 0] = np.concatenate([path.x for path in self.phonon_paths])
+            coordinates[:, 1] = np.concatenate([path.y for path in self.phonon_paths])
+            coordinates[:, 2] = np.concatenate([path.z for path in self.phonon_paths])
+        np.savez(filename, coordinates=coordinates*1e6, offsets=offsets)
+
+
+def read_phonon_paths(filename="Data/Phonon paths.npz"):
+    """Read the file with phonon paths and return a list of (N, 3) arrays of X, Y, Z coordinates [um]"""
+    with np.load(filename) as data:
+        coordinates = data["coordinates"]
+        offsets = data["offsets"]
+    return [coordinates[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
 
 
 class GeneralData:
@@ -52,11 +61,13 @@ class GeneralData:
         self.mean_free_paths = []
         self.mean_free_paths_x = []
         self.mean_free_paths_y = []
+        self.weights = []
 
     def save_phonon_data(self, ph):
         """Add information about the phonon to the dataset"""
         self.frequencies.append(ph.f)
         self.group_velocities.append(ph.speed)
+        self.weights.append(ph.weight)
 
     def save_flight_data(self, flight):
         """Add information about the phonon flight to the dataset"""
@@ -73,6 +84,11 @@ class GeneralData:
         self.mean_free_paths_x.append(flight.mean_free_path_x)
         self.mean_free_paths_y.append(flight.mean_free_path_y)
 
+    def merge(self, other):
+        """Add the data recorded by another process"""
+        for name, values in vars(other).items():
+            getattr(self, name).extend(values)
+
     def write_into_files(self):
         """Write all the data into files"""
         np.savetxt("Data/All free paths.csv", self.free_paths, fmt='%2.4e', delimiter=",", header="L [m]", encoding='utf-8')
@@ -89,13 +105,18 @@ class GeneralData:
         np.savetxt("Data/All mean free paths.csv", self.mean_free_paths, fmt='%2.4e', delimiter=",", header="MFPs [m]", encoding='utf-8')
         np.savetxt("Data/All mean free paths in x.csv", self.mean_free_paths_x, fmt='%2.4e', delimiter=",", header="MFPs [m]", encoding='utf-8')
         np.savetxt("Data/All mean free paths in y.csv", self.mean_free_paths_y, fmt='%2.4e', delimiter=",", header="MFPs [m]", encoding='utf-8')
+        np.savetxt("Data/All phonon weights.csv", self.weights, fmt='%2.6e', delimiter=",", header="Weight", encoding='utf-8')
 
 
 class ScatteringData:
     """Statistics of phonon scattering events"""
 
-    def __init__(self):
+    event_types = ["wall_diffuse", "wall_specular", "top_diffuse", "top_specular", "hole_diffuse", "hole_specular",
+                   "pillar_diffuse", "pillar_specular", "hot_side", "internal", "total"]
+
+    def __init__(self, cf):
         """Initialize arrays according to the number of segments"""
+        self.cf = cf
         self.wall_diffuse = np.zeros(cf.number_of_length_segments+1)
         self.wall_specular = np.zeros(cf.number_of_length_segments+1)
         self.top_diffuse = np.zeros(cf.number_of_length_segments+1)
@@ -108,68 +129,100 @@ class ScatteringData:
         self.internal = np.zeros(cf.number_of_length_segments+1)
         self.total = np.zeros(cf.number_of_length_segments+1)
 
-    def save_scattering_events(self, y, scattering_types):
-        """Analyze types of scattering at the current timestep and add it to the statistics"""
+    def save_scattering_events(self, y, scattering_types, weight):
+        """Analyze types of scattering at the current timestep and add it to the statistics with the weight of the phonon"""
 
         try:
             # Calculate in which length segment (starting from zero) we are:
-            segment = int(y // (cf.length / cf.number_of_length_segments))
-            self.total[segment] += 1
+            segment = int(y // (self.cf.length / self.cf.number_of_length_segments))
+            self.total[segment] += weight
 
             # Scattering on side walls:
-            self.wall_diffuse[segment]  += 1 if scattering_types.walls == Scattering.DIFFUSE else 0
-            self.wall_specular[segment] += 1 if scattering_types.walls == Scattering.SPECULAR else 0
+            self.wall_diffuse[segment]  += weight if scattering_types.walls == Scattering.DIFFUSE else 0
+            self.wall_specular[segment] += weight if scattering_types.walls == Scattering.SPECULAR else 0
 
             # Scattering on top and bottom:
-            self.top_diffuse[segment]  += 1 if scattering_types.top_bottom == Scattering.DIFFUSE else 0
-            self.top_specular[segment] += 1 if scattering_types.top_bottom == Scattering.SPECULAR else 0
+            self.top_diffuse[segment]  += weight if scattering_types.top_bottom == Scattering.DIFFUSE else 0
+            self.top_specular[segment] += weight if scattering_types.top_bottom == Scattering.SPECULAR else 0
 
             # Scattering on holes:
-            self.hole_diffuse[segment]  += 1 if scattering_types.holes == Scattering.DIFFUSE else 0
-            self.hole_specular[segment] += 1 if scattering_types.holes == Scattering.SPECULAR else 0
+            self.hole_diffuse[segment]  += weight if scattering_types.holes == Scattering.DIFFUSE else 0
+            self.hole_specular[segment] += weight if scattering_types.holes == Scattering.SPECULAR else 0
 
             # Scattering on pillars:
-            self.pillar_diffuse[segment]  += 1 if scattering_types.pillars == Scattering.DIFFUSE else 0
-            self.pillar_specular[segment] += 1 if scattering_types.pillars == Scattering.SPECULAR else 0
+            self.pillar_diffuse[segment]  += weight if scattering_types.pillars == Scattering.DIFFUSE else 0
+            self.pillar_specular[segment] += weight if scattering_types.pillars == Scattering.SPECULAR else 0
 
             # Internal scattering and rethermalization on hot side:
-            self.hot_side[segment] += 1 if scattering_types.hot_side == Scattering.DIFFUSE else 0
-            self.internal[segment] += 1 if scattering_types.internal == Scattering.DIFFUSE else 0
+            self.hot_side[segment] += weight if scattering_types.hot_side == Scattering.DIFFUSE else 0
+            self.internal[segment] += weight if scattering_types.internal == Scattering.DIFFUSE else 0
         except:
             pass
 
+    def merge(self, other):
+        """Add the statistics recorded by another process"""
+        for name in self.event_types:
+            getattr(self, name)[:] += getattr(other, name)
+
+    def totals(self):
+        """Total number of events of each type in all segments"""
+        return {name: np.sum(getattr(self, name)) for name in self.event_types}
+
+    def events_by_segment(self):
+        """Table of the numbers of events of each type in each segment, as in the output file"""
+        return np.vstack((self.wall_diffuse, self.wall_specular, self.top_diffuse, self.top_specular, self.hole_diffuse,
+                          self.hole_specular, self.hot_side, self.internal, self.pillar_diffuse, self.pillar_specular)).T
+
     def write_into_files(self):
         """Write data into a file"""
         filename = "Data/Scattering events statistics.csv"
-        data = np.vstack((self.wall_diffuse, self.wall_specular, self.top_diffuse, self.top_specular, self.hole_diffuse,
-                        self.hole_specular, self.hot_side, self.internal, self.pillar_diffuse, self.pillar_specular)).T
+        data = self.events_by_segment()
         header1 = "Sidewalls diffuse, Sidewalls specular, Top & bottom diffuse, Top & bottom specular, "
         header2 = "Holes diffuse, Holes specular, Hot side, Internal, Pillars diffuse, Pillars specular"
         header = header1 + header2
         np.savetxt(filename, data, fmt='%1.3e', delimiter=",", header=header, encoding='utf-8')
 
 
+def scattering_percentages(totals):
+    """Percentages of events of each type among all scattering events, and percentages of diffuse and specular
+    events on each type of surface, calculated from the total numbers of events of each type"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percentages = {"Rethermalization": 100 * totals["hot_side"] / totals["total"],
+                       "Internal": 100 * totals["internal"] / totals["total"]}
+        for surface, name in [("wall", "Side walls"), ("top", "Top and bottom"), ("hole", "Holes"), ("pillar", "Pillars")]:
+            diffuse, specular = totals[f"{surface}_diffuse"], totals[f"{surface}_specular"]
+            percentages[name] = 100 * (diffuse + specular) / totals["total"]
+            percentages[f"{name} diffuse"] = 100 * diffuse / (diffuse + specular)
+            percentages[f"{name} specular"] = 100 * specular / (diffuse + specular)
+    return percentages
+
+
 class SegmentData:
     """Statistics of events happening in different segments"""
 
-    def __init__(self):
+    def __init__(self, cf):
         """Initialize arrays according to the number of segments"""
+        self.cf = cf
         self.time_spent = np.zeros(cf.number_of_length_segments)
 
     @property
     def segment_coordinates(self):
         """Calculate coordinates of the centers of each segment"""
-        segment_length = cf.length * 1e6 / cf.number_of_length_segments
-        segments = [(segment_length/2 + i*segment_length) for i in range(cf.number_of_length_segments)]
+        segment_length = self.cf.length * 1e6 / self.cf.number_of_length_segments
+        segments = [(segment_length/2 + i*segment_length) for i in range(self.cf.number_of_length_segments)]
         return segments
 
-    def record_time_in_segment(self, coordinate):
-        """Record how long phonon stays in different segments"""
-        for segment_number in range(cf.number_of_length_segments):
-            segment_beginning = segment_number * (cf.length / cf.number_of_length_segments)
-            segment_end = (segment_number + 1)*(cf.length / cf.number_of_length_segments)
+    def record_time_in_segment(self, coordinate, weight):
+        """Record how long phonon stays in different segments, weighted by the weight of the phonon"""
+        for segment_number in range(self.cf.number_of_length_segments):
+            segment_beginning = segment_number * (self.cf.length / self.cf.number_of_length_segments)
+            segment_end = (segment_number + 1)*(self.cf.length / self.cf.number_of_length_segments)
             if segment_beginning <= coordinate < segment_end:
-                self.time_spent[segment_number] += cf.timestep * 1e6
+                self.time_spent[segment_number] += weight * self.cf.timestep * 1e6
+
+    def merge(self, other):
+        """Add the time recorded by another process"""
+        self.time_spent += other.time_spent
 
     def write_into_files(self):
         """Write data into files"""
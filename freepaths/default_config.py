@@ -15,6 +15,37 @@ OUTPUT_RAW_THERMAL_MAP           = True
 OUTPUT_TRAJECTORIES_OF_FIRST     = 10
 OUTPUT_STRUCTURE_COLOR           = "#F0F0F0"
 NUMBER_OF_LENGTH_SEGMENTS        = 10
+RANDOM_SEED                      = None
+USE_RESULT_CACHE                 = True   # Used only with RANDOM_SEED
+RESULT_CACHE_SIZE_LIMIT          = 1000   # [MB], least recently used results are deleted above it (None means no limit)
+OUTPUT_STAGE_PROFILE             = False  # Record time of each stage of the timesteps
+
+# Checkpoints (0 means never):
+CHECKPOINT_EVERY_N_PHONONS       = 0
+CHECKPOINT_EVERY_N_MINUTES       = 0
+
+# Target precision, tracing stops when confidence intervals are narrower than the tolerances (None means not checked)
+# or after NUMBER_OF_PHONONS phonons:
+TRANSMISSION_TOLERANCE           = None  # Half-width of the interval of phonons reaching the cold side [%]
+DETECTOR_TOLERANCE               = None  # Half-width of the interval of phonons passing each detector [%]
+CONDUCTIVITY_TOLERANCE           = None  # Half-width of the interval of thermal conductivity relative to its value
+CONFIDENCE_LEVEL                 = 0.95
+PRECISION_BATCH_SIZE             = 100   # Number of phonons between checks of the precision
+
+# Processes for parameter sweeps and MFP sampling (None means all processor cores):
+NUMBER_OF_PROCESSES              = None
+
+# Adaptive MFP sampling (at most NUMBER_OF_PHONONS phonons per branch):
+MFP_SAMPLING_ADAPTIVE            = False
+MFP_SAMPLING_INITIAL_INTERVALS   = 8
+MFP_SAMPLING_TOLERANCE           = 0.02  # Target relative standard error of the thermal conductivity
+
+# Repeated MFP sampling at each wave vector (None means one phonon per wave vector):
+MFP_SAMPLING_POINT_ERROR         = None  # Target relative standard error of the MFP at each wave vector
+MFP_SAMPLING_MAX_REPEATS         = 20
+
+# Temperatures at which the thermal conductivity is calculated from boundary-limited MFPs traced only once:
+MFP_SAMPLING_TEMPERATURES        = None
 
 # Animation:
 OUTPUT_PATH_ANIMATION            = False
@@ -24,11 +55,17 @@ OUTPUT_ANIMATION_FPS             = 24
 NUMBER_OF_PIXELS_X               = 100
 NUMBER_OF_PIXELS_Y               = 100
 NUMBER_OF_TIMEFRAMES             = 5
+USE_MEMORY_MAPPED_MAPS           = False
 
 # Material parameters:
 MEDIA                            = "Si"
 SPECIFIC_HEAT_CAPACITY           = 714  # [J/kg/K] for Si at 300 K
 
+# Custom material (MEDIA = "Custom") with dispersion and relaxation times from CSV or NPZ files:
+CUSTOM_DISPERSION_FILE           = None
+CUSTOM_RELAXATION_TIME_FILE      = None
+CUSTOM_DENSITY                   = None  # [kg/m^3]
+
 # Internal scattering:
 INCLUDE_INTERNAL_SCATTERING      = True
 USE_GRAY_APPROXIMATION_MFP       = False
@@ -62,11 +99,22 @@ HOT_SIDE_POSITION_LEFT           = False
 
 # Phonon source:
 PHONON_SOURCE_ANGLE_DISTRIBUTION = "random_up"
+PHONON_SOURCE_SAMPLING           = "random"  # Or "stratified" and "sobol" for lower variance of results
 PHONON_SOURCE_X                  = 0
 PHONON_SOURCE_WIDTH_X            = WIDTH
 PHONON_SOURCE_Y                  = 0
 PHONON_SOURCE_WIDTH_Y            = 0
 
+# Biased phonon source, which emits more phonons in some direction with weights that correct the bias:
+PHONON_SOURCE_BIAS_ANGLE         = None  # Theta angle at the center of the biased directions [rad]
+PHONON_SOURCE_BIAS_WIDTH         = 0.2   # Full width of the biased directions [rad]
+PHONON_SOURCE_BIAS_FRACTION      = 0.5   # Fraction of phonons emitted in the biased directions
+
+# Russian roulette, which stops some of the phonons that are still in the system at given timesteps:
+ROULETTE_STEPS                   = None  # List of timesteps, for example [5000, 10000, 20000]
+ROULETTE_SURVIVAL_PROBABILITY    = 0.5
+ROULETTE_WEIGHT_THRESHOLD        = 1.0   # Only phonons with weights up to this value play the roulette
+
 # Roughness [m]:
 SIDE_WALL_ROUGHNESS              = 2e-9
 HOLE_ROUGHNESS                   = 2e-9
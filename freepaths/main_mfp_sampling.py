@@ -2,110 +2,406 @@
 
 import os
 import sys
+import copy
 import time
+import random
 import shutil
-import scipy
+import contextlib
+import multiprocessing
+import scipy.constants
+import numpy as np
 import math
 
-# Modules:
-from freepaths.animation import create_animation
-from freepaths.config import cf
+# Modules (plotting modules are imported only when needed, as matplotlib is slow to import):
 from freepaths.run_phonon import run_phonon
-from freepaths.phonon import Phonon
+from freepaths.phonon import Phonon, branch_speed
 from freepaths.flight import Flight
 from freepaths.data import ScatteringData, GeneralData, SegmentData, PathData
 from freepaths.progress import Progress
-from freepaths.materials import Material
+from freepaths.materials import get_material
 from freepaths.maps import ScatteringMap, ThermalMaps
+from freepaths.relaxation_times import get_relaxation_times
+from freepaths.writer import BackgroundWriter
+from freepaths.cache import configuration_hash, is_cache_enabled, load_cached_results, save_results_to_cache
+from freepaths.quadrature import AdaptiveQuadrature, Interval, MIN_SAMPLES, write_intervals_into_file
 from freepaths.output_info import output_general_information, output_scattering_information
-from freepaths.output_plots import plot_data
 from freepaths.options import Polarizations
 
 
-def main(input_file):
-    """This is the main function, which integrates phonon dispersion to get thermal conductivity"""
+# Order of branches to integrate and number of phonons traced by a process at once:
+BRANCHES = [Polarizations.LA, Polarizations.TA, Polarizations.TA]
+CHUNK_SIZE = 10
 
-    print(f'Mean free path sampling of {cf.output_folder_name}')
-    start_time = time.time()
-    progress = Progress()
 
-    # Initiate data structures:
-    material = Material(cf.media, num_points=cf.number_of_phonons+1)
-    scatter_stats = ScatteringData()
-    general_stats = GeneralData()
-    segment_stats = SegmentData()
-    path_stats = PathData()
-    scatter_maps = ScatteringMap()
-    thermal_maps = ThermalMaps()
+def sampling_material(cf):
+    """Return the material with the dispersion tabulated at the wave vectors of the uniform sampling
+    or, in the adaptive sampling, on a fine grid to interpolate the frequency at any wave vector"""
+    num_points = 1000 if cf.mfp_sampling_adaptive else cf.number_of_phonons + 1
+    return get_material(cf.media, num_points=num_points, dispersion_file=cf.custom_dispersion_file,
+                        relaxation_time_file=cf.custom_relaxation_time_file, density=cf.custom_density)
 
-    thermal_conductivity = 0
 
-    # For each polarization branch:
-    for polarization in [Polarizations.LA, Polarizations.TA, Polarizations.TA]:
-        sys.stdout.write(f"\rIntegrating {polarization.name} branch.\n")
+def conductivity_integrand(temperature, frequency, speed, mean_free_path, k_vector):
+    """Integrand of the thermal conductivity over wave vectors for a phonon with the given mean free path"""
 
-        # For each phonon:
-        for index in range(cf.number_of_phonons):
+    # Heat capacity, Ref. PRB 88 155318 (2013):
+    omega = 2 * math.pi * frequency
+    part = scipy.constants.hbar * omega / (scipy.constants.k * temperature)
+    c_p = scipy.constants.k * part**2 * math.exp(part) / (math.exp(part) - 1)**2
+
+    # Thermal conductivity, Ref. Phys. Rev. 132 2461 (1963):
+    relax_time = mean_free_path/speed
+    return (1/(6*(math.pi**2)))*c_p*(speed**2)*relax_time*(k_vector**2)
+
+
+def trace_chunk(chunk):
+    """Trace phonons of a chunk of (branch, wave vector, frequency, record path) tasks in a worker process.
+    Returns the speed and mean free path of each phonon and the data recorded for them"""
+    cf, entropy, chunk_number, tasks = chunk
+
+    # Each chunk has its own random numbers, which depend only on the seed and the chunk number:
+    random.seed(np.random.SeedSequence(entropy, spawn_key=(chunk_number,)).generate_state(4).tobytes())
+
+    # Workers record into memory, memory maps of the main process are updated when the data is merged:
+    worker_cf = copy.copy(cf)
+    worker_cf.use_memory_mapped_maps = False
+
+    # Mean free paths are averaged without weights, so phonons are never stopped by the Russian roulette:
+    worker_cf.roulette_steps = None
+    material = sampling_material(cf)
+    accumulators = {
+        "scatter_stats": ScatteringData(worker_cf),
+        "general_stats": GeneralData(),
+        "segment_stats": SegmentData(worker_cf),
+        "path_stats": PathData(),
+        "scatter_maps": ScatteringMap(),
+        "thermal_maps": ThermalMaps(worker_cf),
+    }
+    flights = []
+
+    for branch_number, k_vector, frequency, record_path in tasks:
+
+        # Initiate a phonon and its flight:
+        phonon = Phonon(worker_cf, material, BRANCHES[branch_number], frequency)
+        flight = Flight(phonon)
+
+        # Run this phonon through the structure:
+        run_phonon(worker_cf, phonon, flight, accumulators["scatter_stats"], accumulators["segment_stats"],
+                   accumulators["thermal_maps"], accumulators["scatter_maps"], material)
+
+        # Record the properties returned for this phonon:
+        accumulators["general_stats"].save_phonon_data(phonon)
+        accumulators["general_stats"].save_flight_data(flight)
+        if record_path:
+            accumulators["path_stats"].save_phonon_path(flight)
 
-            # Wave vector:
+        flights.append((phonon.speed, flight.mean_free_path))
+
+    return flights, accumulators
+
+
+class ChunkTracer:
+    """Traces lists of phonon tasks in chunks, either in this process or by a pool of processes,
+    and merges the data recorded by the chunks into the accumulators of the main process"""
+
+    def __init__(self, cf, entropy, map_function, accumulators, progress):
+        """Store the function that maps chunks to results and the data structures to merge the results into"""
+        self.cf = cf
+        self.entropy = entropy
+        self.map_function = map_function
+        self.accumulators = accumulators
+        self.progress = progress
+        self.number_of_chunks = 0
+        self.number_of_traced_phonons = 0
+
+    @property
+    def budget(self):
+        """Maximal number of phonons to trace"""
+        if self.cf.mfp_sampling_point_error is not None:
+            return len(BRANCHES) * self.cf.number_of_phonons * self.cf.mfp_sampling_max_repeats
+        return len(BRANCHES) * self.cf.number_of_phonons
+
+    def trace(self, tasks):
+        """Trace the phonons of the tasks and return (speed, mean free path) of each phonon.
+        Results are merged in the order of chunks, so that they do not depend on the number of processes"""
+        chunks = []
+        for start in range(0, len(tasks), CHUNK_SIZE):
+            chunks.append((self.cf, self.entropy, self.number_of_chunks, tasks[start:start + CHUNK_SIZE]))
+            self.number_of_chunks += 1
+
+        flights = []
+        for chunk_flights, chunk_accumulators in self.map_function(trace_chunk, chunks):
+            flights.extend(chunk_flights)
+            for name, accumulator in self.accumulators.items():
+                accumulator.merge(chunk_accumulators[name])
+            self.number_of_traced_phonons += len(chunk_flights)
+            self.progress.render(self.number_of_traced_phonons, self.budget)
+        return flights
+
+
+def sample_uniform_grid(cf, material, tracer, value_function):
+    """Trace phonons in the middle of each interval of a uniform grid of wave vectors and store
+    value_function(frequency, speed, mean free path, wave vector) of each phonon as a sample of the interval.
+    Phonons are repeated at each wave vector until the relative error of the value reaches the target,
+    or one phonon is traced if no target is set. Returns (interval, wave vector, frequency) of the grid points"""
+    points = []
+    for branch_number, polarization in enumerate(BRANCHES):
+        for index in range(cf.number_of_phonons):
             k_vector = (material.dispersion[index+1, 0] + material.dispersion[index, 0]) / 2
-            d_k_vector = (material.dispersion[index+1, 0] - material.dispersion[index, 0])
+            branch = polarization.value
+            frequency = abs((material.dispersion[index+1, branch] + material.dispersion[index, branch]) / 2)
+            interval = Interval(branch_number, material.dispersion[index, 0], material.dispersion[index+1, 0])
+            points.append((interval, k_vector, frequency, index < cf.output_trajectories_of_first))
+
+    is_repeated = cf.mfp_sampling_point_error is not None
+    pending_points = [(point, MIN_SAMPLES if is_repeated else 1) for point in points]
+    while pending_points:
+        tasks = []
+        for (interval, k_vector, frequency, record_path), number_of_repeats in pending_points:
+            for repeat in range(number_of_repeats):
+                is_first = repeat == 0 and not interval.samples
+                tasks.append((interval.branch_number, k_vector, frequency, record_path and is_first))
+        flights = tracer.trace(tasks)
+        position = 0
+        for (interval, k_vector, frequency, _), number_of_repeats in pending_points:
+            for speed, mean_free_path in flights[position:position + number_of_repeats]:
+                interval.samples.append((k_vector, value_function(frequency, speed, mean_free_path, k_vector)))
+            position += number_of_repeats
+        if not is_repeated:
+            break
+
+        # Number of additional phonons is estimated from the error, but the number of phonons is at most doubled:
+        pending_points = []
+        for point in points:
+            interval = point[0]
+            number_of_samples = len(interval.samples)
+            if interval.relative_error > cf.mfp_sampling_point_error and number_of_samples < cf.mfp_sampling_max_repeats:
+                needed = math.ceil(number_of_samples * (interval.relative_error / cf.mfp_sampling_point_error)**2)
+                number_of_repeats = min(max(needed - number_of_samples, 1), number_of_samples,
+                                        cf.mfp_sampling_max_repeats - number_of_samples)
+                pending_points.append((point, number_of_repeats))
+
+    return [(interval, k_vector, frequency) for interval, k_vector, frequency, _ in points]
+
 
-            # Initiate a phonon and its flight:
-            phonon = Phonon(material, polarization, index)
-            flight = Flight(phonon)
+def integrate_uniformly(cf, material, tracer):
+    """Integrate the thermal conductivity on a uniform grid of wave vectors.
+    Returns the integral and its standard error, if it is known"""
 
-            # Run this phonon through the structure:
-            run_phonon(phonon, flight, scatter_stats, segment_stats, thermal_maps, scatter_maps, material)
+    # At each wave vector, the integrand is proportional to the mean free path, so they have the same relative error:
+    def integrand(frequency, speed, mean_free_path, k_vector):
+        return conductivity_integrand(cf.temp, frequency, speed, mean_free_path, k_vector)
+    intervals = [interval for interval, _, _ in sample_uniform_grid(cf, material, tracer, integrand)]
 
-            # Record the properties returned for this phonon:
-            general_stats.save_phonon_data(phonon)
-            general_stats.save_flight_data(flight)
+    thermal_conductivity = sum(interval.estimate for interval in intervals)
+    if cf.mfp_sampling_point_error is None:
+        return thermal_conductivity, None
+    write_intervals_into_file("Data/MFP sampling points.csv", intervals)
+    return thermal_conductivity, math.sqrt(sum(interval.variance for interval in intervals))
 
-            # Record trajectories of the first N phonons:
-            if index < cf.output_trajectories_of_first:
-                path_stats.save_phonon_path(flight)
 
-            # Heat capacity, Ref. PRB 88 155318 (2013):
-            omega = 2 * math.pi * phonon.f
-            part = scipy.constants.hbar * omega / (scipy.constants.k * cf.temp)
-            c_p = scipy.constants.k * part**2 * math.exp(part) / (math.exp(part) - 1)**2
+def integrate_adaptively(cf, material, entropy, tracer):
+    """Integrate the thermal conductivity by adaptive quadrature until its relative standard error
+    reaches the tolerance or the budget of phonons is spent. Returns the integral and its standard error"""
+    generator = np.random.default_rng(np.random.SeedSequence(entropy))
+    quadrature = AdaptiveQuadrature(len(BRANCHES), material.dispersion[-1, 0], cf.mfp_sampling_initial_intervals, generator)
 
-            # Thermal conductivity, Ref. Phys. Rev. 132 2461 (1963):
-            relax_time = flight.mean_free_path/phonon.speed
-            thermal_conductivity += (1/(6*(math.pi**2)))*c_p*(phonon.speed**2)*relax_time*(k_vector**2)*d_k_vector
+    interval_tasks = quadrature.new_tasks()
+    while interval_tasks:
+        tasks = []
+        for interval, k_vector in interval_tasks:
+            branch = BRANCHES[interval.branch_number].value
+            frequency = float(np.interp(k_vector, material.dispersion[:, 0], material.dispersion[:, branch]))
+            record_path = tracer.number_of_traced_phonons + len(tasks) < cf.output_trajectories_of_first
+            tasks.append((interval.branch_number, k_vector, frequency, record_path))
+        flights = tracer.trace(tasks)
+        integrands = [conductivity_integrand(cf.temp, frequency, speed, mean_free_path, k_vector)
+                      for (_, k_vector, frequency, _), (speed, mean_free_path) in zip(tasks, flights)]
+        quadrature.add_results(interval_tasks, integrands)
 
-    # Run additional calculations:
-    thermal_maps.calculate_thermal_conductivity()
+        if quadrature.standard_error <= cf.mfp_sampling_tolerance * abs(quadrature.estimate):
+            break
+        interval_tasks = quadrature.refine(tracer.budget - tracer.number_of_traced_phonons)
+
+    quadrature.write_into_file()
+    return quadrature.estimate, quadrature.standard_error
+
+
+class BoundaryMeanFreePaths:
+    """Table of boundary-limited mean free paths at the wave vectors of the uniform grid,
+    which depends only on the geometry and is reused for all temperatures"""
+
+    def __init__(self):
+        """Start with an empty table of (interval, wave vector, frequency) points"""
+        self.points = []
+
+
+def boundary_limited_config(cf):
+    """Return the configuration without internal scattering, so that phonons are limited only by boundaries"""
+    boundary_cf = copy.copy(cf)
+    boundary_cf.include_internal_scattering = False
+    boundary_cf.use_gray_approximation_mfp = True
+    boundary_cf.gray_approximation_mfp = math.inf
+    return boundary_cf
+
+
+def internal_mean_free_path(cf, material, frequency, speed, temperature):
+    """Mean free path of the phonon limited by internal scattering at the given temperature"""
+    if not cf.include_internal_scattering:
+        return math.inf
+    if cf.use_gray_approximation_mfp:
+        return cf.gray_approximation_mfp
+    return speed * get_relaxation_times(material, temperature).time(2 * math.pi * frequency)
+
+
+def combine_with_internal_scattering(cf, material, table, temperature):
+    """Integrate the thermal conductivity at the given temperature by combining the boundary-limited mean free path
+    of each phonon with internal scattering by Matthiessen's rule. Returns the integral and its standard error,
+    if it is known"""
+    thermal_conductivity = 0
+    variance = 0
+    for interval, k_vector, frequency in table.points:
+        speed = branch_speed(material, BRANCHES[interval.branch_number], frequency)
+        internal_mfp = internal_mean_free_path(cf, material, frequency, speed, temperature)
+        samples = []
+        for _, boundary_mfp in interval.samples:
+            mean_free_path = 1 / (1 / boundary_mfp + 1 / internal_mfp) if boundary_mfp > 0 else 0.0
+            samples.append((k_vector, conductivity_integrand(temperature, frequency, speed, mean_free_path, k_vector)))
+        combined_interval = Interval(interval.branch_number, interval.start, interval.end, samples)
+        thermal_conductivity += combined_interval.estimate
+        if len(samples) >= MIN_SAMPLES:
+            variance += combined_interval.variance
+
+    if cf.mfp_sampling_point_error is None:
+        return thermal_conductivity, None
+    return thermal_conductivity, math.sqrt(variance)
+
+
+def write_temperature_dependence(temperatures, results):
+    """Write the thermal conductivity and its error, if it is known, at each temperature into a file"""
+    data = np.array([[temperature, thermal_conductivity, error if error is not None else np.nan]
+                     for temperature, (thermal_conductivity, error) in zip(temperatures, results)])
+    filename = "Data/Thermal conductivity vs temperature.csv"
+    header = "T [K], K [W/mK], Error [W/mK]"
+    np.savetxt(filename, data, fmt='%1.4e', delimiter=",", header=header, encoding='utf-8')
+
+
+def main(cf, input_file=None, force=False):
+    """This is the main function, which integrates phonon dispersion to get thermal conductivity.
+    Returns the main results as a dictionary"""
+
+    print(f'Mean free path sampling of {cf.output_folder_name}')
+    start_time = time.time()
+    progress = Progress()
+
+    # Boundary-limited mean free paths do not depend on temperature and internal scattering,
+    # so they are stored in the cache under the hash of the other parameters:
+    boundary_cf = boundary_limited_config(cf)
+    boundary_hash = configuration_hash(boundary_cf, "boundary mean free paths", ["temp", "mfp_sampling_temperatures"])
+    cache_file = os.path.abspath(f"Results/Cache/{boundary_hash}.pickle")
 
     # Create the folder if it does not exist and copy input file there:
     if not os.path.exists("Results/" + cf.output_folder_name):
         os.makedirs("Results/" + cf.output_folder_name)
         os.makedirs("Results/" + cf.output_folder_name + '/Data')
+    if cf.use_memory_mapped_maps and not os.path.exists(f"Results/{cf.output_folder_name}/Data/Maps"):
+        os.makedirs(f"Results/{cf.output_folder_name}/Data/Maps")
     if input_file:
         shutil.copy(input_file, "Results/" + cf.output_folder_name)
+    initial_directory = os.getcwd()
     os.chdir("Results/" + cf.output_folder_name)
+    try:
+        # Initiate data structures:
+        material = sampling_material(cf)
+        scatter_stats = ScatteringData(cf)
+        general_stats = GeneralData()
+        segment_stats = SegmentData(cf)
+        path_stats = PathData()
+        scatter_maps = ScatteringMap()
+        thermal_maps = ThermalMaps(cf)
+        accumulators = {
+            "scatter_stats": scatter_stats,
+            "general_stats": general_stats,
+            "segment_stats": segment_stats,
+            "path_stats": path_stats,
+            "scatter_maps": scatter_maps,
+            "thermal_maps": thermal_maps,
+        }
+
+        # In the temperature scan, the boundary-limited mean free paths are traced once or taken from the cache:
+        is_temperature_scan = cf.mfp_sampling_temperatures is not None
+        table = BoundaryMeanFreePaths()
+        cached_data = dict(accumulators, boundary_mean_free_paths=table)
+        is_cached = is_temperature_scan and is_cache_enabled(cf) and not force and load_cached_results(cache_file, cached_data)
+        if is_cached:
+            print("The boundary-limited mean free paths are loaded from the cache. Use -f flag to recompute them.\n")
+
+        # Phonons of each branch and wave vector are independent, so they are traced in chunks by a pool of processes:
+        entropy = cf.random_seed if cf.random_seed is not None else np.random.SeedSequence().entropy
+        with contextlib.ExitStack() as stack:
+            if cf.number_of_processes == 1:
+                map_function = map
+            else:
+                map_function = stack.enter_context(multiprocessing.Pool(processes=cf.number_of_processes)).imap
+            tracer = ChunkTracer(boundary_cf if is_temperature_scan else cf, entropy, map_function, accumulators, progress)
+            progress.render(0, tracer.budget)
+            if is_temperature_scan and not is_cached:
+                table.points = sample_uniform_grid(boundary_cf, material, tracer, lambda f, speed, mfp, k: mfp)
+            elif cf.mfp_sampling_adaptive:
+                thermal_conductivity, thermal_conductivity_error = integrate_adaptively(cf, material, entropy, tracer)
+            elif not is_temperature_scan:
+                thermal_conductivity, thermal_conductivity_error = integrate_uniformly(cf, material, tracer)
+
+        # Thermal conductivity at each temperature is calculated from the same table:
+        if is_temperature_scan:
+            if is_cache_enabled(cf) and not is_cached:
+                writer = BackgroundWriter()
+                save_results_to_cache(writer, cache_file, cached_data, cf.result_cache_size_limit)
+                writer.close()
+            thermal_conductivity, thermal_conductivity_error = combine_with_internal_scattering(cf, material, table, cf.temp)
+            temperature_results = [combine_with_internal_scattering(cf, material, table, temperature)
+                                   for temperature in cf.mfp_sampling_temperatures]
+            write_temperature_dependence(cf.mfp_sampling_temperatures, temperature_results)
+
+        # Run additional calculations:
+        thermal_maps.calculate_thermal_conductivity()
+
+        # Save data into files:
+        general_stats.write_into_files()
+        scatter_stats.write_into_files()
+        segment_stats.write_into_files()
+        thermal_maps.write_into_files()
+        scatter_maps.write_into_files()
+        path_stats.write_into_files()
+
+        # Generate animation of phonon paths:
+        if cf.output_path_animation:
+            from freepaths.animation import create_animation
+            create_animation(cf)
+
+        # Analyze and plot the data:
+        sys.stdout.write("\rAnalyzing the data...")
+        from freepaths.output_plots import plot_data
+        plot_data(cf)
+
+        # Output general information:
+        summary = output_general_information(cf, start_time)
+        output_scattering_information(cf, scatter_stats)
 
-    # Save data into files:
-    general_stats.write_into_files()
-    scatter_stats.write_into_files()
-    segment_stats.write_into_files()
-    thermal_maps.write_into_files()
-    scatter_maps.write_into_files()
-    path_stats.write_into_files()
-
-    # Generate animation of phonon paths:
-    if cf.output_path_animation:
-        create_animation()
-
-    # Analyze and plot the data:
-    sys.stdout.write("\rAnalyzing the data...")
-    plot_data()
-
-    # Output general information:
-    output_general_information(start_time)
-    output_scattering_information(scatter_stats)
-
-    sys.stdout.write(f'\rSee the results in "Results/{cf.output_folder_name}" folder.\n')
-    sys.stdout.write(f"\rThermal conductivity = {thermal_conductivity}\n")
-    sys.stdout.write("\rThank you for using FreePATHS.\n")
+        sys.stdout.write(f'\rSee the results in "Results/{cf.output_folder_name}" folder.\n')
+        summary["Thermal conductivity (W/mK)"] = thermal_conductivity
+        if thermal_conductivity_error is None:
+            sys.stdout.write(f"\rThermal conductivity = {thermal_conductivity}\n")
+        else:
+            sys.stdout.write(f"\rThermal conductivity = {thermal_conductivity} ± {thermal_conductivity_error}"
+                             f" from {len(general_stats.frequencies)} phonons\n")
+            summary["Thermal conductivity error (W/mK)"] = thermal_conductivity_error
+        if is_temperature_scan:
+            for temperature, (conductivity, error) in zip(cf.mfp_sampling_temperatures, temperature_results):
+                sys.stdout.write(f"\rThermal conductivity at {temperature} K = {conductivity}"
+                                 + (f" ± {error}\n" if error is not None else "\n"))
+                summary[f"Thermal conductivity at {temperature} K (W/mK)"] = conductivity
+        sys.stdout.write("\rThank you for using FreePATHS.\n")
+        return summary
+    finally:
+        os.chdir(initial_directory)
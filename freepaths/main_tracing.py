@@ -3,90 +3,166 @@
 import os
 import sys
 import time
+import random
 import shutil
 
-# Modules:
-from freepaths.config import cf
+# Modules (plotting modules are imported only when needed, as matplotlib is slow to import):
 from freepaths.run_phonon import run_phonon
-from freepaths.phonon import Phonon
+from freepaths.phonon import PhononSource
 from freepaths.flight import Flight
 from freepaths.data import ScatteringData, GeneralData, SegmentData, PathData
 from freepaths.progress import Progress
-from freepaths.materials import Material
+from freepaths.materials import get_material
 from freepaths.maps import ScatteringMap, ThermalMaps
-from freepaths.output_info import output_general_information, output_scattering_information
-from freepaths.animation import create_animation
-from freepaths.output_plots import plot_data
+from freepaths.output_info import output_general_information, output_scattering_information, output_confidence_intervals
+from freepaths.writer import BackgroundWriter
+from freepaths.checkpoint import Checkpoint, load_checkpoint, delete_checkpoint
+from freepaths.cache import configuration_hash, is_cache_enabled, load_cached_results, save_results_to_cache
+from freepaths.uncertainty import PrecisionTracker
+from freepaths.profiling import StageProfiler
 
 
-def main(input_file):
+def main(cf, input_file=None, resume=False, force=False):
     """This is the main function, which works under Debye approximation.
-    It should be used to simulate phonon paths at low temperatures"""
+    It should be used to simulate phonon paths at low temperatures.
+    Returns the main results as a dictionary"""
 
     print(f'Simulation of {cf.output_folder_name}')
     start_time = time.time()
     progress = Progress()
 
-    # Initiate data structures:
-    material = Material(cf.media)
-    scatter_stats = ScatteringData()
-    general_stats = GeneralData()
-    segment_stats = SegmentData()
-    path_stats = PathData()
-    scatter_maps = ScatteringMap()
-    thermal_maps = ThermalMaps()
-
-    # For each phonon
-    for index in range(cf.number_of_phonons):
-        progress.render(index, cf.number_of_phonons)
-
-        # Initiate a phonon and its flight:
-        phonon = Phonon(material)
-        flight = Flight(phonon)
-
-        # Run this phonon through the structure:
-        run_phonon(phonon, flight, scatter_stats, segment_stats, thermal_maps, scatter_maps, material)
-
-        # Record the properties returned for this phonon:
-        general_stats.save_phonon_data(phonon)
-        general_stats.save_flight_data(flight)
-
-        # Record trajectories of the first N phonons:
-        if index < cf.output_trajectories_of_first:
-            path_stats.save_phonon_path(flight)
-
-    # Run additional calculations:
-    thermal_maps.calculate_thermal_conductivity()
-    thermal_maps.calculate_normalized_flux()
+    # Results of identical simulations are stored in the cache under the hash of all parameters:
+    cache_file = os.path.abspath(f"Results/Cache/{configuration_hash(cf, 'tracing')}.pickle")
+
     # Create the folder if it does not exist and copy input file there:
     if not os.path.exists(f"Results/{cf.output_folder_name}"):
         os.makedirs(f"Results/{cf.output_folder_name}")
         os.makedirs(f"Results/{cf.output_folder_name}/Data")
     if cf.output_path_animation and not os.path.exists(f"Results/{cf.output_folder_name}/Frames"):
         os.makedirs(f"Results/{cf.output_folder_name}/Frames")
+    if cf.use_memory_mapped_maps and not os.path.exists(f"Results/{cf.output_folder_name}/Data/Maps"):
+        os.makedirs(f"Results/{cf.output_folder_name}/Data/Maps")
     if input_file:
         shutil.copy(input_file, "Results/" + cf.output_folder_name)
+    initial_directory = os.getcwd()
     os.chdir("Results/" + cf.output_folder_name)
-
-    # Save data into files:
-    general_stats.write_into_files()
-    scatter_stats.write_into_files()
-    segment_stats.write_into_files()
-    thermal_maps.write_into_files()
-    scatter_maps.write_into_files()
-    path_stats.write_into_files()
-
-    # Generate animation of phonon paths:
-    if cf.output_path_animation:
-        create_animation()
-
-    # Analyze and plot the data:
-    sys.stdout.write("\rAnalyzing the data...")
-    plot_data()
-
-    # Output general information:
-    output_general_information(start_time)
-    output_scattering_information(scatter_stats)
-
-    sys.stdout.write(f'\rSee the results in "Results/{cf.output_folder_name}" folder.\n')
-    sys.stdout.write("\rThank you for using FreePATHS.\n")
+    writer = BackgroundWriter()
+    try:
+        # Initiate data structures:
+        material = get_material(cf.media, dispersion_file=cf.custom_dispersion_file,
+                                relaxation_time_file=cf.custom_relaxation_time_file, density=cf.custom_density)
+        source = PhononSource(cf, material)
+        scatter_stats = ScatteringData(cf)
+        general_stats = GeneralData()
+        segment_stats = SegmentData(cf)
+        path_stats = PathData()
+        scatter_maps = ScatteringMap()
+        thermal_maps = ThermalMaps(cf)
+        precision = PrecisionTracker(cf)
+        profiler = StageProfiler() if cf.output_stage_profile else None
+        checkpoint = Checkpoint(cf)
+        paths_written = False
+
+        # All the data that must be saved to continue the simulation after an interruption:
+        accumulators = {
+            "scatter_stats": scatter_stats,
+            "general_stats": general_stats,
+            "segment_stats": segment_stats,
+            "path_stats": path_stats,
+            "scatter_maps": scatter_maps,
+            "thermal_maps": thermal_maps,
+            "source": source,
+            "precision": precision,
+        }
+        if cf.random_seed is not None:
+            random.seed(cf.random_seed)
+        first_index = load_checkpoint(accumulators) if resume else 0
+
+        # If this simulation was already done, take the results from the cache instead of tracing,
+        # unless the time of tracing is profiled:
+        is_cached = is_cache_enabled(cf) and not force and not profiler and load_cached_results(cache_file, accumulators)
+        if is_cached:
+            print("The results are loaded from the cache. Use -f flag to recompute them.\n")
+            first_index = cf.number_of_phonons
+
+        # For each phonon
+        for index in range(first_index, cf.number_of_phonons):
+            progress.render(index, cf.number_of_phonons)
+
+            # Initiate a phonon and its flight:
+            phonon = source.phonon(index)
+            flight = Flight(phonon)
+
+            # Run this phonon through the structure:
+            run_phonon(cf, phonon, flight, scatter_stats, segment_stats, thermal_maps, scatter_maps, material, profiler)
+
+            # Record the properties returned for this phonon:
+            general_stats.save_phonon_data(phonon)
+            general_stats.save_flight_data(flight)
+            precision.add_flight(flight)
+
+            # Record trajectories of the first N phonons and write them while tracing continues:
+            if index < cf.output_trajectories_of_first:
+                path_stats.save_phonon_path(flight)
+                if index == cf.output_trajectories_of_first - 1:
+                    writer.submit(path_stats.write_into_files)
+                    paths_written = True
+
+            # After each batch of phonons, check if the results are already precise enough:
+            if (index + 1) % cf.precision_batch_size == 0:
+                precision.add_batch(thermal_maps, scatter_stats, segment_stats)
+                if precision.is_precise(thermal_maps):
+                    sys.stdout.write(f"\rTarget precision is reached after {index + 1} phonons.\n")
+                    break
+
+            # Periodically save the state of the simulation:
+            if checkpoint.is_due(index + 1):
+                checkpoint.save(writer, index + 1, accumulators)
+
+        # Store the results for future runs:
+        if is_cache_enabled(cf) and not is_cached:
+            save_results_to_cache(writer, cache_file, accumulators, cf.result_cache_size_limit)
+
+        # Run additional calculations:
+        thermal_maps.calculate_thermal_conductivity()
+        thermal_maps.calculate_normalized_flux()
+
+        # Save data into files and wait until everything is written:
+        writer.submit(general_stats.write_into_files)
+        writer.submit(scatter_stats.write_into_files)
+        writer.submit(segment_stats.write_into_files)
+        writer.submit(thermal_maps.write_into_files)
+        writer.submit(scatter_maps.write_into_files)
+        writer.submit(precision.write_into_files)
+        if profiler:
+            writer.submit(profiler.write_into_files)
+        if not paths_written:
+            writer.submit(path_stats.write_into_files)
+        writer.close()
+        delete_checkpoint()
+
+        # Generate animation of phonon paths:
+        if cf.output_path_animation:
+            from freepaths.animation import create_animation
+            create_animation(cf)
+
+        # Analyze and plot the data:
+        sys.stdout.write("\rAnalyzing the data...")
+        from freepaths.output_plots import plot_data
+        plot_data(cf)
+
+        # Output general information:
+        summary = output_general_information(cf, start_time)
+        output_scattering_information(cf, scatter_stats, precision)
+        summary.update(output_confidence_intervals(cf, precision, thermal_maps))
+
+        sys.stdout.write(f'\rSee the results in "Results/{cf.output_folder_name}" folder.\n')
+        sys.stdout.write("\rThank you for using FreePATHS.\n")
+        return summary
+    finally:
+        # Queued files have paths relative to the results folder, so they are written before leaving it,
+        # also when the simulation is interrupted:
+        try:
+            writer.close()
+        finally:
+            os.chdir(initial_directory)
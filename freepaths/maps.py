@@ -5,7 +5,6 @@ from math import cos
 from scipy.constants import hbar, pi
 import numpy as np
 from math import cos , sin
-from freepaths.config import cf
 
 
 class ScatteringMap:
@@ -38,6 +37,11 @@ class ScatteringMap:
             self.specular_scattering_map_x.append(ph.x)
             self.specular_scattering_map_y.append(ph.y)
 
+    def merge(self, other):
+        """Add the scattering events recorded by another process"""
+        for name, values in vars(other).items():
+            getattr(self, name).extend(values)
+
     def write_into_files(self):
         """Write scattering map into file"""
 
@@ -66,117 +70,157 @@ class ScatteringMap:
 class ThermalMaps:
     """Maps and profiles of thermal energy in the structure"""
 
-    def __init__(self):
+    def __init__(self, cf):
         """Initialize arrays of thermal maps"""
-        self.thermal_map = np.zeros((cf.number_of_pixels_y, cf.number_of_pixels_x))
-        self.heat_flux_profile_x = np.zeros((cf.number_of_pixels_x, cf.number_of_timeframes))
-        self.heat_flux_profile_y = np.zeros((cf.number_of_pixels_y, cf.number_of_timeframes))
-        self.temperature_profile_x = np.zeros((cf.number_of_pixels_x, cf.number_of_timeframes))
-        self.temperature_profile_y = np.zeros((cf.number_of_pixels_y, cf.number_of_timeframes))
+        self.cf = cf
+        self.memory_maps = []
+        self.thermal_map = self.allocate("Thermal map", (cf.number_of_pixels_y, cf.number_of_pixels_x))
+        self.heat_flux_profile_x = self.allocate("Heat flux profile x", (cf.number_of_pixels_x, cf.number_of_timeframes))
+        self.heat_flux_profile_y = self.allocate("Heat flux profile y", (cf.number_of_pixels_y, cf.number_of_timeframes))
+        self.temperature_profile_x = self.allocate("Temperature profile x", (cf.number_of_pixels_x, cf.number_of_timeframes))
+        self.temperature_profile_y = self.allocate("Temperature profile y", (cf.number_of_pixels_y, cf.number_of_timeframes))
         self.thermal_conductivity = np.zeros((cf.number_of_timeframes, 2))
-        self.heat_flux_map_norm = np.zeros((cf.number_of_pixels_y, cf.number_of_pixels_x))
-        self.heat_flux_map_x = np.zeros((cf.number_of_pixels_y, cf.number_of_pixels_x))
-        self.heat_flux_map_y = np.zeros((cf.number_of_pixels_y, cf.number_of_pixels_x))
-        self.nor = np.zeros((cf.number_of_pixels_y, cf.number_of_pixels_x))
-        self.nor_heat_flux_y_map = np.zeros((cf.number_of_pixels_y, cf.number_of_pixels_x))
-        self.nor_heat_flux_x_map = np.zeros((cf.number_of_pixels_y, cf.number_of_pixels_x))
+        self.heat_flux_map_norm = self.allocate("Heat flux map norm", (cf.number_of_pixels_y, cf.number_of_pixels_x))
+        self.heat_flux_map_x = self.allocate("Heat flux map x", (cf.number_of_pixels_y, cf.number_of_pixels_x))
+        self.heat_flux_map_y = self.allocate("Heat flux map y", (cf.number_of_pixels_y, cf.number_of_pixels_x))
+        self.nor = self.allocate("Number of phonons map", (cf.number_of_pixels_y, cf.number_of_pixels_x))
+        self.nor_heat_flux_y_map = self.allocate("Normalized heat flux map y", (cf.number_of_pixels_y, cf.number_of_pixels_x))
+        self.nor_heat_flux_x_map = self.allocate("Normalized heat flux map x", (cf.number_of_pixels_y, cf.number_of_pixels_x))
+
+    def allocate(self, name, shape):
+        """Allocate an array of zeros either in memory or, if requested,
+        in a memory-mapped .npy file in the Data/Maps folder"""
+        if not self.cf.use_memory_mapped_maps:
+            return np.zeros(shape)
+        memory_map = np.lib.format.open_memmap(f"Data/Maps/{name}.npy", mode="w+", dtype=np.float64, shape=shape)
+        self.memory_maps.append(memory_map)
+
+        # Plain ndarray view of the same buffer is faster to index element by element:
+        return memory_map.view(np.ndarray)
+
+    def __getstate__(self):
+        """Pickle the content of the arrays but not the memory maps behind them"""
+        state = self.__dict__.copy()
+        del state["memory_maps"]
+        return state
+
+    def merge(self, other):
+        """Add the maps and profiles recorded by another process, arrays are added in place to keep memory maps"""
+        for name in ["thermal_map", "heat_flux_profile_x", "heat_flux_profile_y", "temperature_profile_x",
+                     "temperature_profile_y", "heat_flux_map_norm", "heat_flux_map_x", "heat_flux_map_y", "nor"]:
+            getattr(self, name)[...] += getattr(other, name)
 
     def add_energy_to_maps(self, ph, timestep_number, material):
         """This function registers the phonon in the pixel corresponding to its current position
         and at certain timesteps and adds it to thermal maps and thermal profiles"""
 
         # Calculate the index of the pixel in which this phonon is now:
-        index_x = int(((ph.x + cf.width / 2) * cf.number_of_pixels_x) // cf.width)
+        index_x = int(((ph.x + self.cf.width / 2) * self.cf.number_of_pixels_x) // self.cf.width)
         # index_y = int((ph.y*number_of_pixels_y) // length)
-        index_y = int(ph.y // (cf.length / cf.number_of_pixels_y))
+        index_y = int(ph.y // (self.cf.length / self.cf.number_of_pixels_y))
 
         # Calculate the volume of this pixel:
-        vol_cell = cf.length * cf.thickness * cf.width
-        vol_cell_x = vol_cell / cf.number_of_pixels_x
-        vol_cell_y = vol_cell / cf.number_of_pixels_y
-        vol_pixel =  vol_cell/(cf.number_of_pixels_x*cf.number_of_pixels_y)
+        vol_cell = self.cf.length * self.cf.thickness * self.cf.width
+        vol_cell_x = vol_cell / self.cf.number_of_pixels_x
+        vol_cell_y = vol_cell / self.cf.number_of_pixels_y
+        vol_pixel =  vol_cell/(self.cf.number_of_pixels_x*self.cf.number_of_pixels_y)
         # Here we arbitrarily correct the volume of the unit cells in pillars:
-        if cf.include_pillars == 'yes':
-            vol_cell_x += 2.5 * 0.3333 * cf.pillar_height * (cf.circular_hole_diameter / 2) ** 2
-            vol_cell_y += 2.5 * 0.3333 * cf.pillar_height * (cf.circular_hole_diameter / 2) ** 2
+        if self.cf.include_pillars == 'yes':
+            vol_cell_x += 2.5 * 0.3333 * self.cf.pillar_height * (self.cf.circular_hole_diameter / 2) ** 2
+            vol_cell_y += 2.5 * 0.3333 * self.cf.pillar_height * (self.cf.circular_hole_diameter / 2) ** 2
 
         # Prevent error if the phonon is outside the structure:
-        if (0 <= index_x < cf.number_of_pixels_x) and (0 <= index_y < cf.number_of_pixels_y):
+        if (0 <= index_x < self.cf.number_of_pixels_x) and (0 <= index_y < self.cf.number_of_pixels_y):
 
-            # Record energy h*w of this phonon into the pixel of thermal map:
-            energy = hbar * 2 * pi * ph.f
+            # Record energy h*w of this phonon, multiplied by its statistical weight, into the pixel of thermal map:
+            energy = hbar * 2 * pi * ph.f * ph.weight
             self.thermal_map[index_y, index_x] += energy
-            self.heat_flux_map_norm[index_y, index_x] += np.sqrt((energy * sin(ph.theta) * abs(cos(ph.phi)) * ph.speed /cf.thickness/vol_pixel)**2 +(energy * cos(ph.theta) * abs(cos(ph.phi)) * ph.speed /cf.thickness/vol_pixel)**2)
-            self.heat_flux_map_x[index_y, index_x] += (energy * sin(ph.theta) * abs(cos(ph.phi)) * ph.speed /cf.thickness/ vol_pixel)
-            self.heat_flux_map_y[index_y, index_x] += (energy * cos(ph.theta) * abs(cos(ph.phi)) * ph.speed /cf.thickness/ vol_pixel)
-            self.nor[index_y, index_x] += 1
+            self.heat_flux_map_norm[index_y, index_x] += np.sqrt((energy * sin(ph.theta) * abs(cos(ph.phi)) * ph.speed /self.cf.thickness/vol_pixel)**2 +(energy * cos(ph.theta) * abs(cos(ph.phi)) * ph.speed /self.cf.thickness/vol_pixel)**2)
+            self.heat_flux_map_x[index_y, index_x] += (energy * sin(ph.theta) * abs(cos(ph.phi)) * ph.speed /self.cf.thickness/ vol_pixel)
+            self.heat_flux_map_y[index_y, index_x] += (energy * cos(ph.theta) * abs(cos(ph.phi)) * ph.speed /self.cf.thickness/ vol_pixel)
+            self.nor[index_y, index_x] += ph.weight
             # Record energy of this phonon into flux and temperature profiles: (DOUBLE-CHECK THIS)
-            random_timeframe = random.randint(0, cf.number_of_timesteps)
-            assigned_time = (timestep_number + random_timeframe) * cf.timestep * cf.number_of_timeframes
-            total_time = cf.number_of_timesteps * cf.timestep
+            random_timeframe = random.randint(0, self.cf.number_of_timesteps)
+            assigned_time = (timestep_number + random_timeframe) * self.cf.timestep * self.cf.number_of_timeframes
+            total_time = self.cf.number_of_timesteps * self.cf.timestep
             timeframe_number = int(assigned_time // total_time)
 
-            if timeframe_number < cf.number_of_timeframes:
+            if timeframe_number < self.cf.number_of_timeframes:
                 self.heat_flux_profile_x[index_x, timeframe_number] += energy * cos(ph.theta) * abs(cos(ph.phi)) * ph.speed / vol_cell_x
                 self.heat_flux_profile_y[index_y, timeframe_number] += energy * cos(ph.theta) * abs(cos(ph.phi)) * ph.speed / vol_cell_y
-                self.temperature_profile_x[index_x, timeframe_number] += energy / (cf.specific_heat_capacity * material.density) / vol_cell_x
-                self.temperature_profile_y[index_y, timeframe_number] += energy / (cf.specific_heat_capacity * material.density) / vol_cell_y
+                self.temperature_profile_x[index_x, timeframe_number] += energy / (self.cf.specific_heat_capacity * material.density) / vol_cell_x
+                self.temperature_profile_y[index_y, timeframe_number] += energy / (self.cf.specific_heat_capacity * material.density) / vol_cell_y
     
     def calculate_normalized_flux(self):
+        """Calculate heat flux maps normalized by the number of phonons registered in each pixel"""
+        visited = self.nor != 0
+        np.divide(self.heat_flux_map_y, self.nor, out=self.nor_heat_flux_y_map, where=visited)
+        np.divide(self.heat_flux_map_x, self.nor, out=self.nor_heat_flux_x_map, where=visited)
 
-        for j in range(cf.number_of_pixels_x):
-            for i in range(cf.number_of_pixels_y):
-                if self.nor[i,j] != 0:
-                    self.nor_heat_flux_y_map[i,j] = self.heat_flux_map_y[i,j] / self.nor[i,j]
-                    self.nor_heat_flux_x_map[i,j] = self.heat_flux_map_x[i,j] / self.nor[i,j]
-
-    
     def calculate_thermal_conductivity(self):
         """Calculate the thermal conductivity for each time interval from heat flux
         and temperature profiles accumulated in that interval"""
 
         # Initialize array for thermal conductivity in each time interval
-        self.thermal_conductivity[:, 0] = range(cf.number_of_timeframes)
-        total_time = cf.number_of_timesteps * cf.timestep * 1e9
-        self.thermal_conductivity[:, 0] *= total_time / cf.number_of_timeframes
+        self.thermal_conductivity[:, 0] = range(self.cf.number_of_timeframes)
+        total_time = self.cf.number_of_timesteps * self.cf.timestep * 1e9
+        self.thermal_conductivity[:, 0] *= total_time / self.cf.number_of_timeframes
+        self.thermal_conductivity[:, 1] = self.conductivity_from_profiles(self.heat_flux_profile_y, self.temperature_profile_y)
+
+    def conductivity_from_profiles(self, heat_flux_profile_y, temperature_profile_y):
+        """Calculate the thermal conductivity for each time interval from the given heat flux and temperature profiles"""
+        heat_flux_terms, temperature_differences = self.conductivity_terms(heat_flux_profile_y, temperature_profile_y)
+        return heat_flux_terms / temperature_differences
+
+    def conductivity_terms(self, heat_flux_profile_y, temperature_profile_y):
+        """Calculate the numerator J*dL and the denominator dT of the thermal conductivity for each time interval.
+        Both are linear in the profiles, so the terms of several parts of phonons add up to the terms of all phonons"""
+        heat_flux_terms = np.zeros(self.cf.number_of_timeframes)
+        temperature_differences = np.zeros(self.cf.number_of_timeframes)
 
         # For each time interval calculate the thermal conductivity:
-        for timeframe_number in range(cf.number_of_timeframes):
+        for timeframe_number in range(self.cf.number_of_timeframes):
             # Here we ignore the first pixel, because there are anomalies usually...
-            T_high = self.temperature_profile_y[1, timeframe_number]
-            T_low = self.temperature_profile_y[(cf.number_of_pixels_y - 1), timeframe_number]
+            T_high = temperature_profile_y[1, timeframe_number]
+            T_low = temperature_profile_y[(self.cf.number_of_pixels_y - 1), timeframe_number]
 
             # Temperature gradient:
             d_T = T_high - T_low
 
             # Average heat flux:
-            J = sum(self.heat_flux_profile_y[1:cf.number_of_pixels_y, timeframe_number]) / (cf.number_of_pixels_y - 1)
+            J = sum(heat_flux_profile_y[1:self.cf.number_of_pixels_y, timeframe_number]) / (self.cf.number_of_pixels_y - 1)
 
             # Here dL is shorter than actual length because we ignore 1st pixel and lose one more due to averaging:
-            d_L = (cf.number_of_pixels_y - 2) * cf.length / cf.number_of_pixels_y
+            d_L = (self.cf.number_of_pixels_y - 2) * self.cf.length / self.cf.number_of_pixels_y
 
-            # By definition, J = -K*grad(T), so the thermal conductivity:
-            self.thermal_conductivity[timeframe_number, 1] = J * d_L / d_T
+            # By definition, J = -K*grad(T), so the thermal conductivity is J * d_L / d_T:
+            heat_flux_terms[timeframe_number] = J * d_L
+            temperature_differences[timeframe_number] = d_T
+        return heat_flux_terms, temperature_differences
 
     def write_into_files(self):
         """Write thermal map into file"""
 
-        if cf.output_raw_thermal_map:
+        # Make sure that memory-mapped arrays are fully written on disk:
+        for memory_map in self.memory_maps:
+            memory_map.flush()
+
+        if self.cf.output_raw_thermal_map:
             np.savetxt("Data/Thermal map.csv", self.thermal_map, fmt='%1.2e', delimiter=",", encoding='utf-8')
-        if cf.output_raw_thermal_map:
+        if self.cf.output_raw_thermal_map:
             np.savetxt("Data/heat_flux_map_norm map.csv", self.heat_flux_map_norm, fmt='%1.2e', delimiter=",", encoding='utf-8')
-        if cf.output_raw_thermal_map:
+        if self.cf.output_raw_thermal_map:
             np.savetxt("Data/heat_flux_map_x map.csv", self.heat_flux_map_x, fmt='%1.2e', delimiter=",", encoding='utf-8')
-        if cf.output_raw_thermal_map:
+        if self.cf.output_raw_thermal_map:
             np.savetxt("Data/heat_flux_map_y map.csv", self.heat_flux_map_y, fmt='%1.2e', delimiter=",", encoding='utf-8')
-        if cf.output_raw_thermal_map:
+        if self.cf.output_raw_thermal_map:
             np.savetxt("Data/nor_heat_flux_y map.csv", self.nor_heat_flux_y_map, fmt='%1.2e', delimiter=",", encoding='utf-8')
             np.savetxt("Data/nor_heat_flux_x map.csv", self.nor_heat_flux_x_map, fmt='%1.2e', delimiter=",", encoding='utf-8')
         # Create coordinate arrays [um]
         num_of_points_x = self.temperature_profile_x.shape[0]
         num_of_points_y = self.temperature_profile_y.shape[0]
-        coordinates_x = np.arange(num_of_points_x) * 1e6 * cf.width / num_of_points_x
-        coordinates_y = np.arange(num_of_points_y) * 1e6 * cf.length / num_of_points_y
+        coordinates_x = np.arange(num_of_points_x) * 1e6 * self.cf.width / num_of_points_x
+        coordinates_y = np.arange(num_of_points_y) * 1e6 * self.cf.length / num_of_points_y
 
         # Saving all the profiles in the files:
         data_temp_x = np.vstack((coordinates_x, self.temperature_profile_x.T)).T
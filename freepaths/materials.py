@@ -1,14 +1,56 @@
 """Module that assigns physical properties according to chosen material"""
 
 import numpy as np
+from functools import lru_cache
 from freepaths.options import Materials
+from freepaths.relaxation_times import SCATTERING_RATES, TabulatedScatteringRates
+
+
+def read_columns(filename, names):
+    """Read columns of numbers from a CSV file (with optional header lines starting with #)
+    or arrays with given names from an NPZ file"""
+    if filename.lower().endswith(".npz"):
+        with np.load(filename) as data:
+            return [np.asarray(data[name], dtype=float) for name in names]
+    data = np.loadtxt(filename, delimiter=",", ndmin=2, encoding='utf-8')
+    return [data[:, column] for column in range(len(names))]
+
+
+class GroupVelocityTable:
+    """Group velocity of one dispersion branch tabulated on a uniform grid of frequencies,
+    so that the velocity at any frequency is found without searching"""
+
+    def __init__(self, frequencies, speeds, num_points=10000):
+        """Tabulate velocities given along the branch from k = 0 up to the maximum of the branch"""
+        top = np.argmax(frequencies)
+        self.max_frequency = frequencies[top]
+        self.frequency_step = self.max_frequency / (num_points - 1)
+        self.speeds = np.interp(np.linspace(0, self.max_frequency, num_points), frequencies[:top + 1], speeds[:top + 1])
+
+        # Python list is faster than array to look up one velocity at a time:
+        self.speed_list = self.speeds.tolist()
+
+    def speed(self, frequency):
+        """Group velocity at the given frequency"""
+        position = frequency / self.frequency_step
+        index = min(int(position), len(self.speed_list) - 2)
+        fraction = position - index
+        return self.speed_list[index] + fraction * (self.speed_list[index + 1] - self.speed_list[index])
+
+    def speeds_at(self, frequencies):
+        """Group velocities at an array of frequencies"""
+        positions = np.asarray(frequencies) / self.frequency_step
+        indices = np.minimum(positions.astype(int), len(self.speeds) - 2)
+        fractions = positions - indices
+        return self.speeds[indices] + fractions * (self.speeds[indices + 1] - self.speeds[indices])
 
 
 class Material:
     """Material of the simulated media with certain physical properties"""
 
-    def __init__(self, material, num_points=1000):
+    def __init__(self, material, num_points=1000, dispersion_file=None, relaxation_time_file=None, density=None):
         self.name = material
+        self.scattering_rates = SCATTERING_RATES.get(material)
 
         if self.name == Materials.Si:  # Ref. APL 95 161901 (2009)
             A1 = 1369.42
@@ -20,11 +62,9 @@ class Material:
             D2 = 7.967e-29
             self.default_speed = 6000   # [m/s] This is the speed for Debye approximation
             self.density = 2330         # [kg/m^3]
-            self.dispersion = np.zeros((num_points, 4))
-            self.dispersion[:, 0] = [k * 12e9 / (num_points - 1) for k in range(num_points)]                         # Wavevectors
-            self.dispersion[:, 1] = [abs(A1 * k + B1 * k**2 + C1 * k**3) for k in self.dispersion[:, 0]]             # LA branch
-            self.dispersion[:, 2] = [abs(A2 * k + B2 * k**2 + C2 * k**3 + D2 * k**4) for k in self.dispersion[:, 0]] # TA branch
-            self.dispersion[:, 3] = self.dispersion[:, 2]
+            max_wavevector = 12e9
+            la_coefficients = [C1, B1, A1, 0]      # LA branch, from the highest power of k
+            ta_coefficients = [D2, C2, B2, A2, 0]  # TA branch
 
         elif self.name == Materials.SiC:  # Ref. PRB 50 17054 (1994)
             A1 = 1737.36296
@@ -35,11 +75,9 @@ class Material:
             C2 = -2.21696e-19
             self.default_speed = 6500   # [m/s] Need to change this probably!
             self.density = 3215         # [kg/m^3]
-            self.dispersion = np.zeros((num_points, 4))
-            self.dispersion[:, 0] = [k * 14414281503 / (num_points - 1) for k in range(num_points)]       # Wavevectors
-            self.dispersion[:, 1] = [abs(C1 * k**3 + B1 * k**2 + A1 * k) for k in self.dispersion[:, 0]]  # LA branch
-            self.dispersion[:, 2] = [abs(C2 * k**3 + B2 * k**2 + A2 * k) for k in self.dispersion[:, 0]]  # TA branch
-            self.dispersion[:, 3] = self.dispersion[:, 2]
+            max_wavevector = 14414281503
+            la_coefficients = [C1, B1, A1, 0]      # LA branch, from the highest power of k
+            ta_coefficients = [C2, B2, A2, 0]      # TA branch
 
         elif self.name == Materials.Diamond:  # Ref. Carbon 91 266-274 (2015)
             A1 = 4309.95222
@@ -50,11 +88,9 @@ class Material:
             C2 = -5.042335e-18
             self.default_speed = 20000  # [m/s]
             self.density = 3500         # [kg/m^3]
-            self.dispersion = np.zeros((num_points, 4))
-            self.dispersion[:, 0] = [k * 11707071561.7 / (num_points - 1) for k in range(num_points)]     # Wavevectors
-            self.dispersion[:, 1] = [abs(C1 * k**3 + B1 * k**2 + A1 * k) for k in self.dispersion[:, 0]]  # LA branch
-            self.dispersion[:, 2] = [abs(C2 * k**3 + B2 * k**2 + A2 * k) for k in self.dispersion[:, 0]]  # TA branch
-            self.dispersion[:, 3] = self.dispersion[:, 2]
+            max_wavevector = 11707071561.7
+            la_coefficients = [C1, B1, A1, 0]      # LA branch, from the highest power of k
+            ta_coefficients = [C2, B2, A2, 0]      # TA branch
 
         elif self.name == Materials.AlN:  # Ref. PRB 58 12899 (1998)
             A1 = 946.677
@@ -65,11 +101,77 @@ class Material:
             C2 = -3.047928e-18
             self.default_speed = 6200     # [m/s]
             self.density = 3255           # [kg/m^3]
-            self.dispersion = np.zeros((num_points, 4))
-            self.dispersion[:, 0] = [k * 12576399382.998995 / (num_points - 1) for k in range(num_points)]  # Wavevectors
-            self.dispersion[:, 1] = [abs(C1 * k**3 + B1 * k**2 + A1 * k) for k in self.dispersion[:, 0]]    # LA branch
-            self.dispersion[:, 2] = [abs(C2 * k**3 + B2 * k**2 + A2 * k) for k in self.dispersion[:, 0]]    # TA branch
-            self.dispersion[:, 3] = self.dispersion[:, 2]
+            max_wavevector = 12576399382.998995
+            la_coefficients = [C1, B1, A1, 0]      # LA branch, from the highest power of k
+            ta_coefficients = [C2, B2, A2, 0]      # TA branch
+
+        elif self.name == Materials.Custom:  # Tabulated data provided by the user
+            self.density = density
+            self.build_tables_from_files(num_points, dispersion_file, relaxation_time_file)
 
         else:
             raise ValueError('Specified material does not exist in the database')
+
+        if self.name != Materials.Custom:
+            self.build_tables_from_polynomials(num_points, max_wavevector, la_coefficients, ta_coefficients)
+
+    def build_tables_from_polynomials(self, num_points, max_wavevector, la_coefficients, ta_coefficients):
+        """Calculate dispersion and group velocity tables from polynomials of the branches"""
+        # Dispersion table, columns are wavevector, LA, TA, and TA frequencies:
+        wavevectors = np.arange(num_points) * max_wavevector / (num_points - 1)
+        self.dispersion = np.zeros((num_points, 4))
+        self.dispersion[:, 0] = wavevectors
+        self.dispersion[:, 1] = np.abs(np.polyval(la_coefficients, wavevectors))
+        self.dispersion[:, 2] = np.abs(np.polyval(ta_coefficients, wavevectors))
+        self.dispersion[:, 3] = self.dispersion[:, 2]
+
+        # Fine tables of the branches with group velocities 2*pi*df/dk to look them up by frequency:
+        fine_wavevectors = np.linspace(0, max_wavevector, 10000)
+        la_branch = (np.abs(np.polyval(la_coefficients, fine_wavevectors)),
+                     2 * np.pi * np.abs(np.polyval(np.polyder(la_coefficients), fine_wavevectors)))
+        ta_branch = (np.abs(np.polyval(ta_coefficients, fine_wavevectors)),
+                     2 * np.pi * np.abs(np.polyval(np.polyder(ta_coefficients), fine_wavevectors)))
+        self.build_lookup_tables(la_branch, ta_branch)
+
+    def build_tables_from_files(self, num_points, dispersion_file, relaxation_time_file):
+        """Convert tabulated dispersion and relaxation times into the same tables as for other materials.
+        Dispersion file contains k [1/m], LA and TA frequencies [Hz] (NPZ arrays wavevectors, la, ta),
+        relaxation time file contains frequencies [Hz] and relaxation times [s] (NPZ arrays frequencies, times)"""
+        data_wavevectors, data_la, data_ta = read_columns(dispersion_file, ["wavevectors", "la", "ta"])
+        order = np.argsort(data_wavevectors)
+        data_wavevectors, data_la, data_ta = data_wavevectors[order], data_la[order], data_ta[order]
+
+        # Dispersion table resampled on the uniform grid of wavevectors:
+        wavevectors = np.linspace(0, data_wavevectors[-1], num_points)
+        self.dispersion = np.zeros((num_points, 4))
+        self.dispersion[:, 0] = wavevectors
+        self.dispersion[:, 1] = np.interp(wavevectors, data_wavevectors, data_la)
+        self.dispersion[:, 2] = np.interp(wavevectors, data_wavevectors, data_ta)
+        self.dispersion[:, 3] = self.dispersion[:, 2]
+
+        # Fine tables of the branches with group velocities 2*pi*df/dk from finite differences of the data:
+        fine_wavevectors = np.linspace(0, data_wavevectors[-1], 10000)
+        branches = []
+        for data_branch in [data_la, data_ta]:
+            frequencies = np.interp(fine_wavevectors, data_wavevectors, data_branch)
+            branches.append((frequencies, 2 * np.pi * np.abs(np.gradient(frequencies, fine_wavevectors))))
+        self.build_lookup_tables(*branches)
+        self.default_speed = self.speed_la.speeds[0]
+
+        if relaxation_time_file is not None:
+            frequencies, times = read_columns(relaxation_time_file, ["frequencies", "times"])
+            self.scattering_rates = TabulatedScatteringRates(frequencies, times)
+
+    def build_lookup_tables(self, la_branch, ta_branch):
+        """Find maxima of the branches and tabulate group velocities as functions of frequency"""
+        self.max_frequency_la = self.dispersion[:, 1].max()
+        self.max_frequency_ta = self.dispersion[:, 2].max()
+        self.speed_la = GroupVelocityTable(*la_branch)
+        self.speed_ta = GroupVelocityTable(*ta_branch)
+
+
+@lru_cache(maxsize=None)
+def get_material(material, num_points=1000, dispersion_file=None, relaxation_time_file=None, density=None):
+    """Return the material with its dispersion, which is calculated only once per process
+    and then shared by all simulations that run in this process"""
+    return Material(material, num_points, dispersion_file, relaxation_time_file, density)
@@ -9,6 +9,7 @@ class Materials(enum.Enum):
     SiC = 2
     Diamond = 3
     AlN = 4
+    Custom = 5
 
 
 class Distributions(enum.Enum):
@@ -22,6 +23,13 @@ class Distributions(enum.Enum):
     UNIFORM = 7
 
 
+class SamplingMethods(enum.Enum):
+    """Possible methods to sample initial states of phonons"""
+    RANDOM = 1
+    STRATIFIED = 2
+    SOBOL = 3
+
+
 class Polarizations(enum.Enum):
     """Possible polarizations of a phonon"""
     LA = 1
@@ -3,22 +3,28 @@
 import time
 import numpy as np
 
-from freepaths.config import cf
+from freepaths.data import scattering_percentages
 
 
-def output_general_information(start_time):
-    """This function outputs the simulation information into the Information.txt file"""
+def output_general_information(cf, start_time):
+    """This function outputs the simulation information into the Information.txt file
+    and returns the main results as a dictionary"""
     exit_angles = np.loadtxt("Data/All exit angles.csv")
-    percentage = (100 * np.count_nonzero(exit_angles) / cf.number_of_phonons)
+    weights = np.loadtxt("Data/All phonon weights.csv")
+
+    # Simulation can stop before NUMBER_OF_PHONONS, so percentages are calculated from the traced phonons,
+    # each counted with its statistical weight:
+    number_of_phonons = exit_angles.size
+    percentage = (100 * np.sum(weights[exit_angles != 0]) / number_of_phonons)
     print(f'\r{percentage}% of phonons reached the cold side.')
     exit_freq = np.loadtxt("Data/All detected frequencies.csv")
-    percentage_detector_1 = (100 * np.count_nonzero(exit_freq) / cf.number_of_phonons)
+    percentage_detector_1 = (100 * np.sum(weights[exit_freq != 0]) / number_of_phonons)
     print(f'\r{percentage_detector_1}% of phonons passsed the detector.')
     exit_freq_2 = np.loadtxt("Data/All detected frequencies_2.csv")
-    percentage_detector_2 = (100 * np.count_nonzero(exit_freq_2) / cf.number_of_phonons)
+    percentage_detector_2 = (100 * np.sum(weights[exit_freq_2 != 0]) / number_of_phonons)
     print(f'\r{percentage_detector_2}% of phonons passsed the detector.')
     exit_freq_3 = np.loadtxt("Data/All detected frequencies_3.csv")
-    percentage_detector_3 = (100 * np.count_nonzero(exit_freq_3) / cf.number_of_phonons)
+    percentage_detector_3 = (100 * np.sum(weights[exit_freq_3 != 0]) / number_of_phonons)
     print(f'\r{percentage_detector_3}% of phonons passsed the detector.')
     print(f'The simulation took about {int((time.time() - start_time)//60)} min. to run.')
     rest =percentage -percentage_detector_1 -percentage_detector_2 -percentage_detector_3 
@@ -27,7 +33,7 @@ def output_general_information(start_time):
         info = (
                 f'The simulation finished on {time.strftime("%d %B %Y")}, at {time.strftime("%H:%M")}.',
                 f'\nIt took about {int((time.time()-start_time)//60)} min to run.\n',
-                f'\nNumber of phonons = {cf.number_of_phonons}',
+                f'\nNumber of phonons = {number_of_phonons}',
                 f'\nNumber of timesteps = {cf.number_of_timesteps}',
                 f'\nLength of a timestep = {cf.timestep} s',
                 f'\nTemperature = {cf.temp} K\n',
@@ -45,62 +51,56 @@ def output_general_information(start_time):
                 f'\n{rest}% of the rest of phonons .\n'
         )
         file.writelines(info)
+        if cf.roulette_steps is not None:
+            file.write(f'\n{np.count_nonzero(weights == 0)} phonons were stopped by the Russian roulette.\n')
 
+    return {
+        "Number of phonons": number_of_phonons,
+        "Reached cold side (%)": percentage,
+        "Detector 1 (%)": percentage_detector_1,
+        "Detector 2 (%)": percentage_detector_2,
+        "Detector 3 (%)": percentage_detector_3,
+        "Run time (s)": round(time.time() - start_time, 1),
+    }
 
-def output_scattering_information(scatter_stats):
-    """Calculate and output general statistics on scattering events"""
-
-    # Calculate the percentage of different scattering events:
-    total = np.sum(scatter_stats.total)
-    total_wall = np.sum(scatter_stats.wall_diffuse) + np.sum(scatter_stats.wall_specular)
-    total_topbot = np.sum(scatter_stats.top_diffuse) + np.sum(scatter_stats.top_specular)
-    total_hole = np.sum(scatter_stats.hole_diffuse) + np.sum(scatter_stats.hole_specular)
-    total_pill = np.sum(scatter_stats.pillar_diffuse) + np.sum(scatter_stats.pillar_specular)
 
-    scat_on_walls = 100*(np.sum(scatter_stats.wall_diffuse) +
-                         np.sum(scatter_stats.wall_specular)) / total
-    scat_on_walls_diff = 100*np.sum(scatter_stats.wall_diffuse) / total_wall
-    scat_on_walls_spec = 100*np.sum(scatter_stats.wall_specular) / total_wall
+def output_scattering_information(cf, scatter_stats, precision=None):
+    """Calculate and output general statistics on scattering events,
+    with half-widths of their confidence intervals if they were estimated"""
 
-    scat_on_topbot = 100*(np.sum(scatter_stats.top_diffuse) +
-                          np.sum(scatter_stats.top_specular)) / total
-    scat_on_topbot_diff = 100*np.sum(scatter_stats.top_diffuse) / total_topbot
-    scat_on_topbot_spec = 100*np.sum(scatter_stats.top_specular) / total_topbot
+    # Calculate the percentage of different scattering events:
+    percentages = scattering_percentages(scatter_stats.totals())
+    errors = precision.scattering_intervals() if precision is not None else {}
 
-    retherm = 100*np.sum(scatter_stats.hot_side) / total
-    internal = 100*np.sum(scatter_stats.internal) / total
+    def percentage(name):
+        """Format the percentage of events with its error"""
+        if name in errors:
+            return f'{percentages[name]:.2f} ± {errors[name][1]:.2f}%'
+        return f'{percentages[name]:.2f}%'
 
     info1 = (
-            f'\n{scat_on_walls:.2f}% - scattering on side walls ',
-            f'({scat_on_walls_diff:.2f}% - diffuse, ',
-            f'{scat_on_walls_spec:.2f}% - specular)',
-            f'\n{scat_on_topbot:.2f}% - scattering on top and bottom walls ',
-            f'({scat_on_topbot_diff:.2f}% - diffuse, ',
-            f'{scat_on_topbot_spec:.2f}% - specular)',
-            f'\n{retherm:.2f}% - rethermalization at the hot side',
-            f'\n{internal:.2f}% - internal scattering processes',
+            f'\n{percentage("Side walls")} - scattering on side walls ',
+            f'({percentage("Side walls diffuse")} - diffuse, ',
+            f'{percentage("Side walls specular")} - specular)',
+            f'\n{percentage("Top and bottom")} - scattering on top and bottom walls ',
+            f'({percentage("Top and bottom diffuse")} - diffuse, ',
+            f'{percentage("Top and bottom specular")} - specular)',
+            f'\n{percentage("Rethermalization")} - rethermalization at the hot side',
+            f'\n{percentage("Internal")} - internal scattering processes',
     )
 
     if cf.include_holes:
-        scat_on_holes = 100*(np.sum(scatter_stats.hole_diffuse) +
-                             np.sum(scatter_stats.hole_specular)) / total
-        scat_on_holes_diff = 100*np.sum(scatter_stats.hole_diffuse) / total_hole
-        scat_on_holes_spec = 100*np.sum(scatter_stats.hole_specular) / total_hole
         info2 = (
-                f'\n{scat_on_holes:.2f}% - scattering on hole walls ',
-                f'({scat_on_holes_diff:.2f}% - diffuse, ',
-                f'{scat_on_holes_spec:.2f}% - specular)',
+                f'\n{percentage("Holes")} - scattering on hole walls ',
+                f'({percentage("Holes diffuse")} - diffuse, ',
+                f'{percentage("Holes specular")} - specular)',
         )
 
     if cf.include_pillars:
-        scat_on_pill = 100*(np.sum(scatter_stats.pillar_diffuse) +
-                            np.sum(scatter_stats.pillar_specular)) / total
-        scat_on_pill_diff = 100*np.sum(scatter_stats.pillar_diffuse) / total_pill
-        scat_on_pill_spec = 100*np.sum(scatter_stats.pillar_specular) / total_pill
         info3 = (
-                f'\n{scat_on_pill:.2f}% - scattering on pillar walls ',
-                f'({scat_on_pill_diff:.2f}% - diffuse, ',
-                f'{scat_on_pill_spec:.2f}% - specular)'
+                f'\n{percentage("Pillars")} - scattering on pillar walls ',
+                f'({percentage("Pillars diffuse")} - diffuse, ',
+                f'{percentage("Pillars specular")} - specular)'
         )
 
     # Write info into a text file:
@@ -110,3 +110,20 @@ def output_scattering_information(scatter_stats):
             file.writelines(info2)
         if cf.include_pillars:
             file.writelines(info3)
+
+
+def output_confidence_intervals(cf, precision, thermal_maps):
+    """Output the main results with half-widths of their confidence intervals into the terminal
+    and the Information.txt file, and return the half-widths and the thermal conductivity as a dictionary"""
+    lines = [f'\nConfidence intervals at {100 * cf.confidence_level:g}% level:\n']
+    errors = {}
+    for name, (value, half_width) in precision.intervals(thermal_maps).items():
+        quantity, unit = name.rsplit(" ", 1)
+        lines.append(f'\n{quantity} = {value:.4g} ± {half_width:.2g} {unit[1:-1]}')
+        if quantity == "Thermal conductivity":
+            errors[name] = value
+        errors[f"{quantity} error {unit}"] = half_width
+    print("".join(lines))
+    with open("Information.txt", "a", encoding="utf-8") as file:
+        file.writelines(lines + ["\n"])
+    return errors
@@ -5,7 +5,7 @@ import matplotlib.pyplot as plt
 from matplotlib.colors import LogNorm
 from matplotlib.patches import Rectangle, Circle
 
-from freepaths.config import cf
+from freepaths.data import read_phonon_paths
 from freepaths.output_structure import draw_structure
 import matplotlib.pyplot as plt
 
@@ -25,14 +25,22 @@ plt.rcParams['figure.dpi'] = 200
 plt.rcParams['savefig.dpi'] = 200
 plt.rcParams['legend.fontsize'] = 8
 
-def distribution_calculation(filename, data_range, number_of_nodes):
-    """Calculate distribution of numbers (histogram) in a given file"""
+def read_phonon_weights():
+    """Read statistical weights of phonons, which are all ones unless the phonon source is biased"""
+    return np.loadtxt("Data/All phonon weights.csv", encoding='utf-8')
+
+
+def distribution_calculation(filename, data_range, number_of_nodes, weights=None):
+    """Calculate distribution of numbers (histogram) in a given file.
+    If the file has one number per phonon, phonons can be counted with their weights"""
     data = np.loadtxt(filename, encoding='utf-8')
     if data_range is None:
         data_range = np.max(data)
     distribution = np.zeros((number_of_nodes, 2))
     distribution[:, 0] = np.linspace(0, data_range, number_of_nodes)
-    distribution[:, 1], _ = np.histogram(data[data != 0], number_of_nodes, range=(0, data_range))
+    if weights is not None:
+        weights = weights[data != 0]
+    distribution[:, 1], _ = np.histogram(data[data != 0], number_of_nodes, range=(0, data_range), weights=weights)
     return distribution
 
 
@@ -40,11 +48,13 @@ def angle_distribution_calculation():
     """Analyse measured phonon angles and create their distribution"""
     all_exit_angles = np.loadtxt("Data/All exit angles.csv", dtype='float', encoding='utf-8')
     initial_angles = np.loadtxt("Data/All initial angles.csv", dtype='float', encoding='utf-8')
+    weights = read_phonon_weights()
     distribution = np.zeros((360, 3))
     distribution[:, 0] = range(-180, 180)
     exit_angles = all_exit_angles[all_exit_angles != 0]
-    distribution[:, 1], _ = np.histogram(np.degrees(exit_angles), 360, range=(-180, 180))
-    distribution[:, 2], _ = np.histogram(np.degrees(initial_angles), 360, range=(-180, 180))
+    exit_weights = weights[all_exit_angles != 0]
+    distribution[:, 1], _ = np.histogram(np.degrees(exit_angles), 360, range=(-180, 180), weights=exit_weights)
+    distribution[:, 2], _ = np.histogram(np.degrees(initial_angles), 360, range=(-180, 180), weights=weights)
     return distribution
 
 
@@ -57,11 +67,11 @@ def wavelength_distribution_calculation(number_of_nodes):
     data_range = np.amax(wavelengths)
     distribution = np.zeros((number_of_nodes, 2))
     distribution[:, 0] = np.linspace(0, data_range, number_of_nodes)
-    distribution[:, 1], _ = np.histogram(wavelengths, number_of_nodes, range=(0, data_range))
+    distribution[:, 1], _ = np.histogram(wavelengths, number_of_nodes, range=(0, data_range), weights=read_phonon_weights())
     return distribution
 
 
-def plot_angle_distribution():
+def plot_angle_distribution(cf):
     """Plot distribution of angles"""
     angle_distributions = angle_distribution_calculation()
     fig, ax = plt.subplots()
@@ -76,7 +86,7 @@ def plot_angle_distribution():
     np.savetxt('Data/Distribution of angles.csv', angle_distributions, fmt='%1.3e', delimiter=",")
 
 
-def plot_free_path_distribution():
+def plot_free_path_distribution(cf):
     """Plot distribution of free path"""
     filename = "Data/All free paths.csv"
     free_path_distribution = distribution_calculation(filename, None, cf.number_of_nodes)
@@ -89,7 +99,7 @@ def plot_free_path_distribution():
     if cf.plots_in_terminal: plt.show()
     np.savetxt('Data/Distribution of free paths.csv', free_path_distribution, fmt='%1.3e', delimiter=",")
     
-def plot_free_path_in_x_distribution():
+def plot_free_path_in_x_distribution(cf):
     """Plot distribution of free path"""
     filename = "Data/All free paths in plane in x.csv"
     free_path_distribution = distribution_calculation(filename, None, cf.number_of_nodes)
@@ -102,7 +112,7 @@ def plot_free_path_in_x_distribution():
     if cf.plots_in_terminal: plt.show()
     np.savetxt('Data/Distribution of free paths in X direction.csv', free_path_distribution, fmt='%1.3e', delimiter=",")
 
-def plot_free_path_in_y_distribution():
+def plot_free_path_in_y_distribution(cf):
     """Plot distribution of free path"""
     filename = "Data/All free paths in plane in y.csv"
     free_path_distribution = distribution_calculation(filename, None, cf.number_of_nodes)
@@ -115,10 +125,10 @@ def plot_free_path_in_y_distribution():
     if cf.plots_in_terminal: plt.show()
     np.savetxt('Data/Distribution of free paths in Y direction.csv', free_path_distribution, fmt='%1.3e', delimiter=",")
 
-def plot_frequency_distribution():
+def plot_frequency_distribution(cf):
     """Plot distribution of frequencies"""
     filename = "Data/All initial frequencies.csv"
-    frequency_distribution = distribution_calculation(filename, None, cf.number_of_nodes)
+    frequency_distribution = distribution_calculation(filename, None, cf.number_of_nodes, read_phonon_weights())
     fig, ax = plt.subplots()
     ax.plot(frequency_distribution[:, 0], frequency_distribution[:, 1], 'royalblue')
     ax.set_xlabel('Frequency (Hz)', fontsize=12)
@@ -128,7 +138,7 @@ def plot_frequency_distribution():
     np.savetxt('Data/Distribution of initial frequencies.csv', frequency_distribution, fmt='%1.3e', delimiter=",")
 
 
-def plot_wavelength_distribution():
+def plot_wavelength_distribution(cf):
     """Plot distribution of wavelength"""
     wavelength_distribution = wavelength_distribution_calculation(cf.number_of_nodes)
     fig, ax = plt.subplots()
@@ -140,9 +150,9 @@ def plot_wavelength_distribution():
     np.savetxt('Data/Distribution of wavelengths.csv', wavelength_distribution, fmt='%1.3e', delimiter=",")
 
 
-def plot_travel_time_distribution():
+def plot_travel_time_distribution(cf):
     """Plot distribution of wavelength"""
-    travel_time_distribution = distribution_calculation("Data/All travel times.csv", None, cf.number_of_nodes)
+    travel_time_distribution = distribution_calculation("Data/All travel times.csv", None, cf.number_of_nodes, read_phonon_weights())
     fig, ax = plt.subplots()
     ax.plot(travel_time_distribution[:, 0] * 1e9, travel_time_distribution[:, 1], 'royalblue')
     ax.set_xlabel('Travel time (ns)', fontsize=12)
@@ -152,9 +162,9 @@ def plot_travel_time_distribution():
     np.savetxt('Data/Distribution of travel times.csv', travel_time_distribution, fmt='%1.3e', delimiter=",")
 
 
-def plot_mean_free_path_distribution():
+def plot_mean_free_path_distribution(cf):
     """Plot distribution of MFP per phonon"""
-    mean_free_path_distribution = distribution_calculation("Data/All mean free paths.csv", None, cf.number_of_nodes)
+    mean_free_path_distribution = distribution_calculation("Data/All mean free paths.csv", None, cf.number_of_nodes, read_phonon_weights())
     fig, ax = plt.subplots()
     ax.plot(mean_free_path_distribution[:, 0] * 1e9, mean_free_path_distribution[:, 1], 'royalblue')
     ax.set_xlabel('Mean free path (nm)', fontsize=12)
@@ -163,9 +173,9 @@ def plot_mean_free_path_distribution():
     if cf.plots_in_terminal: plt.show()
     np.savetxt('Data/Distribution of MFPs.csv', mean_free_path_distribution, fmt='%1.3e', delimiter=",")
 
-def plot_mean_free_path_in_x_distribution():
+def plot_mean_free_path_in_x_distribution(cf):
     """Plot distribution of MFP per phonon"""
-    mean_free_path_distribution = distribution_calculation("Data/All mean free paths in x.csv", None, cf.number_of_nodes)
+    mean_free_path_distribution = distribution_calculation("Data/All mean free paths in x.csv", None, cf.number_of_nodes, read_phonon_weights())
     fig, ax = plt.subplots()
     ax.plot(mean_free_path_distribution[:, 0] * 1e9, mean_free_path_distribution[:, 1], 'royalblue')
     ax.set_xlabel('Mean free path in X direction (nm)', fontsize=12)
@@ -174,9 +184,9 @@ def plot_mean_free_path_in_x_distribution():
     if cf.plots_in_terminal: plt.show()
     np.savetxt('Data/Distribution of MFPs in .csv', mean_free_path_distribution, fmt='%1.3e', delimiter=",")
 
-def plot_mean_free_path_in_y_distribution():
+def plot_mean_free_path_in_y_distribution(cf):
     """Plot distribution of MFP per phonon"""
-    mean_free_path_distribution = distribution_calculation("Data/All mean free paths in y.csv", None, cf.number_of_nodes)
+    mean_free_path_distribution = distribution_calculation("Data/All mean free paths in y.csv", None, cf.number_of_nodes, read_phonon_weights())
     fig, ax = plt.subplots()
     ax.plot(mean_free_path_distribution[:, 0] * 1e9, mean_free_path_distribution[:, 1], 'royalblue')
     ax.set_xlabel('Mean free path in y direction (nm)', fontsize=12)
@@ -186,9 +196,9 @@ def plot_mean_free_path_in_y_distribution():
     np.savetxt('Data/Distribution of MFPs in Y.csv', mean_free_path_distribution, fmt='%1.3e', delimiter=",")
 
         
-def plot_detected_frequency_distribution():
+def plot_detected_frequency_distribution(cf):
     """Plot distribution of detected frequencies"""
-    detected_frequency_distribution = distribution_calculation("Data/All detected frequencies.csv", None, cf.number_of_nodes)
+    detected_frequency_distribution = distribution_calculation("Data/All detected frequencies.csv", None, cf.number_of_nodes, read_phonon_weights())
     fig, ax = plt.subplots()
     ax.plot(detected_frequency_distribution[:, 0], detected_frequency_distribution[:, 1], 'royalblue')
     ax.set_xlabel('Frequency (Hz)', fontsize=12)
@@ -198,7 +208,7 @@ def plot_detected_frequency_distribution():
     np.savetxt('Data/Distribution of detected frequencies.csv', detected_frequency_distribution, fmt='%1.3e', delimiter=",")
 
 
-def plot_velocity_distribution():
+def plot_velocity_distribution(cf):
     """Plot distribution of group velocities"""
     fig, ax = plt.subplots()
     speeds = np.loadtxt("Data/All group velocities.csv")
@@ -210,7 +220,7 @@ def plot_velocity_distribution():
     if cf.plots_in_terminal: plt.show()
 
 
-def plot_time_in_segments():
+def plot_time_in_segments(cf):
     """Plot time spent in segments"""
     fig, ax = plt.subplots()
     segment, time = np.genfromtxt("Data/Time spent in segments.csv", unpack=True, delimiter=',', usecols=(0, 1), skip_header=1)
@@ -221,7 +231,7 @@ def plot_time_in_segments():
     if cf.plots_in_terminal: plt.show()
 
 
-def plot_thermal_conductivity():
+def plot_thermal_conductivity(cf):
     """Plot thermal conductivity against time segment"""
     fig, ax = plt.subplots()
     time, thermal_conductivity = np.genfromtxt("Data/Thermal conductivity.csv", unpack=True, delimiter=',', usecols=(0, 1), skip_header=1)
@@ -232,7 +242,7 @@ def plot_thermal_conductivity():
     if cf.plots_in_terminal: plt.show()
 
 
-def plot_temperature_profile():
+def plot_temperature_profile(cf):
     """Plot profile of temperature for each time segment"""
     fig, ax = plt.subplots()
     data = np.genfromtxt("Data/Temperature profiles y.csv", unpack=True, delimiter=',', skip_header=1, encoding='utf-8')
@@ -244,7 +254,7 @@ def plot_temperature_profile():
     if cf.plots_in_terminal: plt.show()
 
 
-def plot_heat_flux_profile():
+def plot_heat_flux_profile(cf):
     """Plot profile of heat flux for each time segment"""
     fig, ax = plt.subplots()
     data = np.genfromtxt("Data/Heat flux profiles y.csv", unpack=True, delimiter=',', skip_header=1, encoding='utf-8')
@@ -256,7 +266,7 @@ def plot_heat_flux_profile():
     if cf.plots_in_terminal: plt.show()
 
 
-def plot_thermal_map():
+def plot_thermal_map(cf):
     """Plot thermal map as color map"""
     fig = plt.figure()
     thermal_map = np.genfromtxt("Data/Thermal map.csv", unpack=False, delimiter=',', skip_header=0, encoding='utf-8')
@@ -272,7 +282,7 @@ def plot_thermal_map():
     fig.savefig("Thermal map.pdf", bbox_inches="tight")
     if cf.plots_in_terminal: plt.show()
 
-def plot_heat_flux_map_norm():
+def plot_heat_flux_map_norm(cf):
     """Plot thermal map as color map"""
     fig = plt.figure()
     heat_flux_map = np.genfromtxt("Data/heat_flux_map_norm map.csv", unpack=False, delimiter=',', skip_header=0, encoding='utf-8')
@@ -288,7 +298,7 @@ def plot_heat_flux_map_norm():
     fig.savefig("Heat flux map norm.pdf", bbox_inches="tight")
     if cf.plots_in_terminal: plt.show()
 
-def plot_heat_flux_map_x():
+def plot_heat_flux_map_x(cf):
     """Plot thermal map as color map"""
     fig = plt.figure()
     heat_flux_map = np.genfromtxt("Data/heat_flux_map_x map.csv", unpack=False, delimiter=',', skip_header=0, encoding='utf-8')
@@ -306,7 +316,7 @@ def plot_heat_flux_map_x():
     fig.savefig("Heat flux map x.pdf", bbox_inches="tight")
     if cf.plots_in_terminal: plt.show()
 
-def plot_heat_flux_map_y():
+def plot_heat_flux_map_y(cf):
     """Plot thermal map as color map"""
     fig = plt.figure()
     heat_flux_map = np.genfromtxt("Data/heat_flux_map_y map.csv", unpack=False, delimiter=',', skip_header=0, encoding='utf-8')
@@ -322,7 +332,7 @@ def plot_heat_flux_map_y():
     fig.savefig("Heat flux map y.pdf", bbox_inches="tight")
     if cf.plots_in_terminal: plt.show()
 
-def plot_nor_heat_flux_map_x():
+def plot_nor_heat_flux_map_x(cf):
     """Plot thermal map as color map"""
     fig = plt.figure()
     heat_flux_map = np.genfromtxt("Data/nor_heat_flux_x map.csv", unpack=False, delimiter=',', skip_header=0, encoding='utf-8')
@@ -338,7 +348,7 @@ def plot_nor_heat_flux_map_x():
     fig.savefig("Heat flux map normalised_x.pdf", bbox_inches="tight")
     if cf.plots_in_terminal: plt.show()
 
-def plot_nor_heat_flux_map_y():
+def plot_nor_heat_flux_map_y(cf):
     """Plot thermal map as color map"""
     fig = plt.figure()
     heat_flux_map = np.genfromtxt("Data/nor_heat_flux_y map.csv", unpack=False, delimiter=',', skip_header=0, encoding='utf-8')
@@ -354,7 +364,7 @@ def plot_nor_heat_flux_map_y():
     fig.savefig("Heat flux map normalised_y.pdf", bbox_inches="tight")
     if cf.plots_in_terminal: plt.show()  
 
-def plot_scattering_map():
+def plot_scattering_map(cf):
     """Plot the map of scattering events"""
     fig, ax = plt.subplots()
     filename = "Data/Scattering map.csv"
@@ -370,10 +380,10 @@ def plot_scattering_map():
     if cf.plots_in_terminal: plt.show()
 
 
-def plot_trajectories():
+def plot_trajectories(cf):
     """Plot the phonon trajectories"""
 
-    data = np.genfromtxt("Data/Phonon paths.csv", unpack=False, delimiter=',', skip_header=1, encoding='utf-8')
+    paths = read_phonon_paths()
 
     # Create XY plot:
     fig, ax = plt.subplots()
@@ -384,11 +394,8 @@ def plot_trajectories():
         ax.add_patch(patch)
 
     # Draw paths:
-    for index in range(cf.output_trajectories_of_first):
-        x_coordinates = np.trim_zeros(data[:, 3 * index], trim='b')
-        y_coordinates = np.trim_zeros(data[:, 3 * index + 1], trim='b')
-        max_steps = min([x_coordinates.shape[0], y_coordinates.shape[0]])
-        ax.plot(x_coordinates[:max_steps], y_coordinates[:max_steps], linewidth=0.2)
+    for path in paths:
+        ax.plot(path[:, 0], path[:, 1], linewidth=0.2)
 
     # Set labels:
     ax.set_xlabel('X (μm)', fontsize=12)
@@ -399,11 +406,8 @@ def plot_trajectories():
 
     # Create YZ plot:
     fig, ax = plt.subplots()
-    for index in range(cf.output_trajectories_of_first):
-        y_coordinates = np.trim_zeros(data[:, 3 * index + 1], trim='b')
-        z_coordinates = np.trim_zeros(data[:, 3 * index + 2], trim='b')
-        max_steps = min([y_coordinates.shape[0], z_coordinates.shape[0]])
-        ax.plot(y_coordinates[:max_steps], z_coordinates[:max_steps], linewidth=0.2)
+    for path in paths:
+        ax.plot(path[:, 1], path[:, 2], linewidth=0.2)
     ax.set_xlabel('Y (μm)', fontsize=12)
     ax.set_ylabel('Z (μm)', fontsize=12)
     ax.set_aspect('equal', 'datalim')
@@ -411,7 +415,7 @@ def plot_trajectories():
     if cf.plots_in_terminal: plt.show()
 
 
-def plot_scattering_statistics():
+def plot_scattering_statistics(cf):
     """Calculate and plot rates of different scattering events in each length segment"""
     # Load the data from files:
     filename = "Data/Scattering events statistics.csv"
@@ -448,31 +452,35 @@ def plot_scattering_statistics():
     np.savetxt(filename, data, fmt='%1.2e', delimiter=",", header=header)
 
 
-def plot_data():
+def plot_data(cf):
     """Create plots of various distributions"""
-    plot_trajectories()
-    #plot_angle_distribution()
-    #plot_free_path_distribution()
-    #plot_frequency_distribution()
-    #plot_wavelength_distribution()
-    #plot_travel_time_distribution()
-    #plot_mean_free_path_distribution()
-    #plot_free_path_in_x_distribution()
-    #plot_free_path_in_y_distribution()
-    #plot_mean_free_path_in_x_distribution()
-    #plot_mean_free_path_in_y_distribution()
-    #plot_detected_frequency_distribution()
-    #plot_velocity_distribution()
-    #plot_time_in_segments()
-    #plot_thermal_conductivity()
-    #plot_temperature_profile()
-    #plot_heat_flux_profile()
-    plot_thermal_map()
-    plot_heat_flux_map_norm()
-    plot_heat_flux_map_x()
-    plot_heat_flux_map_y()
-    #plot_nor_heat_flux_map_x()
-    #plot_nor_heat_flux_map_y()
-    #plot_scattering_statistics()
-    if cf.output_scattering_map:
-        plot_scattering_map()
+    try:
+        plot_trajectories(cf)
+        #plot_angle_distribution(cf)
+        #plot_free_path_distribution(cf)
+        #plot_frequency_distribution(cf)
+        #plot_wavelength_distribution(cf)
+        #plot_travel_time_distribution(cf)
+        #plot_mean_free_path_distribution(cf)
+        #plot_free_path_in_x_distribution(cf)
+        #plot_free_path_in_y_distribution(cf)
+        #plot_mean_free_path_in_x_distribution(cf)
+        #plot_mean_free_path_in_y_distribution(cf)
+        #plot_detected_frequency_distribution(cf)
+        #plot_velocity_distribution(cf)
+        #plot_time_in_segments(cf)
+        #plot_thermal_conductivity(cf)
+        #plot_temperature_profile(cf)
+        #plot_heat_flux_profile(cf)
+        plot_thermal_map(cf)
+        plot_heat_flux_map_norm(cf)
+        plot_heat_flux_map_x(cf)
+        plot_heat_flux_map_y(cf)
+        #plot_nor_heat_flux_map_x(cf)
+        #plot_nor_heat_flux_map_y(cf)
+        #plot_scattering_statistics(cf)
+        if cf.output_scattering_map:
+            plot_scattering_map(cf)
+    finally:
+        # Sweeps run many simulations in the same process, so figures must not pile up:
+        plt.close("all")
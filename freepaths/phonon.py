@@ -1,24 +1,74 @@
 """This module provides phonon class which generates and moves a phonon"""
 
-from math import pi, asin, exp, log
+from math import pi, asin, log
 from random import random, choice
+from bisect import bisect_right
+from functools import lru_cache
 from numpy import sign
 from scipy.constants import k, hbar
 import numpy as np
+import math
 import enum
 
-from freepaths.config import cf
-from freepaths.options import Distributions, Materials, Polarizations
+from freepaths.options import Distributions, Polarizations, SamplingMethods
 import freepaths.move
+from freepaths.relaxation_times import get_relaxation_times
+
+
+class PlanckDistribution:
+    """Cumulative Planck distribution of phonon frequencies in Debye approximation,
+    used to draw frequencies by inverting the cumulative distribution"""
+
+    def __init__(self, material, temperature, num_points=10000):
+        """Tabulate DOS ~ f^2 times energy hf times Bose-Einstein occupation and integrate it.
+        Frequencies are limited to five times the peak frequency and to the maximum of the LA branch"""
+        f_max = 2.82 * k * temperature / (2 * pi * hbar)
+        self.frequencies = np.linspace(0, min(5 * f_max, material.max_frequency_la), num_points)
+        distribution = np.zeros(num_points)
+        distribution[1:] = self.frequencies[1:]**3 / np.expm1(hbar * 2 * pi * self.frequencies[1:] / (k * temperature))
+        self.cumulative_distribution = np.zeros(num_points)
+        self.cumulative_distribution[1:] = np.cumsum((distribution[1:] + distribution[:-1]) / 2)
+        self.cumulative_distribution /= self.cumulative_distribution[-1]
+
+        # Python lists are faster than arrays to draw one frequency at a time:
+        self.frequency_list = self.frequencies.tolist()
+        self.cumulative_list = self.cumulative_distribution.tolist()
+
+    def draw(self, random_number):
+        """Convert a random number uniform in [0, 1) into a frequency"""
+        index = min(max(bisect_right(self.cumulative_list, random_number), 1), len(self.frequency_list) - 1)
+        left, right = self.cumulative_list[index - 1], self.cumulative_list[index]
+        fraction = (random_number - left) / (right - left) if right > left else 0.0
+        return self.frequency_list[index - 1] + fraction * (self.frequency_list[index] - self.frequency_list[index - 1])
+
+    def draw_many(self, random_numbers):
+        """Convert an array of random numbers uniform in [0, 1) into an array of frequencies"""
+        index = np.clip(np.searchsorted(self.cumulative_distribution, random_numbers, side="right"), 1, len(self.frequencies) - 1)
+        left, right = self.cumulative_distribution[index - 1], self.cumulative_distribution[index]
+        fraction = np.divide(random_numbers - left, right - left, out=np.zeros(len(index)), where=right > left)
+        return self.frequencies[index - 1] + fraction * (self.frequencies[index] - self.frequencies[index - 1])
+
+
+@lru_cache(maxsize=None)
+def get_planck_distribution(material, temperature):
+    """Return the Planck distribution, which is tabulated only once for each material and temperature"""
+    return PlanckDistribution(material, temperature)
+
+
+def branch_speed(material, polarization, frequency):
+    """Group velocity dw/dk at the frequency on the branch of the given polarization"""
+    if polarization == Polarizations.TA and frequency < material.max_frequency_ta:
+        return material.speed_ta.speed(frequency)
+    return material.speed_la.speed(frequency)
 
 
 class Phonon:
     """A phonon particle with various physical properties"""
 
-    def __init__(self, material, polarization=None, phonon_number=None):
+    def __init__(self, cf, material, polarization=None, frequency=None):
         """Initialize a phonon by assigning coordinates and other properties"""
+        self.cf = cf
         self.polarization = polarization
-        self.phonon_number = phonon_number
         self.x = None
         self.y = None
         self.z = None
@@ -26,19 +76,38 @@ class Phonon:
         self.phi = None
         self.theta = None
         self.speed = None
+        self.relaxation_time = None
+        self.weight = 1.0
 
         if polarization is None:
             self.assign_polarization()
         self.assign_coordinates()
         self.assign_angles()
-        if phonon_number is None:
+        if frequency is None:
             self.assign_frequency(material)
         else:
-            branch = polarization.value
-            self.f = abs((material.dispersion[phonon_number+1, branch] + material.dispersion[phonon_number, branch]) / 2)
+            self.f = frequency
         self.assign_speed(material)
         self.assign_internal_scattering_time(material)
 
+    @classmethod
+    def from_initial_states(cls, cf, states, index):
+        """Create the phonon with the given number from a batch of initial states"""
+        phonon = cls.__new__(cls)
+        phonon.cf = cf
+        phonon.polarization = Polarizations.TA if states.is_transverse[index] else Polarizations.LA
+        phonon.x = states.x[index]
+        phonon.y = states.y[index]
+        phonon.z = states.z[index]
+        phonon.f = states.f[index]
+        phonon.phi = states.phi[index]
+        phonon.theta = states.theta[index]
+        phonon.speed = states.speed[index]
+        phonon.relaxation_time = states.relaxation_time[index]
+        phonon.time_of_internal_scattering = states.time_of_internal_scattering[index]
+        phonon.weight = states.weight[index]
+        return phonon
+
     @property
     def wavelength(self):
         """Calculate wavelength of the phonon"""
@@ -48,14 +117,14 @@ class Phonon:
     def is_in_system(self):
         """Checks if the phonon at this timestep did not reach the cold side.
         Depending on where user set cold sides, we check if phonon crossed that line"""
-        is_inside_top = self.y < cf.length
+        is_inside_top = self.y < self.cf.length
         is_inside_bottom = self.y > 0
-        is_inside_right = self.x < cf.width / 2.0
-        is_inside_left = self.x > - cf.width / 2.0
-        return ((not cf.cold_side_position_top or is_inside_top) and
-                (not cf.cold_side_position_bottom or is_inside_bottom) and
-                (not cf.cold_side_position_right or is_inside_right) and
-                (not cf.cold_side_position_left or is_inside_left))
+        is_inside_right = self.x < self.cf.width / 2.0
+        is_inside_left = self.x > - self.cf.width / 2.0
+        return ((not self.cf.cold_side_position_top or is_inside_top) and
+                (not self.cf.cold_side_position_bottom or is_inside_bottom) and
+                (not self.cf.cold_side_position_right or is_inside_right) and
+                (not self.cf.cold_side_position_left or is_inside_left))
 
     def assign_polarization(self):
         """Assign branch of phonon dispersion"""
@@ -72,107 +141,233 @@ class Phonon:
         # Here we choose randomly a source:
         #source_number = choice(range(len(phonon_source_x)))
         #source_number = choice(range(len(phonon_source_y)))
-        #self.x = phonon_source_x[source_number] + 0.49 * cf.phonon_source_width_x * (2 * random() - 1)
-        self.x = cf.phonon_source_x + 0.49 * cf.phonon_source_width_x * (2 * random() - 1)
-        #self.y =  phonon_source_y[source_number] + 0.49 * cf.phonon_source_width_y * (2 * random() - 1)
-        self.y = cf.phonon_source_y + 0.49 * cf.phonon_source_width_y * (2 * random() - 1)
-        self.z = 0.49 * cf.thickness * (2 * random() - 1)
+        #self.x = phonon_source_x[source_number] + 0.49 * self.cf.phonon_source_width_x * (2 * random() - 1)
+        self.x = self.cf.phonon_source_x + 0.49 * self.cf.phonon_source_width_x * (2 * random() - 1)
+        #self.y =  phonon_source_y[source_number] + 0.49 * self.cf.phonon_source_width_y * (2 * random() - 1)
+        self.y = self.cf.phonon_source_y + 0.49 * self.cf.phonon_source_width_y * (2 * random() - 1)
+        self.z = 0.49 * self.cf.thickness * (2 * random() - 1)
 
     def assign_angles(self):
         """Depending on angle distribution, assign angles"""
-        if cf.phonon_source_angle_distribution == Distributions.RANDOM_UP:
+        if self.cf.phonon_source_angle_distribution == Distributions.RANDOM_UP:
             self.theta = -pi/2 + pi*random()
             self.phi = asin(2*random() - 1)
-        if cf.phonon_source_angle_distribution == Distributions.RANDOM_DOWN:
+        if self.cf.phonon_source_angle_distribution == Distributions.RANDOM_DOWN:
             rand_sign = sign((2*random() - 1))
             self.theta = rand_sign*(pi/2 + pi/2*random())
             self.phi = asin(2*random() - 1)
-        if cf.phonon_source_angle_distribution == Distributions.RANDOM_RIGHT:
+        if self.cf.phonon_source_angle_distribution == Distributions.RANDOM_RIGHT:
             self.theta = pi*random()
             self.phi = asin(2*random() - 1)
-        if cf.phonon_source_angle_distribution == Distributions.RANDOM_LEFT:
+        if self.cf.phonon_source_angle_distribution == Distributions.RANDOM_LEFT:
             self.theta = - pi*random()
             self.phi = asin(2*random() - 1)
-        if cf.phonon_source_angle_distribution == Distributions.DIRECTIONAL:
+        if self.cf.phonon_source_angle_distribution == Distributions.DIRECTIONAL:
             self.theta = 0
             self.phi = -pi/2 + pi*random()
-        if cf.phonon_source_angle_distribution == Distributions.LAMBERT:
+        if self.cf.phonon_source_angle_distribution == Distributions.LAMBERT:
             self.theta = asin(2*random() - 1)
             self.phi = asin((asin(2*random() - 1))/(pi/2))
-        if cf.phonon_source_angle_distribution == Distributions.UNIFORM:
+        if self.cf.phonon_source_angle_distribution == Distributions.UNIFORM:
             self.theta = -pi + 2*pi*random()
             self.phi = asin(2*random() - 1)
 
     def assign_frequency(self, material):
         """Assigning frequency with probability according to Planckian distribution"""
+        self.f = get_planck_distribution(material, self.cf.temp).draw(random())
 
-        # Frequency of the peak of the Plank distribution:
-        f_max = material.default_speed/(2*pi*hbar*material.default_speed/(2.82*k*cf.temp))
+    def assign_speed(self, material):
+        """Assign group velocity dw/dk according to the frequency and polarization"""
+        self.speed = branch_speed(material, self.polarization, self.f)
 
-        # Density of states for f_max in Debye apparoximation:
-        dos_max = 3*((2*pi*f_max)**2)/(2*(pi**2)*(material.default_speed**3))
+    def assign_internal_scattering_time(self, material):
+        """Determine relaxation time after which this phonon will undergo internal scattering"""
+
+        if self.cf.use_gray_approximation_mfp:
+            self.time_of_internal_scattering = self.cf.gray_approximation_mfp / self.speed
+        else:
+            # Relaxation time depends only on the frequency, so it is looked up once per phonon:
+            if self.relaxation_time is None:
+                self.relaxation_time = get_relaxation_times(material, self.cf.temp).time(2*pi*self.f)
 
-        # Bose-Einstein distribution for f_max:
-        bose_einstein_max = 1/(exp((hbar*2*pi*f_max)/(k*cf.temp)) - 1)
+            # Final relaxation time is determined with some randomization [PRB 94, 174303 (2016)]:
+            self.time_of_internal_scattering = -log(random()) * self.relaxation_time
+
+    def move(self):
+        """Move a phonon in one timestep and return new coordinates"""
+        self.x, self.y, self.z = freepaths.move.move(self, self.cf.timestep)
 
-        # Peak of the distribution (needed for normalization)
-        plank_distribution_max = dos_max*hbar*2*pi*f_max*bose_einstein_max
+    def correct_angle(self):
+        """Check if angles are out of the [-pi:pi] range and return them back to this range"""
+        if abs(self.theta) > pi:
+            self.theta -= sign(self.theta)*2*pi
 
-        while True:                                                             # Until we obtain the frequency
-            self.f = f_max*5*random()                                           # Let's draw a random frequency in the 0 - 5*f_max range
-            dos = 3*((2*pi*self.f)**2)/(2*(pi**2)*(material.default_speed**3))  # Calculate the DOS in Debye apparoximation
-            bose_einstein = 1/(exp((hbar*2*pi*self.f)/(k*cf.temp))-1)           # And the Bose-Einstein distribution
-            plank_distribution = dos*hbar*2*pi*self.f*bose_einstein             # Plank distribution
 
-            # We take the normalized distribution at this frequency and draw a random number,
-            # If the random number is lower than the distribution, we accept this frequency
-            if random() < plank_distribution/plank_distribution_max and self.f < max(material.dispersion[:, 1]):
-                break
+# Columns of random numbers needed to initialize one phonon:
+RANDOM_X, RANDOM_Y, RANDOM_Z, RANDOM_POLARIZATION, RANDOM_FREQUENCY, RANDOM_SIGN, RANDOM_THETA, RANDOM_PHI, RANDOM_TIME = range(9)
+NUMBER_OF_RANDOM_NUMBERS = 9
 
-    def assign_speed(self, material):
-        """Calculate group velocity dw/dk according to the frequency and polarization"""
-        if self.polarization == Polarizations.TA and self.f < max(material.dispersion[:,2]):
-            point_num = abs((np.abs(material.dispersion[:, 2] - self.f)).argmin() - 1)
-            d_w = 2*pi*abs(material.dispersion[point_num+1, 2] - material.dispersion[point_num, 2])
+
+class InitialStates:
+    """Initial states of a batch of phonons calculated at once from an (N, 9) array of random numbers
+    uniform in [0, 1). Each row is converted exactly as Phonon would do it one phonon at a time"""
+
+    def __init__(self, cf, material, random_numbers):
+        """Assign coordinates, angles, polarizations, frequencies, speeds and times of internal scattering"""
+        u = np.asarray(random_numbers)
+
+        # Coordinates at the phonon source:
+        x = cf.phonon_source_x + 0.49 * cf.phonon_source_width_x * (2 * u[:, RANDOM_X] - 1)
+        y = cf.phonon_source_y + 0.49 * cf.phonon_source_width_y * (2 * u[:, RANDOM_Y] - 1)
+        z = 0.49 * cf.thickness * (2 * u[:, RANDOM_Z] - 1)
+
+        # Angles depending on the distribution, possibly biased towards some direction:
+        if cf.phonon_source_bias_angle is None:
+            theta, phi = self.angles(cf.phonon_source_angle_distribution, u)
+            weight = np.ones(len(u))
         else:
-            point_num = abs((np.abs(material.dispersion[:, 1] - self.f)).argmin() - 1)
-            d_w = 2*pi*abs(material.dispersion[point_num+1, 1] - material.dispersion[point_num, 1])
-        d_k = abs(material.dispersion[point_num+1, 0] - material.dispersion[point_num, 0])
-        self.speed = d_w/d_k
+            theta, phi, weight = self.biased_angles(cf, u)
 
-    def assign_internal_scattering_time(self, material):
-        """Determine relaxation time after which this phonon will undergo internal scattering"""
+        # One third of phonons are longitudinal and two thirds are transverse:
+        is_transverse = u[:, RANDOM_POLARIZATION] < 2 / 3
 
+        # Frequencies, speeds, and times of internal scattering:
+        f = get_planck_distribution(material, cf.temp).draw_many(u[:, RANDOM_FREQUENCY])
+        is_ta_branch = is_transverse & (f < material.max_frequency_ta)
+        speed = np.where(is_ta_branch, material.speed_ta.speeds_at(f), material.speed_la.speeds_at(f))
         if cf.use_gray_approximation_mfp:
-            self.time_of_internal_scattering = cf.gray_approximation_mfp / self.speed
+            relaxation_time = np.full(len(u), None)
+            time_of_internal_scattering = cf.gray_approximation_mfp / speed
         else:
-            omega = 2*pi*self.f
+            relaxation_time = get_relaxation_times(material, cf.temp).times(2 * pi * f)
+            time_of_internal_scattering = -np.log(1 - u[:, RANDOM_TIME]) * relaxation_time
 
-            # Depending on the material we assign different relaxation times:
-            if material.name == Materials.Si:
-                deb_temp = 152.0
-                tau_impurity = 1/(2.95e-45 * (omega ** 4))
-                tau_umklapp = 1/(0.95e-19 * (omega ** 2) * cf.temp * exp(-deb_temp / cf.temp))
-                tau_internal = 1/((1/tau_impurity) + (1/tau_umklapp))
+        # Python lists make access to a single phonon faster:
+        self.x = x.tolist()
+        self.y = y.tolist()
+        self.z = z.tolist()
+        self.theta = theta.tolist()
+        self.phi = phi.tolist()
+        self.is_transverse = is_transverse.tolist()
+        self.f = f.tolist()
+        self.speed = speed.tolist()
+        self.relaxation_time = relaxation_time.tolist()
+        self.time_of_internal_scattering = time_of_internal_scattering.tolist()
+        self.weight = weight.tolist()
 
-            elif material.name == Materials.SiC:    # Ref. Joshi et al, JAP 88, 265 (2000)
-                deb_temp = 1200
-                tau_impurity = 1/(8.46e-45 * (omega ** 4))
-                tau_umklapp = 1/(6.16e-20 * (omega ** 2) * cf.temp * exp(-deb_temp / cf.temp))
-                tau_4p = 1/(6.9e-23 * (cf.temp ** 2) * (omega ** 2))
-                tau_internal = 1/((1/tau_impurity) + (1/tau_umklapp) + (1/tau_4p))
+    def __len__(self):
+        return len(self.x)
 
-            else:
-                raise ValueError('Specified material does not exist in the database.')
+    @staticmethod
+    def angles(distribution, u):
+        """Calculate theta and phi angles for the given distribution"""
+        phi = np.arcsin(2 * u[:, RANDOM_PHI] - 1)
+        if distribution == Distributions.RANDOM_UP:
+            theta = -pi/2 + pi * u[:, RANDOM_THETA]
+        elif distribution == Distributions.RANDOM_DOWN:
+            theta = np.sign(2 * u[:, RANDOM_SIGN] - 1) * (pi/2 + pi/2 * u[:, RANDOM_THETA])
+        elif distribution == Distributions.RANDOM_RIGHT:
+            theta = pi * u[:, RANDOM_THETA]
+        elif distribution == Distributions.RANDOM_LEFT:
+            theta = - pi * u[:, RANDOM_THETA]
+        elif distribution == Distributions.DIRECTIONAL:
+            theta = np.zeros(len(u))
+            phi = -pi/2 + pi * u[:, RANDOM_PHI]
+        elif distribution == Distributions.LAMBERT:
+            theta = np.arcsin(2 * u[:, RANDOM_THETA] - 1)
+            phi = np.arcsin(np.arcsin(2 * u[:, RANDOM_PHI] - 1) / (pi/2))
+        elif distribution == Distributions.UNIFORM:
+            theta = -pi + 2 * pi * u[:, RANDOM_THETA]
+        else:
+            raise ValueError('Specified angle distribution does not exist.')
+        return theta, phi
 
-            # Final relaxation time is determined with some randomization [PRB 94, 174303 (2016)]:
-            self.time_of_internal_scattering = -log(random()) * tau_internal
+    @staticmethod
+    def theta_density(distribution, theta):
+        """Probability density of theta angles in [-pi, pi] for the given distribution"""
+        if distribution == Distributions.RANDOM_UP:
+            return np.where(abs(theta) <= pi/2, 1/pi, 0.0)
+        if distribution == Distributions.RANDOM_DOWN:
+            return np.where(abs(theta) >= pi/2, 1/pi, 0.0)
+        if distribution == Distributions.RANDOM_RIGHT:
+            return np.where(theta >= 0, 1/pi, 0.0)
+        if distribution == Distributions.RANDOM_LEFT:
+            return np.where(theta <= 0, 1/pi, 0.0)
+        if distribution == Distributions.LAMBERT:
+            return np.where(abs(theta) <= pi/2, np.cos(theta) / 2, 0.0)
+        if distribution == Distributions.UNIFORM:
+            return np.full(len(theta), 1/(2*pi))
+        raise ValueError('Specified angle distribution cannot be biased.')
 
-    def move(self):
-        """Move a phonon in one timestep and return new coordinates"""
-        self.x, self.y, self.z = freepaths.move.move(self, cf.timestep)
+    @classmethod
+    def biased_angles(cls, cf, u):
+        """Emit a fraction of phonons into a cone of theta angles around the bias angle and the rest
+        according to the distribution. Weights are the ratios of the original and the biased densities,
+        so that weighted results are not biased. The random number of theta both chooses the part and draws the angle"""
+        fraction = cf.phonon_source_bias_fraction
+        in_cone = u[:, RANDOM_THETA] < fraction
 
-    def correct_angle(self):
-        """Check if angles are out of the [-pi:pi] range and return them back to this range"""
-        if abs(self.theta) > pi:
-            self.theta -= sign(self.theta)*2*pi
+        # Phonons outside the cone reuse the rest of the random number to draw from the distribution:
+        u_rest = u.copy()
+        u_rest[:, RANDOM_THETA] = (u[:, RANDOM_THETA] - fraction) / (1 - fraction)
+        theta, phi = cls.angles(cf.phonon_source_angle_distribution, u_rest)
+
+        # Phonons in the cone get uniformly distributed angles, which are wrapped into [-pi, pi]:
+        width = cf.phonon_source_bias_width
+        cone_theta = cf.phonon_source_bias_angle + width * (u[:, RANDOM_THETA] / fraction - 0.5)
+        theta = np.where(in_cone, (cone_theta + pi) % (2*pi) - pi, theta)
+
+        # Ratio of the original density and the density of the mixture of the cone and the distribution:
+        density = cls.theta_density(cf.phonon_source_angle_distribution, theta)
+        distance_from_bias = abs((theta - cf.phonon_source_bias_angle + pi) % (2*pi) - pi)
+        cone_density = np.where(distance_from_bias <= width / 2, 1 / width, 0.0)
+        weight = density / (fraction * cone_density + (1 - fraction) * density)
+        return theta, phi, weight
+
+
+class PhononSource:
+    """Source that creates phonons from initial states generated in batches.
+    Random numbers of each batch come from an independent stream derived from the seed and the batch number,
+    so that any phonon can be generated again, for instance after resuming from a checkpoint"""
+
+    def __init__(self, cf, material, batch_size=1024):
+        """Take the entropy from the random seed or from the operating system.
+        Stratified and Sobol points are generated in the batches of PRECISION_BATCH_SIZE phonons, which are
+        used for the error bars, because points of one design are correlated and cannot be split between batches"""
+        self.cf = cf
+        self.material = material
+        self.batch_size = batch_size if cf.phonon_source_sampling == SamplingMethods.RANDOM else cf.precision_batch_size
+        self.entropy = cf.random_seed if cf.random_seed is not None else np.random.SeedSequence().entropy
+        self.batch_number = None
+        self.states = None
+
+    def __getstate__(self):
+        """Only the entropy is needed to generate the same phonons again"""
+        return {"batch_size": self.batch_size, "entropy": self.entropy}
+
+    def random_numbers(self, batch_number, size):
+        """Random numbers of the batch, which depend only on the entropy and the batch number.
+        Stratified and Sobol points are randomized independently in each batch,
+        so that batches remain independent estimates for the error bars"""
+        generator = np.random.default_rng(np.random.SeedSequence(self.entropy, spawn_key=(batch_number,)))
+        if self.cf.phonon_source_sampling == SamplingMethods.RANDOM:
+            return generator.random((size, NUMBER_OF_RANDOM_NUMBERS))
+
+        # Quasi-Monte Carlo module is slow to import, so it is imported only when needed:
+        from scipy.stats import qmc
+        if self.cf.phonon_source_sampling == SamplingMethods.STRATIFIED:
+            return qmc.LatinHypercube(d=NUMBER_OF_RANDOM_NUMBERS, seed=generator).random(size)
+
+        # Scrambled Sobol sequence of the full batch, whose beginning is used in the last batch:
+        sobol = qmc.Sobol(d=NUMBER_OF_RANDOM_NUMBERS, scramble=True, seed=generator)
+        return sobol.random_base2(math.ceil(math.log2(self.batch_size)))[:size]
+
+    def phonon(self, index):
+        """Create the phonon with the given number, generating its batch if needed"""
+        batch_number = index // self.batch_size
+        if batch_number != self.batch_number:
+            first_index = batch_number * self.batch_size
+            size = min(self.batch_size, self.cf.number_of_phonons - first_index)
+            self.states = InitialStates(self.cf, self.material, self.random_numbers(batch_number, size))
+            self.batch_number = batch_number
+        return Phonon.from_initial_states(self.cf, self.states, index - batch_number * self.batch_size)
@@ -0,0 +1,39 @@
+"""Module that measures how much time each stage of phonon tracing takes"""
+
+from time import perf_counter
+
+
+class StageProfiler:
+    """Total time and number of calls of each stage of the timesteps, to find where the time goes
+    in a given structure. Checks of holes are recorded by the shape of the hole"""
+
+    def __init__(self):
+        """Start without any recorded stages"""
+        self.times = {}
+        self.calls = {}
+        self.number_of_phonons = 0
+        self.total_time = 0.0
+
+    def add(self, stage, start_time):
+        """Add the time since the start time to the given stage"""
+        self.times[stage] = self.times.get(stage, 0.0) + perf_counter() - start_time
+        self.calls[stage] = self.calls.get(stage, 0) + 1
+
+    def finish_phonon(self, start_time):
+        """Add the time of tracing one phonon since the start time"""
+        self.total_time += perf_counter() - start_time
+        self.number_of_phonons += 1
+
+    def write_into_files(self):
+        """Write the time of each stage, its share of the tracing time, and the time per call,
+        starting with the slowest stage. Time outside of the stages, e.g. moving phonons, is shown as other"""
+        stages = sorted(self.times, key=self.times.get, reverse=True)
+        other_time = max(self.total_time - sum(self.times.values()), 0.0)
+        total_time = max(self.total_time, 1e-300)
+        with open("Data/Stage profile.csv", "w", encoding="utf-8") as file:
+            file.write(f"# Tracing of {self.number_of_phonons} phonons in this run took {self.total_time:.3f} s\n")
+            file.write("Stage, Calls, Time (s), Share (%), Time per call (us)\n")
+            for stage in stages:
+                time, calls = self.times[stage], self.calls[stage]
+                file.write(f"{stage}, {calls}, {time:.4f}, {100 * time / total_time:.2f}, {1e6 * time / calls:.3f}\n")
+            file.write(f"Other, , {other_time:.4f}, {100 * other_time / total_time:.2f}, \n")
@@ -0,0 +1,122 @@
+"""Module that integrates the thermal conductivity over wave vectors by adaptive Monte Carlo quadrature"""
+
+import math
+import numpy as np
+
+
+# Number of phonons needed in an interval to estimate the variance of its contribution:
+MIN_SAMPLES = 2
+
+
+class Interval:
+    """Interval of wave vectors of one branch with the integrand values of phonons traced inside it"""
+
+    def __init__(self, branch_number, start, end, samples=None):
+        """Store the interval and the (wave vector, integrand) pairs already traced in it"""
+        self.branch_number = branch_number
+        self.start = start
+        self.end = end
+        self.samples = samples if samples is not None else []
+
+    @property
+    def width(self):
+        """Width of the interval in wave vectors"""
+        return self.end - self.start
+
+    @property
+    def estimate(self):
+        """Contribution of the interval to the integral, i.e. its width times the mean integrand"""
+        return self.width * sum(value for _, value in self.samples) / len(self.samples)
+
+    @property
+    def variance(self):
+        """Monte Carlo variance of the estimated contribution"""
+        values = [value for _, value in self.samples]
+        return self.width**2 * np.var(values, ddof=1) / len(values)
+
+    @property
+    def relative_error(self):
+        """Standard error of the contribution relative to the contribution itself"""
+        error = math.sqrt(self.variance)
+        return error / abs(self.estimate) if error > 0 else 0.0
+
+    def split(self):
+        """Split the interval into two halves, each keeping the samples that fall inside it"""
+        middle = (self.start + self.end) / 2
+        return (Interval(self.branch_number, self.start, middle, [s for s in self.samples if s[0] < middle]),
+                Interval(self.branch_number, middle, self.end, [s for s in self.samples if s[0] >= middle]))
+
+
+class AdaptiveQuadrature:
+    """Stratified Monte Carlo integral over wave vectors of several branches. Phonons are traced at random
+    wave vectors inside intervals, and the intervals with the largest variance are split in halves,
+    so that additional phonons go where they reduce the error of the integral most"""
+
+    def __init__(self, number_of_branches, max_wavevector, initial_intervals, generator):
+        """Divide each branch into equal intervals"""
+        self.generator = generator
+        width = max_wavevector / initial_intervals
+        self.intervals = [Interval(branch_number, number * width, (number + 1) * width)
+                          for branch_number in range(number_of_branches) for number in range(initial_intervals)]
+
+    @property
+    def estimate(self):
+        """Integral over all branches"""
+        return sum(interval.estimate for interval in self.intervals)
+
+    @property
+    def standard_error(self):
+        """Standard error of the integral"""
+        return math.sqrt(sum(interval.variance for interval in self.intervals))
+
+    def new_tasks(self):
+        """Return (interval, wave vector) pairs of phonons needed to estimate the variance in all intervals.
+        Wave vectors are random in (start, end], as zero wave vector has zero frequency"""
+        tasks = []
+        for interval in self.intervals:
+            for _ in range(MIN_SAMPLES - len(interval.samples)):
+                tasks.append((interval, interval.start + interval.width * (1 - self.generator.random())))
+        return tasks
+
+    def refine(self, max_new_samples):
+        """Split the quarter of intervals with the largest variance, as long as new phonons fit into the budget.
+        Return the tasks of new phonons, which are empty if no interval can be refined anymore"""
+        while True:
+            worst_intervals = sorted(self.intervals, key=lambda interval: interval.variance, reverse=True)
+            number_to_split = max(1, len(self.intervals) // 4)
+            split_intervals = []
+            number_of_new_samples = 0
+            for interval in worst_intervals[:number_to_split]:
+                halves = interval.split()
+                needed = sum(max(0, MIN_SAMPLES - len(half.samples)) for half in halves)
+                if number_of_new_samples + needed > max_new_samples:
+                    break
+                split_intervals.append((interval, halves))
+                number_of_new_samples += needed
+
+            for interval, halves in split_intervals:
+                position = self.intervals.index(interval)
+                self.intervals[position:position + 1] = halves
+
+            # Halves may already have enough samples, then the splitting continues:
+            tasks = self.new_tasks()
+            if tasks or not split_intervals:
+                return tasks
+
+    @staticmethod
+    def add_results(tasks, values):
+        """Add the integrand values of traced phonons to their intervals"""
+        for (interval, k_vector), value in zip(tasks, values):
+            interval.samples.append((k_vector, value))
+
+    def write_into_file(self):
+        """Write the final intervals into a file"""
+        write_intervals_into_file("Data/Adaptive sampling intervals.csv", self.intervals)
+
+
+def write_intervals_into_file(filename, intervals):
+    """Write the intervals with their number of phonons, contributions and errors"""
+    data = np.array([[interval.branch_number, interval.start, interval.end, len(interval.samples),
+                      interval.estimate, math.sqrt(interval.variance)] for interval in intervals])
+    header = "Branch, K start [1/m], K end [1/m], Phonons, Contribution [W/mK], Error [W/mK]"
+    np.savetxt(filename, data, fmt='%1.4e', delimiter=",", header=header, encoding='utf-8')
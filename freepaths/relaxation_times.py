@@ -0,0 +1,86 @@
+"""Module that provides relaxation times of internal phonon scattering in different materials"""
+
+from math import log, exp
+from functools import lru_cache
+import numpy as np
+
+from freepaths.options import Materials
+
+
+def scattering_rates_si(omega, temperature):
+    """Impurity and Umklapp scattering rates in Si"""
+    deb_temp = 152.0
+    rate_impurity = 2.95e-45 * (omega ** 4)
+    rate_umklapp = 0.95e-19 * (omega ** 2) * temperature * np.exp(-deb_temp / temperature)
+    return rate_impurity + rate_umklapp
+
+
+def scattering_rates_sic(omega, temperature):
+    """Impurity, Umklapp and four-phonon scattering rates in SiC, Ref. Joshi et al, JAP 88, 265 (2000)"""
+    deb_temp = 1200
+    rate_impurity = 8.46e-45 * (omega ** 4)
+    rate_umklapp = 6.16e-20 * (omega ** 2) * temperature * np.exp(-deb_temp / temperature)
+    rate_4p = 6.9e-23 * (temperature ** 2) * (omega ** 2)
+    return rate_impurity + rate_umklapp + rate_4p
+
+
+class TabulatedScatteringRates:
+    """Scattering rates interpolated in log-log scale from relaxation times given by the user
+    at one temperature, so the temperature argument is ignored"""
+
+    def __init__(self, frequencies, times):
+        """Store the data sorted by frequency [Hz] with relaxation times [s]"""
+        order = np.argsort(frequencies)
+        self.log_omegas = np.log(2 * np.pi * np.asarray(frequencies)[order])
+        self.log_times = np.log(np.asarray(times)[order])
+
+    def __call__(self, omega, temperature):
+        return np.exp(-np.interp(np.log(omega), self.log_omegas, self.log_times))
+
+
+# Total internal scattering rate 1/tau(omega, T) of each material, new materials are added here:
+SCATTERING_RATES = {
+    Materials.Si: scattering_rates_si,
+    Materials.SiC: scattering_rates_sic,
+}
+
+
+class RelaxationTimes:
+    """Relaxation time of internal scattering tabulated on a logarithmic grid of angular frequencies
+    for one material at one temperature. Between the grid points, the time is interpolated in log-log scale,
+    which is exact for power laws and lets us find the grid cell without searching"""
+
+    def __init__(self, material, temperature, num_points=2000):
+        """Tabulate the relaxation time from 100 MHz to the maximum frequency of the material"""
+        if material.scattering_rates is None:
+            raise ValueError('Relaxation times of the specified material are not known.')
+        self.min_omega = 2 * np.pi * 1e8
+        max_omega = 2 * np.pi * material.max_frequency_la * 1.01
+        self.log_min_omega = log(self.min_omega)
+        self.log_step = (log(max_omega) - self.log_min_omega) / (num_points - 1)
+        omegas = np.exp(self.log_min_omega + self.log_step * np.arange(num_points))
+        self.log_times = -np.log(material.scattering_rates(omegas, temperature))
+
+        # Python list is faster than array to look up one time at a time:
+        self.log_time_list = self.log_times.tolist()
+
+    def time(self, omega):
+        """Relaxation time at the given angular frequency"""
+        position = (log(max(omega, self.min_omega)) - self.log_min_omega) / self.log_step
+        index = min(int(position), len(self.log_time_list) - 2)
+        fraction = position - index
+        log_time = self.log_time_list[index] + fraction * (self.log_time_list[index + 1] - self.log_time_list[index])
+        return exp(log_time)
+
+    def times(self, omegas):
+        """Relaxation times at an array of angular frequencies"""
+        positions = (np.log(np.maximum(omegas, self.min_omega)) - self.log_min_omega) / self.log_step
+        indices = np.minimum(positions.astype(int), len(self.log_times) - 2)
+        fractions = positions - indices
+        return np.exp(self.log_times[indices] + fractions * (self.log_times[indices + 1] - self.log_times[indices]))
+
+
+@lru_cache(maxsize=None)
+def get_relaxation_times(material, temperature):
+    """Return the relaxation times, which are tabulated only once for each material and temperature"""
+    return RelaxationTimes(material, temperature)
@@ -1,38 +1,83 @@
 """Module that runs one phonon through the structure"""
 
+from random import random
+from time import perf_counter
 
-from freepaths.config import cf
 from freepaths.scattering import internal_scattering, surface_scattering, reinitialization
 from freepaths.scattering_types import ScatteringTypes
 
 
-def run_phonon(phonon, flight, scatter_stats, segment_stats, thermal_maps, scatter_maps, material):
-    """Run one phonon through the system and record parameters of this run"""
+def survives_roulette(cf, phonon):
+    """Russian roulette: the phonon survives with the given probability and its weight is increased accordingly,
+    so that the results remain unbiased. Otherwise, the phonon is stopped and its weight becomes zero.
+    Only phonons with weights up to the threshold play, so that the weights of survivors stay below
+    the threshold divided by the survival probability instead of growing at each roulette step"""
+    if phonon.weight > cf.roulette_weight_threshold:
+        return True
+    if random() < cf.roulette_survival_probability:
+        phonon.weight /= cf.roulette_survival_probability
+        return True
+    phonon.weight = 0.0
+    return False
+
+
+def run_phonon(cf, phonon, flight, scatter_stats, segment_stats, thermal_maps, scatter_maps, material, profiler=None):
+    """Run one phonon through the system and record parameters of this run.
+    If a profiler is given, time of each stage of the timesteps is recorded.
+    Returns the number of timesteps for which the phonon was traced"""
 
     scattering_types = ScatteringTypes()
+    roulette_steps = set(cf.roulette_steps or [])
+    if profiler is not None:
+        phonon_start_time = perf_counter()
 
     # Run the phonon step-by-step:
+    number_of_steps = cf.number_of_timesteps
     for step_number in range(cf.number_of_timesteps):
         if phonon.is_in_system:
 
+            # Phonons that stay in the system for too long play Russian roulette:
+            if step_number in roulette_steps and not survives_roulette(cf, phonon):
+                number_of_steps = step_number
+                break
+
             # Check if different scattering events happened during current time step:
-            if cf.include_internal_scattering:
-                internal_scattering(phonon, flight, scattering_types)
-            reinitialization(phonon, scattering_types)
-            surface_scattering(phonon, scattering_types)
-            
+            if profiler is None:
+                if cf.include_internal_scattering:
+                    internal_scattering(phonon, flight, scattering_types)
+                reinitialization(cf, phonon, scattering_types)
+            else:
+                if cf.include_internal_scattering:
+                    start_time = perf_counter()
+                    internal_scattering(phonon, flight, scattering_types)
+                    profiler.add("Internal scattering", start_time)
+                start_time = perf_counter()
+                reinitialization(cf, phonon, scattering_types)
+                profiler.add("Reinitialization", start_time)
+            surface_scattering(cf, phonon, scattering_types, profiler)
 
             # If any scattering has occurred, record it:
             if scattering_types.is_scattered:
+                if profiler is not None:
+                    start_time = perf_counter()
                 flight.add_point_to_path()
-                scatter_stats.save_scattering_events(phonon.y, scattering_types)
+                if profiler is not None:
+                    profiler.add("Path recording", start_time)
+                    start_time = perf_counter()
+                scatter_stats.save_scattering_events(phonon.y, scattering_types, phonon.weight)
                 if cf.output_scattering_map:
                     scatter_maps.add_scattering_to_map(phonon, scattering_types)
+                if profiler is not None:
+                    profiler.add("Scattering statistics", start_time)
 
             # Otherwise, record only if animation is requested:
             else:
                 if cf.output_path_animation:
+                    if profiler is not None:
+                        start_time = perf_counter()
                     flight.add_point_to_path()
+                    if profiler is not None:
+                        profiler.add("Path recording", start_time)
 
             # If diffuse scattering has occurred, reset phonon free path:
             if scattering_types.is_diffuse or scattering_types.is_internal:
@@ -43,8 +88,16 @@ def run_phonon(phonon, flight, scatter_stats, segment_stats, thermal_maps, scatt
                 flight.add_step(cf.timestep)
 
             # Record presence of the phonon at this timestep and move on:
-            thermal_maps.add_energy_to_maps(phonon, step_number, material)
-            segment_stats.record_time_in_segment(phonon.y)
+            if profiler is None:
+                thermal_maps.add_energy_to_maps(phonon, step_number, material)
+                segment_stats.record_time_in_segment(phonon.y, phonon.weight)
+            else:
+                start_time = perf_counter()
+                thermal_maps.add_energy_to_maps(phonon, step_number, material)
+                profiler.add("Thermal maps", start_time)
+                start_time = perf_counter()
+                segment_stats.record_time_in_segment(phonon.y, phonon.weight)
+                profiler.add("Time in segments", start_time)
             scattering_types.reset()
             phonon.move()
 
@@ -53,4 +106,9 @@ def run_phonon(phonon, flight, scatter_stats, segment_stats, thermal_maps, scatt
             flight.add_point_to_path()
             flight.save_free_paths()
             flight.finish(step_number, cf.timestep, cf.frequency_detector_size,cf.frequency_detector_center,cf.frequency_detector_size_2,cf.frequency_detector_center_2,cf.frequency_detector_size_3,cf.frequency_detector_center_3)
+            number_of_steps = step_number
             break
+
+    if profiler is not None:
+        profiler.finish_phonon(phonon_start_time)
+    return number_of_steps
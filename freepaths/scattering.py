@@ -2,9 +2,9 @@
 
 from math import pi, cos, sin, tan, exp, sqrt, atan, asin, acos
 from random import random
+from time import perf_counter
 from numpy import sign
 
-from freepaths.config import cf
 from freepaths.move import move
 from freepaths.scattering_types import Scattering
 
@@ -23,7 +23,7 @@ def internal_scattering(ph, flight, scattering_types):
         scattering_types.internal = Scattering.DIFFUSE
 
 
-def reinitialization(ph, scattering_types):
+def reinitialization(cf, ph, scattering_types):
     """Re-thermalize phonon if it comes back to the hot side"""
     x, y, _ = move(ph, cf.timestep)
 
@@ -39,7 +39,7 @@ def reinitialization(ph, scattering_types):
             ph.phi = asin((asin(2*random() - 1))/(pi/2))
 
             # Accept the angles only if they do not immediately cause new scattering:
-            if no_new_scattering(ph):
+            if no_new_scattering(cf, ph):
                 break
 
     # Top sidewall:
@@ -55,7 +55,7 @@ def reinitialization(ph, scattering_types):
             ph.phi = asin((asin(2*random() - 1))/(pi/2))
 
             # Accept the angles only if they do not immediately cause new scattering:
-            if no_new_scattering(ph):
+            if no_new_scattering(cf, ph):
                 break
 
     # Right and left sidewalls:
@@ -71,11 +71,11 @@ def reinitialization(ph, scattering_types):
             ph.phi = asin((asin(2*random() - 1))/(pi/2))
 
             # Accept the angles if they do not cause new scattering:
-            if no_new_scattering(ph):
+            if no_new_scattering(cf, ph):
                 break
 
 
-def top_parabola_scattering(ph, scattering_types):
+def top_parabola_scattering(cf, ph, scattering_types):
     """Scattering on top parabolic boundary"""
     x, y, z = move(ph, cf.timestep)
 
@@ -109,11 +109,11 @@ def top_parabola_scattering(ph, scattering_types):
                 ph.phi = asin((asin(2*random() - 1))/(pi/2))
 
                 # Accept the angles only if they do not immediately cause new scattering:
-                if no_new_scattering(ph):
+                if no_new_scattering(cf, ph):
                     break
 
 
-def bottom_parabola_scattering(ph, scattering_types):
+def bottom_parabola_scattering(cf, ph, scattering_types):
     """Scattering on bottom parabolic boundary"""
     x, y, z = move(ph, cf.timestep)
 
@@ -147,11 +147,11 @@ def bottom_parabola_scattering(ph, scattering_types):
                 ph.phi = asin((asin(2*random() - 1))/(pi/2))
 
                 # Accept the angles only if they do not immediately cause new scattering:
-                if no_new_scattering(ph):
+                if no_new_scattering(cf, ph):
                     break
 
 
-def scattering_on_circular_holes(ph, x0, y0, R, scattering_types, x, y, z):
+def scattering_on_circular_holes(cf, ph, x0, y0, R, scattering_types, x, y, z):
     """Check if a phonon strikes a circular hole and calculate the new direction"""
 
     # If phonon is inside the circle with radius R:
@@ -184,10 +184,10 @@ def scattering_on_circular_holes(ph, x0, y0, R, scattering_types, x, y, z):
                 ph.phi = asin((asin(2*random() - 1))/(pi/2))
 
                 # Accept the angles only if they do not immediately cause new scattering:
-                if no_new_scattering(ph):
+                if no_new_scattering(cf, ph):
                     break
 
-def scattering_on_semicircular_holes(ph, x0, y0, R, scattering_types, x, y, z):
+def scattering_on_semicircular_holes(cf, ph, x0, y0, R, scattering_types, x, y, z):
     """Check if a phonon strikes a circular hole and calculate the new direction"""
 
     # If phonon is inside the circle with radius R:
@@ -214,7 +214,7 @@ def scattering_on_semicircular_holes(ph, x0, y0, R, scattering_types, x, y, z):
                     ph.phi = asin((asin(2*random() - 1))/(pi/2))
 
                     # Accept the angles only if they do not lead to new scattering:
-                    if no_new_scattering(ph):
+                    if no_new_scattering(cf, ph):
                         break
         else:
             # Calculate angle to the surface and specular scattering probability:
@@ -244,9 +244,9 @@ def scattering_on_semicircular_holes(ph, x0, y0, R, scattering_types, x, y, z):
                     ph.phi = asin((asin(2*random() - 1))/(pi/2))
 
                     # Accept the angles only if they do not immediately cause new scattering:
-                    if no_new_scattering(ph):
+                    if no_new_scattering(cf, ph):
                         break
-def scattering_on_arccircular_v_holes(ph, x0, y0, R ,Rinner,alphap, scattering_types, x, y, z):
+def scattering_on_arccircular_v_holes(cf, ph, x0, y0, R ,Rinner,alphap, scattering_types, x, y, z):
     """Check if a phonon strikes a circular hole and calculate the new direction"""
     if x == x0:# to prevent division by 0 
         x = x + 1e-12
@@ -335,7 +335,7 @@ def scattering_on_arccircular_v_holes(ph, x0, y0, R ,Rinner,alphap, scattering_t
                     ph.phi = asin((asin(2*random() - 1))/(pi/2))
                         
                      #Accept the angles only if they do not immediately cause new scattering:
-                    if no_new_scattering(ph):
+                    if no_new_scattering(cf, ph):
                          break
       
         if continu ==0:
@@ -373,9 +373,9 @@ def scattering_on_arccircular_v_holes(ph, x0, y0, R ,Rinner,alphap, scattering_t
                 ph.theta = tangent_theta - asin(2*random()-1) + pi*(y >= y0)
                 ph.phi = asin((asin(2*random() - 1))/(pi/2)) - (pi / 2 - cf.pillar_wall_angle)
                 scattering_types.pillars = Scattering.DIFFUSE
-                    #if no_new_scattering(ph):
+                    #if no_new_scattering(cf, ph):
                          #break
-def scattering_on_arccircular_curve_v_holes(ph, x0, y0, R ,Rinner,Rbig, scattering_types, x, y, z):
+def scattering_on_arccircular_curve_v_holes(cf, ph, x0, y0, R ,Rinner,Rbig, scattering_types, x, y, z):
     """Check if a phonon strikes a circular hole and calculate the new direction"""
     if x == x0:# to prevent division by 0 
         x = x + 1e-12
@@ -439,7 +439,7 @@ def scattering_on_arccircular_curve_v_holes(ph, x0, y0, R ,Rinner,Rbig, scatteri
                 ph.theta = tangent_theta - asin(2*random()-1) + pi*(y >= y_up)
                 ph.phi = asin((asin(2*random() - 1))/(pi/2)) - (pi / 2 - cf.pillar_wall_angle)
                 scattering_types.pillars = Scattering.DIFFUSE
-                    #if no_new_scattering(ph):
+                    #if no_new_scattering(cf, ph):
                          #break
            
                 
@@ -481,7 +481,7 @@ def scattering_on_arccircular_curve_v_holes(ph, x0, y0, R ,Rinner,Rbig, scatteri
                 ph.theta = tangent_theta - asin(2*random()-1) + pi*(y >= y_down)
                 ph.phi = asin((asin(2*random() - 1))/(pi/2)) - (pi / 2 - cf.pillar_wall_angle)
                 scattering_types.pillars = Scattering.DIFFUSE
-                    #if no_new_scattering(ph):
+                    #if no_new_scattering(cf, ph):
                          #break
 
             
@@ -514,7 +514,7 @@ def scattering_on_arccircular_curve_v_holes(ph, x0, y0, R ,Rinner,Rbig, scatteri
                     ph.phi = asin((asin(2*random() - 1))/(pi/2))
                         
                      #Accept the angles only if they do not immediately cause new scattering:
-                    if no_new_scattering(ph):
+                    if no_new_scattering(cf, ph):
                          break
       
         if continu ==0:
@@ -552,12 +552,12 @@ def scattering_on_arccircular_curve_v_holes(ph, x0, y0, R ,Rinner,Rbig, scatteri
                 ph.theta = tangent_theta - asin(2*random()-1) + pi*(y >= y0)
                 ph.phi = asin((asin(2*random() - 1))/(pi/2)) - (pi / 2 - cf.pillar_wall_angle)
                 scattering_types.pillars = Scattering.DIFFUSE
-                    #if no_new_scattering(ph):
+                    #if no_new_scattering(cf, ph):
                          #break
   
                         
 
-def scattering_on_arccircular_curve_v_begin_holes(ph, x0, y0, R, Rbig, scattering_types, x, y, z):
+def scattering_on_arccircular_curve_v_begin_holes(cf, ph, x0, y0, R, Rbig, scattering_types, x, y, z):
     """Check if a phonon strikes a circular hole and calculate the new direction"""
     if x == x0:# to prevent division by 0 
         x = x + 1e-12
@@ -623,7 +623,7 @@ def scattering_on_arccircular_curve_v_begin_holes(ph, x0, y0, R, Rbig, scatterin
                 ph.theta = tangent_theta - asin(2*random()-1) + pi*(y >= y_up)
                 ph.phi = asin((asin(2*random() - 1))/(pi/2)) - (pi / 2 - cf.pillar_wall_angle)
                 scattering_types.pillars = Scattering.DIFFUSE
-                    #if no_new_scattering(ph):
+                    #if no_new_scattering(cf, ph):
                          #break
            
                 
@@ -665,7 +665,7 @@ def scattering_on_arccircular_curve_v_begin_holes(ph, x0, y0, R, Rbig, scatterin
                 ph.theta = tangent_theta - asin(2*random()-1) + pi*(y >= y_down)
                 ph.phi = asin((asin(2*random() - 1))/(pi/2)) - (pi / 2 - cf.pillar_wall_angle)
                 scattering_types.pillars = Scattering.DIFFUSE
-                    #if no_new_scattering(ph):
+                    #if no_new_scattering(cf, ph):
                          #break
 
             
@@ -698,7 +698,7 @@ def scattering_on_arccircular_curve_v_begin_holes(ph, x0, y0, R, Rbig, scatterin
                     ph.phi = asin((asin(2*random() - 1))/(pi/2))
                         
                      #Accept the angles only if they do not immediately cause new scattering:
-                    if no_new_scattering(ph):
+                    if no_new_scattering(cf, ph):
                          break
       
         if continu ==0:
@@ -736,10 +736,10 @@ def scattering_on_arccircular_curve_v_begin_holes(ph, x0, y0, R, Rbig, scatterin
                 ph.theta = tangent_theta - asin(2*random()-1) + pi*(y >= y_side)
                 ph.phi = asin((asin(2*random() - 1))/(pi/2)) - (pi / 2 - cf.pillar_wall_angle)
                 scattering_types.pillars = Scattering.DIFFUSE
-                    #if no_new_scattering(ph):
+                    #if no_new_scattering(cf, ph):
                          #break                         
                          
-def scattering_on_arccircular_v_demi_down_holes(ph, x0, y0, R ,Rinner,alphap,alphap2, scattering_types, x, y, z):
+def scattering_on_arccircular_v_demi_down_holes(cf, ph, x0, y0, R ,Rinner,alphap,alphap2, scattering_types, x, y, z):
     """Check if a phonon strikes a circular hole and calculate the new direction"""
     if x == x0:# to prevent division by 0 
         x = x + 1e-12
@@ -832,7 +832,7 @@ def scattering_on_arccircular_v_demi_down_holes(ph, x0, y0, R ,Rinner,alphap,alp
                     ph.phi = asin((asin(2*random() - 1))/(pi/2))
                         
                      #Accept the angles only if they do not immediately cause new scattering:
-                    if no_new_scattering(ph):
+                    if no_new_scattering(cf, ph):
                          break
       
         if continu ==0:
@@ -870,9 +870,9 @@ def scattering_on_arccircular_v_demi_down_holes(ph, x0, y0, R ,Rinner,alphap,alp
                 ph.theta = tangent_theta - asin(2*random()-1) + pi*(y >= y0)
                 ph.phi = asin((asin(2*random() - 1))/(pi/2)) - (pi / 2 - cf.pillar_wall_angle)
                 scattering_types.pillars = Scattering.DIFFUSE
-                    #if no_new_scattering(ph):
+                    #if no_new_scattering(cf, ph):
                         
-def scattering_on_arccircular_v_demi_up_holes(ph, x0, y0, R ,Rinner,alphap,alphap2, scattering_types, x, y, z):
+def scattering_on_arccircular_v_demi_up_holes(cf, ph, x0, y0, R ,Rinner,alphap,alphap2, scattering_types, x, y, z):
     """Check if a phonon strikes a circular hole and calculate the new direction"""
     if x == x0:# to prevent division by 0 
         x = x + 1e-12
@@ -965,7 +965,7 @@ def scattering_on_arccircular_v_demi_up_holes(ph, x0, y0, R ,Rinner,alphap,alpha
                     ph.phi = asin((asin(2*random() - 1))/(pi/2))
                         
                      #Accept the angles only if they do not immediately cause new scattering:
-                    if no_new_scattering(ph):
+                    if no_new_scattering(cf, ph):
                          break
       
         if continu ==0:
@@ -1003,9 +1003,9 @@ def scattering_on_arccircular_v_demi_up_holes(ph, x0, y0, R ,Rinner,alphap,alpha
                 ph.theta = tangent_theta - asin(2*random()-1) + pi*(y >= y0)
                 ph.phi = asin((asin(2*random() - 1))/(pi/2)) - (pi / 2 - cf.pillar_wall_angle)
                 scattering_types.pillars = Scattering.DIFFUSE
-                    #if no_new_scattering(ph):
+                    #if no_new_scattering(cf, ph):
                          #break                                 #break        
-def scattering_on_arccircular_h_holes(ph, x0, y0, R ,Rinner,alphap, scattering_types, x, y, z):
+def scattering_on_arccircular_h_holes(cf, ph, x0, y0, R ,Rinner,alphap, scattering_types, x, y, z):
     """Check if a phonon strikes a circular hole and calculate the new direction"""
     if x == x0:# to prevent division by 0 
         x = x + 1e-12
@@ -1097,7 +1097,7 @@ def scattering_on_arccircular_h_holes(ph, x0, y0, R ,Rinner,alphap, scattering_t
                     ph.phi = asin((asin(2*random() - 1))/(pi/2))
                         
                      #Accept the angles only if they do not immediately cause new scattering:
-                    if no_new_scattering(ph):
+                    if no_new_scattering(cf, ph):
                          break
       
         if continu ==0:
@@ -1135,9 +1135,9 @@ def scattering_on_arccircular_h_holes(ph, x0, y0, R ,Rinner,alphap, scattering_t
                 ph.theta = tangent_theta - asin(2*random()-1) + pi*(y >= y0)
                 ph.phi = asin((asin(2*random() - 1))/(pi/2)) - (pi / 2 - cf.pillar_wall_angle)
                 scattering_types.pillars = Scattering.DIFFUSE
-                    #if no_new_scattering(ph):
+                    #if no_new_scattering(cf, ph):
                         
-def scattering_on_arccircular_h_reverse_holes(ph, x0, y0, R ,Rinner,alphap, scattering_types, x, y, z):
+def scattering_on_arccircular_h_reverse_holes(cf, ph, x0, y0, R ,Rinner,alphap, scattering_types, x, y, z):
     """Check if a phonon strikes a circular hole and calculate the new direction"""
     if x == x0:# to prevent division by 0 
         x = x + 1e-12
@@ -1230,7 +1230,7 @@ def scattering_on_arccircular_h_reverse_holes(ph, x0, y0, R ,Rinner,alphap, scat
                     ph.phi = asin((asin(2*random() - 1))/(pi/2))
                         
                      #Accept the angles only if they do not immediately cause new scattering:
-                    if no_new_scattering(ph):
+                    if no_new_scattering(cf, ph):
                          break
       
         if continu ==0:
@@ -1268,10 +1268,10 @@ def scattering_on_arccircular_h_reverse_holes(ph, x0, y0, R ,Rinner,alphap, scat
                 ph.theta = tangent_theta - asin(2*random()-1) + pi*(y >= y0)
                 ph.phi = asin((asin(2*random() - 1))/(pi/2)) - (pi / 2 - cf.pillar_wall_angle)
                 scattering_types.pillars = Scattering.DIFFUSE
-                    #if no_new_scattering(ph):
+                    #if no_new_scattering(cf, ph):
                          #break 
                          
-def scattering_on_rectangular_holes(ph, x0, y0, Lx, Ly, scattering_types, x, y, z):
+def scattering_on_rectangular_holes(cf, ph, x0, y0, Lx, Ly, scattering_types, x, y, z):
     """Check if the phonon strikes a rectangular hole and calculate new direction"""
 
     # If the phonon is inside the rectangle:
@@ -1304,7 +1304,7 @@ def scattering_on_rectangular_holes(ph, x0, y0, Lx, Ly, scattering_types, x, y,
                     ph.phi = asin((asin(2*random() - 1))/(pi/2))
 
                     # Accept the angles only if they do not lead to new scattering:
-                    if no_new_scattering(ph):
+                    if no_new_scattering(cf, ph):
                         break
 
         # Scattering on top and bottom walls of the hole:
@@ -1339,11 +1339,11 @@ def scattering_on_rectangular_holes(ph, x0, y0, Lx, Ly, scattering_types, x, y,
                         ph.phi = asin((asin(2*random() - 1))/(pi/2))
 
                     # Accept the angles only if they do not immediately cause new scattering:
-                    if no_new_scattering(ph):
+                    if no_new_scattering(cf, ph):
                         break
 
 
-def scattering_on_circular_pillars(ph, x0, y0, R_base, scattering_types, x, y, z):
+def scattering_on_circular_pillars(cf, ph, x0, y0, R_base, scattering_types, x, y, z):
     """Check if a phonon strikes a circular pillar and calculate new direction"""
 
     # Cone radius at a given z coordinate:
@@ -1385,7 +1385,7 @@ def scattering_on_circular_pillars(ph, x0, y0, R_base, scattering_types, x, y, z
             scattering_types.pillars = Scattering.DIFFUSE
 
 
-def scattering_on_triangle_down_holes(ph, x0, y0, Lx, Ly, scattering_types, x, y, z):
+def scattering_on_triangle_down_holes(cf, ph, x0, y0, Lx, Ly, scattering_types, x, y, z):
     """Check if the phonon strikes a reverse triangular hole and calculate new direction after the scattering"""
 
     # Angle of the triangle:
@@ -1432,7 +1432,7 @@ def scattering_on_triangle_down_holes(ph, x0, y0, Lx, Ly, scattering_types, x, y
                 scattering_types.holes= Scattering.DIFFUSE
 
 
-def scattering_on_triangle_up_holes(ph, x0, y0, Lx, Ly, scattering_types, x, y, z):
+def scattering_on_triangle_up_holes(cf, ph, x0, y0, Lx, Ly, scattering_types, x, y, z):
     """Check if the phonon strikes a reverse triangular hole and calculate new direction"""
 
     # Angle of the triangle:
@@ -1482,7 +1482,7 @@ def scattering_on_triangle_up_holes(ph, x0, y0, Lx, Ly, scattering_types, x, y,
                 scattering_types.holes = Scattering.DIFFUSE
 
 
-def no_new_scattering(ph):
+def no_new_scattering(cf, ph):
     """Check if new angles do not immediately lead to new top/bottom or sidewall scattering.
     This is necessary to prevent phonons leaving the structure boundaries."""
     x, y, z = move(ph, cf.timestep)
@@ -1491,7 +1491,7 @@ def no_new_scattering(ph):
             cf.length > y > 0)
 
 
-def scattering_on_right_sidewall(ph, scattering_types):
+def scattering_on_right_sidewall(cf, ph, scattering_types):
     """Check if the phonon hits right side wall and output new vector"""
     x, y, z = move(ph, cf.timestep)
 
@@ -1523,11 +1523,11 @@ def scattering_on_right_sidewall(ph, scattering_types):
                 ph.phi = asin((asin(2*random() - 1))/(pi/2))
 
                 # Accept the angles if they do not cause new scattering:
-                if no_new_scattering(ph):
+                if no_new_scattering(cf, ph):
                     break
 
 
-def scattering_on_left_sidewall(ph, scattering_types):
+def scattering_on_left_sidewall(cf, ph, scattering_types):
     """Check if the phonon hits left side wall and output new vector"""
     x, y, z = move(ph, cf.timestep)
 
@@ -1559,11 +1559,11 @@ def scattering_on_left_sidewall(ph, scattering_types):
                 ph.phi = asin((asin(2*random() - 1))/(pi/2))
 
                 # Accept the angles if they do not cause new scattering:
-                if no_new_scattering(ph):
+                if no_new_scattering(cf, ph):
                     break
 
 
-def scattering_on_top_sidewall(ph, scattering_types):
+def scattering_on_top_sidewall(cf, ph, scattering_types):
     """Check if the phonon hits top side wall and output new vector"""
     x, y, z = move(ph, cf.timestep)
 
@@ -1592,11 +1592,11 @@ def scattering_on_top_sidewall(ph, scattering_types):
                 ph.phi = asin((asin(2*random() - 1))/(pi/2))
 
                 # Accept the angles only if they do not immediately cause new scattering:
-                if no_new_scattering(ph):
+                if no_new_scattering(cf, ph):
                     break
 
 
-def scattering_on_bottom_sidewall(ph, scattering_types):
+def scattering_on_bottom_sidewall(cf, ph, scattering_types):
     """Check if the phonon hits bottom side wall and output new vector"""
     x, y, z = move(ph, cf.timestep)
 
@@ -1624,11 +1624,11 @@ def scattering_on_bottom_sidewall(ph, scattering_types):
                 ph.phi = asin((asin(2*random() - 1))/(pi/2))
 
                 # Accept the angles only if they do not immediately cause new scattering:
-                if no_new_scattering(ph):
+                if no_new_scattering(cf, ph):
                     break
 
 
-def top_scattering(ph, scattering_types):
+def top_scattering(cf, ph, scattering_types):
     """Check if the phonon hits the top surface and output new vector"""
     x, y, z = move(ph, cf.timestep)
 
@@ -1656,7 +1656,7 @@ def top_scattering(ph, scattering_types):
             scattering_types.top_bottom = Scattering.DIFFUSE
 
 
-def top_scattering_with_pillars(ph, scattering_types):
+def top_scattering_with_pillars(cf, ph, scattering_types):
     """Check if the phonon hits the top surface and if this place has a pillar and output new vector"""
     x, y, z = move(ph, cf.timestep)
 
@@ -1712,7 +1712,7 @@ def top_scattering_with_pillars(ph, scattering_types):
                 scattering_types.top_bottom = Scattering.DIFFUSE
 
 
-def bottom_scattering(ph, scattering_types):
+def bottom_scattering(cf, ph, scattering_types):
     """Check if the phonon hits the bottom surface and calculate new angles"""
     x, y, z = move(ph, cf.timestep)
 
@@ -1740,34 +1740,47 @@ def bottom_scattering(ph, scattering_types):
             scattering_types.top_bottom = Scattering.DIFFUSE
 
 
-def surface_scattering(ph, scattering_types):
-    """Check if there will be a surface scattering on this timestep and return new direction"""
+def surface_scattering(cf, ph, scattering_types, profiler=None):
+    """Check if there will be a surface scattering on this timestep and return new direction.
+    If a profiler is given, time of each type of surfaces is recorded"""
 
     # Scattering on top surface with and without pillars:
+    if profiler is not None:
+        start_time = perf_counter()
     if cf.include_pillars:
-        top_scattering_with_pillars(ph, scattering_types)
+        top_scattering_with_pillars(cf, ph, scattering_types)
     else:
-        top_scattering(ph, scattering_types)
+        top_scattering(cf, ph, scattering_types)
 
     # Scattering on bottom surface:
     if scattering_types.top_bottom is None:
-        bottom_scattering(ph, scattering_types)
+        bottom_scattering(cf, ph, scattering_types)
+    if profiler is not None:
+        profiler.add("Top and bottom surfaces", start_time)
 
     # Scattering on sidewalls:
+    if profiler is not None:
+        start_time = perf_counter()
     if cf.include_right_sidewall:
-        scattering_on_right_sidewall(ph, scattering_types)
+        scattering_on_right_sidewall(cf, ph, scattering_types)
     if cf.include_left_sidewall:
-        scattering_on_left_sidewall(ph, scattering_types)
+        scattering_on_left_sidewall(cf, ph, scattering_types)
     if cf.include_top_sidewall:
-        scattering_on_top_sidewall(ph, scattering_types)
+        scattering_on_top_sidewall(cf, ph, scattering_types)
     if cf.include_bottom_sidewall:
-        scattering_on_bottom_sidewall(ph, scattering_types)
+        scattering_on_bottom_sidewall(cf, ph, scattering_types)
+    if profiler is not None:
+        profiler.add("Sidewalls", start_time)
 
     # Scattering on parabolic walls:
+    if profiler is not None:
+        start_time = perf_counter()
     if cf.include_top_parabola:
-        top_parabola_scattering(ph, scattering_types)
+        top_parabola_scattering(cf, ph, scattering_types)
     if cf.include_bottom_parabola:
-        bottom_parabola_scattering(ph, scattering_types)
+        bottom_parabola_scattering(cf, ph, scattering_types)
+    if profiler is not None and (cf.include_top_parabola or cf.include_bottom_parabola):
+        profiler.add("Parabolas", start_time)
 
     # Scattering on holes:
     if cf.include_holes:
@@ -1776,6 +1789,8 @@ def surface_scattering(ph, scattering_types):
 
         # Check for each hole:
         for i in range(cf.hole_coordinates.shape[0]):
+            if profiler is not None:
+                start_time = perf_counter()
 
             # Coordinates of the hole center:
             x0 = cf.hole_coordinates[i, 0]
@@ -1783,99 +1798,101 @@ def surface_scattering(ph, scattering_types):
 
             if cf.hole_shapes[i] == "circle":
                 rad = cf.circular_hole_diameter * (1 + cf.hole_coordinates[i, 2]) / 2
-                scattering_on_circular_holes(ph, x0, y0, rad, scattering_types, x, y, z)
+                scattering_on_circular_holes(cf, ph, x0, y0, rad, scattering_types, x, y, z)
             elif cf.hole_shapes[i] == "semicircle":
                 rad = cf.circular_hole_diameter * (1 + cf.hole_coordinates[i, 2]) / 2
-                scattering_on_semicircular_holes(ph, x0, y0, rad,scattering_types, x, y, z)
+                scattering_on_semicircular_holes(cf, ph, x0, y0, rad,scattering_types, x, y, z)
                 
             elif cf.hole_shapes[i] == "arccircle_v":
                 rad = cf.circular_hole_diameter * (1 + cf.hole_coordinates[i, 2]) / 2
                 rad_inner = cf.inner_circular_hole_diameter * (1 + cf.hole_coordinates[i, 2]) / 2
-                scattering_on_arccircular_v_holes(ph, x0, y0, rad,rad_inner, cf.alphaARC, scattering_types, x, y, z)
+                scattering_on_arccircular_v_holes(cf, ph, x0, y0, rad,rad_inner, cf.alphaARC, scattering_types, x, y, z)
                 
             elif cf.hole_shapes[i] == "arccircle_v_scaling":
                 rad = cf.circular_hole_diameter *cf.scaling_factor_radius[i]* (1 + cf.hole_coordinates[i, 2]) / 2
                 rad_inner = cf.inner_circular_hole_diameter *cf.scaling_factor_inner_radius[i]* (1 + cf.hole_coordinates[i, 2]) / 2
-                scattering_on_arccircular_v_holes(ph, x0, y0, rad,rad_inner, cf.alphaARC, scattering_types, x, y, z)
+                scattering_on_arccircular_v_holes(cf, ph, x0, y0, rad,rad_inner, cf.alphaARC, scattering_types, x, y, z)
                 
             elif cf.hole_shapes[i] == "arccircle_v_scaling_wire":
                 rad = cf.circular_hole_diameter *cf.scaling_factor_radius[i]* (1 + cf.hole_coordinates[i, 2]) / 2
                 angle_sca= cf.alphaARC* cf.scale_angle_v
                 rad_inner = cf.inner_circular_hole_diameter *cf.scaling_factor_inner_radius[i]* (1 + cf.hole_coordinates[i, 2]) / 2
-                scattering_on_arccircular_v_holes(ph, x0, y0, rad,rad_inner, angle_sca, scattering_types, x, y, z)
+                scattering_on_arccircular_v_holes(cf, ph, x0, y0, rad,rad_inner, angle_sca, scattering_types, x, y, z)
                 
             elif cf.hole_shapes[i] == "arccircle_v_lattice":
                 rad = cf.circular_hole_diameter *cf.scaling_factor_radius[i]* (1 + cf.hole_coordinates[i, 2]) / 2
                 rad_inner = cf.inner_circular_hole_diameter *cf.scaling_factor_inner_radius[i]* (1 + cf.hole_coordinates[i, 2]) / 2
                 angle_sca= cf.alphaARC* cf.scale_angle_m[i%6]
-                scattering_on_arccircular_v_holes(ph, x0, y0, rad,rad_inner, angle_sca, scattering_types, x, y, z)
+                scattering_on_arccircular_v_holes(cf, ph, x0, y0, rad,rad_inner, angle_sca, scattering_types, x, y, z)
                 
             elif cf.hole_shapes[i] == "arccircle_v_lattice_curve":
                 rad = cf.circular_hole_diameter *cf.scaling_factor_radius[i]* (1 + cf.hole_coordinates[i, 2]) / 2
                 Rbig=cf.circular_hole_diameter/2
                 rad_inner = cf.inner_circular_hole_diameter *cf.scaling_factor_inner_radius[i]* (1 + cf.hole_coordinates[i, 2]) / 2               
-                scattering_on_arccircular_curve_v_holes(ph, x0, y0, rad,rad_inner,Rbig,  scattering_types, x, y, z)
+                scattering_on_arccircular_curve_v_holes(cf, ph, x0, y0, rad,rad_inner,Rbig,  scattering_types, x, y, z)
             
             elif cf.hole_shapes[i] == "arccircle_v_lattice_curve_begin":
                 rad = cf.circular_hole_diameter *cf.scaling_factor_radius[i]* (1 + cf.hole_coordinates[i, 2]) / 2
                 Rbig=cf.circular_hole_diameter/2
-                scattering_on_arccircular_curve_v_begin_holes(ph, x0, y0, rad,Rbig,  scattering_types, x, y, z)
+                scattering_on_arccircular_curve_v_begin_holes(cf, ph, x0, y0, rad,Rbig,  scattering_types, x, y, z)
             
             
             elif cf.hole_shapes[i] == "arccircle_v_demi_down":
                 rad = cf.circular_hole_diameter *cf.scaling_factor_radius[i]* (1 + cf.hole_coordinates[i, 2]) / 2
                 angle_sca= cf.alphaARC* cf.scale_angle_m[i%6]
                 rad_inner = cf.inner_circular_hole_diameter *cf.scaling_factor_inner_radius[i]* (1 + cf.hole_coordinates[i, 2]) / 2
-                scattering_on_arccircular_v_demi_down_holes(ph, x0, y0, rad,rad_inner, angle_sca,cf.angle0, scattering_types, x, y, z)
+                scattering_on_arccircular_v_demi_down_holes(cf, ph, x0, y0, rad,rad_inner, angle_sca,cf.angle0, scattering_types, x, y, z)
             
             
             elif cf.hole_shapes[i] == "arccircle_v_demi_up":
                  rad = cf.circular_hole_diameter *cf.scaling_factor_radius[i]* (1 + cf.hole_coordinates[i, 2]) / 2
                  angle_sca= cf.alphaARC* cf.scale_angle_m[i%6]
                  rad_inner = cf.inner_circular_hole_diameter *cf.scaling_factor_inner_radius[i]* (1 + cf.hole_coordinates[i, 2]) / 2
-                 scattering_on_arccircular_v_demi_up_holes(ph, x0, y0, rad,rad_inner, angle_sca,cf.angle0, scattering_types, x, y, z)        
+                 scattering_on_arccircular_v_demi_up_holes(cf, ph, x0, y0, rad,rad_inner, angle_sca,cf.angle0, scattering_types, x, y, z)        
                  
             
             elif cf.hole_shapes[i] == "arccircle_h":
                 rad = cf.circular_hole_diameter * (1 + cf.hole_coordinates[i, 2]) / 2
                 rad_inner = cf.inner_circular_hole_diameter * (1 + cf.hole_coordinates[i, 2]) / 2
-                scattering_on_arccircular_h_holes(ph, x0, y0, rad,rad_inner, cf.alphaARC, scattering_types, x, y, z)
+                scattering_on_arccircular_h_holes(cf, ph, x0, y0, rad,rad_inner, cf.alphaARC, scattering_types, x, y, z)
             
                 
             elif cf.hole_shapes[i] == "arccircle_h_reverse":
                 rad = cf.circular_hole_diameter * (1 + cf.hole_coordinates[i, 2]) / 2
                 rad_inner = cf.inner_circular_hole_diameter * (1 + cf.hole_coordinates[i, 2]) / 2
-                scattering_on_arccircular_h_reverse_holes(ph, x0, y0, rad,rad_inner, cf.alphaARC, scattering_types, x, y, z)
+                scattering_on_arccircular_h_reverse_holes(cf, ph, x0, y0, rad,rad_inner, cf.alphaARC, scattering_types, x, y, z)
                  
             elif cf.hole_shapes[i] == "arccircle_h_scaling":
                 rad = cf.circular_hole_diameter *cf.scaling_factor_radius[i]* (1 + cf.hole_coordinates[i, 2]) / 2
                 angle_sca= cf.alphaARC *cf.scale_angle_h
                 rad_inner = cf.inner_circular_hole_diameter *cf.scaling_factor_inner_radius[i]* (1 + cf.hole_coordinates[i, 2]) / 2
-                scattering_on_arccircular_h_holes(ph, x0, y0, rad,rad_inner, angle_sca, scattering_types, x, y, z)
+                scattering_on_arccircular_h_holes(cf, ph, x0, y0, rad,rad_inner, angle_sca, scattering_types, x, y, z)
                 
             elif cf.hole_shapes[i] == "arccircle_h_scaling_reverse":
                 rad = cf.circular_hole_diameter *cf.scaling_factor_radius[i]* (1 + cf.hole_coordinates[i, 2]) / 2
                 angle_sca= cf.alphaARC *cf.scale_angle_h_reverse
                 rad_inner = cf.inner_circular_hole_diameter *cf.scaling_factor_inner_radius[i]* (1 + cf.hole_coordinates[i, 2]) / 2
-                scattering_on_arccircular_h_reverse_holes(ph, x0, y0, rad,rad_inner, angle_sca, scattering_types, x, y, z)
+                scattering_on_arccircular_h_reverse_holes(cf, ph, x0, y0, rad,rad_inner, angle_sca, scattering_types, x, y, z)
 
             elif cf.hole_shapes[i] == "rectangle":
                 # Correction of the hole size if there are holes of non-standard size:
                 Lx = cf.rectangular_hole_side_x * (cf.hole_coordinates[i, 2] + 1)
                 Ly = cf.rectangular_hole_side_y * (cf.hole_coordinates[i, 2] + 1)
-                scattering_on_rectangular_holes(ph, x0, y0, Lx, Ly, scattering_types, x, y, z)
+                scattering_on_rectangular_holes(cf, ph, x0, y0, Lx, Ly, scattering_types, x, y, z)
 
             elif cf.hole_shapes[i] == "triangle_up":
                 Lx = cf.rectangular_hole_side_x * (cf.hole_coordinates[i, 2] + 1)
                 Ly = cf.rectangular_hole_side_y * (cf.hole_coordinates[i, 2] + 1)
-                scattering_on_triangle_up_holes(ph, x0, y0, Lx, Ly, scattering_types, x, y, z)
+                scattering_on_triangle_up_holes(cf, ph, x0, y0, Lx, Ly, scattering_types, x, y, z)
 
             elif cf.hole_shapes[i] == "triangle_down":
                 Lx = cf.rectangular_hole_side_x * (cf.hole_coordinates[i, 2] + 1)
                 Ly = cf.rectangular_hole_side_y * (cf.hole_coordinates[i, 2] + 1)
-                scattering_on_triangle_down_holes(ph, x0, y0, Lx, Ly, scattering_types, x, y, z)
+                scattering_on_triangle_down_holes(cf, ph, x0, y0, Lx, Ly, scattering_types, x, y, z)
             else:
                 pass
+            if profiler is not None:
+                profiler.add("Holes: " + cf.hole_shapes[i], start_time)
 
             # If there was any scattering, then no need to check other holes:
             if scattering_types.holes is not None:
@@ -1883,6 +1900,8 @@ def surface_scattering(ph, scattering_types):
 
     # Scattering on pillars:
     if cf.include_pillars:
+        if profiler is not None:
+            start_time = perf_counter()
 
         # Preliminary move to see if phonon would cross something:
         x, y, z = move(ph, cf.timestep)
@@ -1894,11 +1913,13 @@ def surface_scattering(ph, scattering_types):
             y0 = cf.pillar_coordinates[i, 1]
             rad = cf.circular_hole_diameter * (1 + cf.pillar_coordinates[i,2]) / 2
 
-            scattering_on_circular_pillars(ph, x0, y0, rad, scattering_types, x, y, z)
+            scattering_on_circular_pillars(cf, ph, x0, y0, rad, scattering_types, x, y, z)
 
             # If there was any scattering, then no need to check other pillars:
             if scattering_types.pillars is not None:
                 break
+        if profiler is not None:
+            profiler.add("Pillars", start_time)
 
     # Correct angle if it became more than 180 degrees:
     ph.correct_angle()
@@ -0,0 +1,122 @@
+"""Module that runs the same simulation for all combinations of parameters given in a sweep file"""
+
+import os
+import io
+import sys
+import csv
+import random
+import itertools
+import contextlib
+import multiprocessing
+
+from freepaths.config import Config, default_parameters
+from freepaths.progress import Progress
+
+
+def read_sweep_file(filename):
+    """Read the sweep file, which defines a dictionary SWEEP = {"PARAMETER": [value_1, value_2, ...]}.
+    Parameters that must change together are given as a tuple of names with tuples of values,
+    e.g. ("T", "SPECIFIC_HEAT_CAPACITY"): [(4, 0.0176), (300, 714)]"""
+    namespace = {}
+    with open(filename, encoding='utf-8') as file:
+        exec(file.read(), namespace)
+
+    if not isinstance(namespace.get("SWEEP"), dict) or not namespace["SWEEP"]:
+        print("ERROR: The sweep file must define a dictionary SWEEP of parameters and their values.\n")
+        sys.exit()
+
+    known_parameters = default_parameters()
+    for key, values in namespace["SWEEP"].items():
+        names = key if isinstance(key, tuple) else (key,)
+        for name in names:
+            if name not in known_parameters:
+                print(f"ERROR: Parameter {name} in the sweep file does not exist.\n")
+                sys.exit()
+            if name == "OUTPUT_FOLDER_NAME":
+                print("ERROR: Parameter OUTPUT_FOLDER_NAME cannot be swept.\n")
+                sys.exit()
+        if not isinstance(values, (list, tuple)) or not values:
+            print(f"ERROR: Values of parameter {key} in the sweep file must be a non-empty list.\n")
+            sys.exit()
+        if isinstance(key, tuple) and any(not isinstance(value, tuple) or len(value) != len(key) for value in values):
+            print(f"ERROR: Values of parameters {key} in the sweep file must be tuples of {len(key)} values.\n")
+            sys.exit()
+    return namespace["SWEEP"]
+
+
+def sweep_points(sweep):
+    """Return the list of all combinations of the swept parameters, parameters swept together keep their values together"""
+    points = []
+    for combination in itertools.product(*sweep.values()):
+        point = {}
+        for key, value in zip(sweep.keys(), combination):
+            if isinstance(key, tuple):
+                point.update(zip(key, value))
+            else:
+                point[key] = value
+        points.append(point)
+    return points
+
+
+def run_point(task):
+    """Run one simulation of the sweep in a worker process and return its number and main results"""
+    number, cf, input_file, sampling = task
+    with contextlib.redirect_stdout(io.StringIO()):
+        if sampling:
+            from freepaths import main_mfp_sampling
+            return number, main_mfp_sampling.main(cf, input_file)
+        from freepaths import main_tracing
+        return number, main_tracing.main(cf, input_file)
+
+
+def write_sweep_index(filename, points, folders, summaries):
+    """Write a table of all simulations of the sweep with their parameters and main results"""
+    parameter_names = list(points[0].keys())
+    result_names = list(summaries[0].keys())
+    with open(filename, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Point", "Folder"] + parameter_names + result_names)
+        for number, (point, folder, summary) in enumerate(zip(points, folders, summaries)):
+            values = [point[name] for name in parameter_names] + [summary.get(name) for name in result_names]
+            writer.writerow([number, folder] + values)
+
+
+def main(cf, input_file, sweep_file, sampling=False):
+    """Run the simulation of the input file for all points of the sweep in a pool of processes.
+    The results of each point are in its own subfolder and are summarized in the Sweep index.csv"""
+
+    points = sweep_points(read_sweep_file(sweep_file))
+    print(f'Sweep of {cf.output_folder_name} over {len(points)} simulations')
+
+    # Configs are created here, so that errors in parameters are reported before any simulation starts:
+    configs = []
+    folders = []
+    for number, point in enumerate(points):
+        folder = f"{cf.output_folder_name}/Point {number}"
+        # Simulations already run in worker processes, which cannot start processes of their own:
+        parameters = dict(point, OUTPUT_FOLDER_NAME=folder, NUMBER_OF_PROCESSES=1)
+        if input_file:
+            configs.append(Config.from_file(input_file, parameters))
+        else:
+            configs.append(Config.from_dict(parameters))
+        folders.append(folder)
+    os.makedirs(f"Results/{cf.output_folder_name}", exist_ok=True)
+
+    # Workers stay alive for all the points, so the materials and imports are reused between simulations.
+    # Each worker reseeds its random generator, otherwise forked workers would produce identical phonons:
+    tasks = [(number, point_cf, input_file, sampling) for number, point_cf in enumerate(configs)]
+    summaries = [None] * len(tasks)
+    progress = Progress()
+    progress.render(0, len(tasks))
+    with multiprocessing.Pool(processes=cf.number_of_processes, initializer=random.seed) as pool:
+        results = pool.imap_unordered(run_point, tasks)
+        for number_of_finished, (number, summary) in enumerate(results, start=1):
+            summaries[number] = summary
+            progress.render(number_of_finished, len(tasks))
+
+    index_file = f"Results/{cf.output_folder_name}/Sweep index.csv"
+    write_sweep_index(index_file, points, folders, summaries)
+    sys.stdout.write(f'\rSee the summary in "{index_file}" file.\n')
+    sys.stdout.write("\rThank you for using FreePATHS.\n")
+    return summaries
+
@@ -0,0 +1,244 @@
+"""Module that estimates confidence intervals of the simulation results while phonons are traced"""
+
+import math
+import statistics
+import numpy as np
+
+from freepaths.data import scattering_percentages
+
+
+def normal_quantile(confidence_level):
+    """Number of standard deviations that contain the given fraction of the normal distribution"""
+    return statistics.NormalDist().inv_cdf(0.5 + confidence_level / 2)
+
+
+def binomial_interval(successes, trials, confidence_level):
+    """Fraction of successes and the half-width of its Wilson score interval,
+    which stays valid for fractions close to 0 or 1"""
+    if trials == 0:
+        return 0.0, math.inf
+    z = normal_quantile(confidence_level)
+    fraction = successes / trials
+    denominator = 1 + z**2 / trials
+    half_width = z * math.sqrt(fraction * (1 - fraction) / trials + z**2 / (4 * trials**2)) / denominator
+    return fraction, half_width
+
+
+def weighted_mean_interval(total, total_of_squares, trials, confidence_level):
+    """Mean of weighted values and the half-width of its normal confidence interval,
+    calculated from the sums of the values and of their squares"""
+    if trials < 2:
+        return (total / trials if trials else 0.0), math.inf
+    mean = total / trials
+    variance = max(total_of_squares / trials - mean**2, 0.0) * trials / (trials - 1)
+    return mean, normal_quantile(confidence_level) * math.sqrt(variance / trials)
+
+
+class BatchMeans:
+    """Running mean and variance of values calculated in independent batches of phonons, updated by Welford's
+    algorithm, so that memory does not grow with the number of batches. Values can be scalars or arrays,
+    non-finite elements are skipped element by element"""
+
+    def __init__(self):
+        """Start without any batches"""
+        self.count = None
+        self.mean = None
+        self.squared_deviations = None
+
+    def add(self, values):
+        """Add the values of one batch"""
+        values = np.asarray(values, dtype=float)
+        if self.count is None:
+            self.count = np.zeros(values.shape)
+            self.mean = np.zeros(values.shape)
+            self.squared_deviations = np.zeros(values.shape)
+        is_finite = np.isfinite(values)
+        with np.errstate(invalid="ignore"):
+            self.count += is_finite
+            delta = np.where(is_finite, values - self.mean, 0.0)
+            self.mean += np.divide(delta, self.count, out=np.zeros(values.shape), where=is_finite)
+            self.squared_deviations += np.where(is_finite, delta * (values - self.mean), 0.0)
+
+    def interval(self, confidence_level, scale=1.0):
+        """Mean of the batch values and the half-width of its confidence interval from Student's t-distribution.
+        Both are multiplied by the scale, for instance by the number of batches to get the interval of the total"""
+        if self.count is None:
+            return math.nan, math.inf
+        from scipy.stats import t
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = np.where(self.count > 0, self.mean, np.nan)
+            standard_error = np.sqrt(self.squared_deviations / (self.count - 1) / self.count)
+            half_width = np.where(self.count > 1, t.ppf(0.5 + confidence_level / 2, self.count - 1) * standard_error, np.inf)
+        if mean.ndim == 0:
+            return float(mean) * scale, float(half_width) * scale
+        return mean * scale, half_width * scale
+
+
+class RatioOfSums:
+    """Running sums of the numerator and the denominator of a ratio in independent batches of phonons,
+    such as J*dL and dT of the thermal conductivity, and of their squares and products. The interval of the ratio
+    of the totals is estimated by the delta method, so that memory does not grow with the number of batches.
+    Values can be scalars or arrays"""
+
+    def __init__(self):
+        """Start without any batches"""
+        self.count = 0
+        self.sums = None
+
+    def add(self, numerator, denominator):
+        """Add the numerator and the denominator of one batch"""
+        x = np.asarray(numerator, dtype=float)
+        y = np.asarray(denominator, dtype=float)
+        terms = np.array([x, y, x * x, y * y, x * y])
+        self.sums = terms if self.sums is None else self.sums + terms
+        self.count += 1
+
+    def interval(self, confidence_level):
+        """Ratio of the totals and the half-width of its confidence interval from Student's t-distribution.
+        The residuals x - R*y of the batches sum to zero at R = sum(x) / sum(y), so their variance follows
+        from the sums of squares and products, and the variance of R is that of the mean residual divided by
+        the squared mean denominator"""
+        if self.count == 0:
+            return math.nan, math.inf
+        from scipy.stats import t
+        x, y, xx, yy, xy = self.sums
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = x / y
+            if self.count > 1:
+                variance = np.maximum(xx - 2 * ratio * xy + ratio**2 * yy, 0.0) / (self.count - 1)
+                standard_error = np.sqrt(variance / self.count) / np.abs(y / self.count)
+                half_width = t.ppf(0.5 + confidence_level / 2, self.count - 1) * standard_error
+            else:
+                half_width = np.full(np.shape(ratio), math.inf)
+            half_width = np.where(np.isfinite(ratio), half_width, math.inf)
+        if np.ndim(ratio) == 0:
+            return float(ratio), float(half_width)
+        return ratio, half_width
+
+
+class PrecisionTracker:
+    """Running counts of phonons reaching the cold side and detectors, and batch means of the other results,
+    to estimate their confidence intervals and to stop the simulation once the results are precise enough.
+    Phonons are counted with their weights, whose squares are summed for the intervals of weighted counts"""
+
+    # Profiles whose totals get confidence intervals, and the files of their half-widths:
+    profile_files = {
+        "temperature_profile_x": "Temperature profiles x errors.csv",
+        "temperature_profile_y": "Temperature profiles y errors.csv",
+        "heat_flux_profile_x": "Heat flux profiles x errors.csv",
+        "heat_flux_profile_y": "Heat flux profiles y errors.csv",
+        "time_spent": "Time spent in segments errors.csv",
+        "scattering_events": "Scattering events statistics errors.csv",
+    }
+
+    def __init__(self, cf):
+        """Initialize counters, batch means, and the data at the end of the previous batch"""
+        self.cf = cf
+        self.number_of_phonons = 0
+        self.number_of_batches = 0
+        self.is_weighted = False
+        self.reached_cold_side = 0
+        self.detected = [0, 0, 0]
+        self.squares = [0, 0, 0, 0]
+        self.conductivity = RatioOfSums()
+        self.scattering = {}
+        self.profiles = {name: BatchMeans() for name in self.profile_files}
+        self.previous = {}
+
+    def add_flight(self, flight):
+        """Count whether the phonon reached the cold side and the detectors, as in the output files"""
+        weight = flight.phonon.weight
+        self.number_of_phonons += 1
+        self.is_weighted = self.is_weighted or weight != 1
+        hits = [weight * (flight.exit_theta != 0), weight * (flight.detected_frequency != 0),
+                weight * (flight.detected_frequency_2 != 0), weight * (flight.detected_frequency_3 != 0)]
+        self.reached_cold_side += hits[0]
+        for number in range(3):
+            self.detected[number] += hits[number + 1]
+        for number, hit in enumerate(hits):
+            self.squares[number] += hit**2
+
+    def batch_change(self, name, values):
+        """Return the change of the accumulated data since the previous batch"""
+        values = np.array(values, dtype=float)
+        change = values - self.previous.get(name, 0.0)
+        self.previous[name] = values
+        return change
+
+    def add_batch(self, thermal_maps, scatter_stats, segment_stats):
+        """Calculate the results of the phonons traced since the previous batch. For the thermal conductivity
+        in each time interval, the heat flux and temperature difference terms of the batch are summed"""
+        profiles = {
+            "temperature_profile_x": self.batch_change("temperature_profile_x", thermal_maps.temperature_profile_x),
+            "temperature_profile_y": self.batch_change("temperature_profile_y", thermal_maps.temperature_profile_y),
+            "heat_flux_profile_x": self.batch_change("heat_flux_profile_x", thermal_maps.heat_flux_profile_x),
+            "heat_flux_profile_y": self.batch_change("heat_flux_profile_y", thermal_maps.heat_flux_profile_y),
+            "time_spent": self.batch_change("time_spent", segment_stats.time_spent),
+            "scattering_events": self.batch_change("scattering_events", scatter_stats.events_by_segment()),
+        }
+        for name, change in profiles.items():
+            self.profiles[name].add(change)
+        self.number_of_batches += 1
+
+        self.conductivity.add(*thermal_maps.conductivity_terms(profiles["heat_flux_profile_y"],
+                                                               profiles["temperature_profile_y"]))
+
+        totals = {name: self.batch_change(name, total) for name, total in scatter_stats.totals().items()}
+        for name, percentage in scattering_percentages(totals).items():
+            self.scattering.setdefault(name, BatchMeans()).add(percentage)
+
+    def intervals(self, thermal_maps):
+        """Return the estimate and the half-width of the confidence interval of each result,
+        percentages are in % and the thermal conductivity in W/mK. The thermal conductivity is the one
+        calculated from the profiles of all traced phonons, as in the Thermal conductivity.csv file"""
+        confidence_level = self.cf.confidence_level
+        results = {}
+        names = ["Reached cold side (%)", "Detector 1 (%)", "Detector 2 (%)", "Detector 3 (%)"]
+        for name, total, squares in zip(names, [self.reached_cold_side] + self.detected, self.squares):
+            if self.is_weighted:
+                results[name] = weighted_mean_interval(total, squares, self.number_of_phonons, confidence_level)
+            else:
+                results[name] = binomial_interval(total, self.number_of_phonons, confidence_level)
+        results = {name: (100 * fraction, 100 * half_width) for name, (fraction, half_width) in results.items()}
+        with np.errstate(divide="ignore", invalid="ignore"):
+            conductivity = thermal_maps.conductivity_from_profiles(thermal_maps.heat_flux_profile_y,
+                                                                   thermal_maps.temperature_profile_y)
+        _, half_width = self.conductivity.interval(confidence_level)
+        results["Thermal conductivity (W/mK)"] = (float(conductivity[-1]), float(np.ravel(half_width)[-1]))
+        return results
+
+    def scattering_intervals(self):
+        """Return the percentages of scattering events with half-widths of their confidence intervals"""
+        return {name: batch_means.interval(self.cf.confidence_level) for name, batch_means in self.scattering.items()}
+
+    def write_into_files(self):
+        """Write half-widths of confidence intervals of the profiles, times and scattering events in segments,
+        and the thermal conductivity in each time interval. Intervals of the profiles are those of their totals,
+        i.e. of the mean over batches multiplied by the number of recorded batches. Phonons after the last full batch
+        are not in the batches. The rows and columns are the same as in the files of the data"""
+        header = f"Half-widths of confidence intervals at {100 * self.cf.confidence_level:g}% level"
+        for name, filename in self.profile_files.items():
+            _, half_width = self.profiles[name].interval(self.cf.confidence_level, self.number_of_batches)
+            if np.ndim(half_width):
+                np.savetxt(f"Data/{filename}", half_width, fmt='%1.3e', delimiter=",", header=header, encoding='utf-8')
+        _, half_width = self.conductivity.interval(self.cf.confidence_level)
+        if np.ndim(half_width):
+            np.savetxt("Data/Thermal conductivity errors.csv", half_width, fmt='%1.3e', delimiter=",",
+                       header=header + ", K (W/mK)", encoding='utf-8')
+
+    def is_precise(self, thermal_maps):
+        """Check if all the results with requested tolerances are precise enough"""
+        if self.cf.transmission_tolerance is None and self.cf.detector_tolerance is None and self.cf.conductivity_tolerance is None:
+            return False
+        intervals = self.intervals(thermal_maps)
+        if self.cf.transmission_tolerance is not None:
+            if intervals["Reached cold side (%)"][1] > self.cf.transmission_tolerance:
+                return False
+        if self.cf.detector_tolerance is not None:
+            if any(intervals[f"Detector {number} (%)"][1] > self.cf.detector_tolerance for number in range(1, 4)):
+                return False
+        if self.cf.conductivity_tolerance is not None:
+            conductivity, half_width = intervals["Thermal conductivity (W/mK)"]
+            if not half_width <= self.cf.conductivity_tolerance * abs(conductivity):
+                return False
+        return True
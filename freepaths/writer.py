@@ -0,0 +1,46 @@
+"""Module that writes output files in a background thread while the simulation continues"""
+
+import queue
+import threading
+
+
+class BackgroundWriter:
+    """Thread that executes queued writing tasks one by one in the order of submission"""
+
+    def __init__(self, queue_size=4):
+        """Start the thread with a bounded queue of tasks"""
+        self.tasks = queue.Queue(maxsize=queue_size)
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name="FreePATHS writer", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        """Execute tasks until the stop signal (None) is received"""
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                break
+            function, args = task
+            try:
+                function(*args)
+            except Exception as error:
+                if self.error is None:
+                    self.error = error
+
+    def check_errors(self):
+        """Raise the first error that occurred in the writing thread, if any"""
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def submit(self, function, *args):
+        """Queue a writing task. If the queue is full, wait until the thread catches up"""
+        self.check_errors()
+        self.tasks.put((function, args))
+
+    def close(self):
+        """Write all the remaining tasks and stop the thread, closing it again has no effect"""
+        if self.thread.is_alive():
+            self.tasks.put(None)
+            self.thread.join()
+        self.check_errors()
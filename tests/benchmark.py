@@ -0,0 +1,143 @@
+"""Benchmark of phonon tracing in representative structures.
+
+Each workload traces a small number of phonons through one of the example structures in a separate process,
+without writing or plotting any results, and reports phonons per second, timesteps per second, and peak memory
+as JSON. Run it before and after changes of the tracing engine and compare the results:
+
+python tests/benchmark.py --output before.json
+python tests/benchmark.py --phonons 100 --workloads phononic_crystal pillars
+"""
+
+import os
+import sys
+import math
+import json
+import time
+import random
+import argparse
+import platform
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Benchmark the code in this repository rather than an installed version:
+REPOSITORY_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY_FOLDER)
+EXAMPLES_FOLDER = os.path.join(REPOSITORY_FOLDER, "examples")
+
+from freepaths.config import Config
+from freepaths.materials import get_material
+from freepaths.phonon import PhononSource
+from freepaths.flight import Flight
+from freepaths.run_phonon import run_phonon
+from freepaths.data import ScatteringData, SegmentData
+from freepaths.maps import ScatteringMap, ThermalMaps
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def square_lattice(number_x, number_y, period_x, period_y, first_y):
+    """Coordinates of a square lattice as in the phononic crystal example"""
+    coordinates = np.zeros((number_x * number_y, 3))
+    for i in range(number_y):
+        for j in range(number_x):
+            coordinates[i * number_x + j, 0] = -(number_x - 1) * period_x / 2 + j * period_x
+            coordinates[i * number_x + j, 1] = first_y + i * period_y
+    return coordinates
+
+
+# Example input files and parameters that are changed to make the workloads:
+WORKLOADS = {
+    "simple_nanowire": ("simple_nanowire.py", {}),
+    "phononic_crystal": ("phononic_crystal.py", {}),
+    "slits_array": ("slits_array.py", {}),
+    "parabolic_lens_focusing": ("parabolic_lens_focusing.py", {}),
+    "pillars": ("phononic_crystal.py", {
+        "INCLUDE_HOLES": False,
+        "INCLUDE_PILLARS": True,
+        "PILLAR_COORDINATES": square_lattice(5, 6, 300e-9, 300e-9, 300e-9),
+        "PILLAR_WALL_ANGLE": math.pi / 2,
+    }),
+    "arc_hole_lattice": ("phononic_crystal.py", {
+        "HOLE_SHAPES": ["arccircle_v"] * 30,
+        "INNER_CIRCULAR_HOLE_DIAMETER": 150e-9,
+    }),
+}
+
+
+def peak_memory():
+    """Peak resident memory of this process in MB, or None if it cannot be measured on this system"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes and macOS reports bytes:
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def run_workload(name, number_of_phonons, seed):
+    """Trace phonons of one workload and return the measured performance"""
+    filename, parameters = WORKLOADS[name]
+    parameters = dict(parameters, NUMBER_OF_PHONONS=number_of_phonons, RANDOM_SEED=seed, OUTPUT_TRAJECTORIES_OF_FIRST=0)
+    cf = Config.from_file(os.path.join(EXAMPLES_FOLDER, filename), parameters)
+
+    material = get_material(cf.media, dispersion_file=cf.custom_dispersion_file,
+                            relaxation_time_file=cf.custom_relaxation_time_file, density=cf.custom_density)
+    source = PhononSource(cf, material)
+    scatter_stats = ScatteringData(cf)
+    segment_stats = SegmentData(cf)
+    scatter_maps = ScatteringMap()
+    thermal_maps = ThermalMaps(cf)
+    random.seed(seed)
+
+    number_of_timesteps = 0
+    start_time = time.perf_counter()
+    for index in range(number_of_phonons):
+        phonon = source.phonon(index)
+        flight = Flight(phonon)
+        number_of_timesteps += run_phonon(cf, phonon, flight, scatter_stats, segment_stats, thermal_maps,
+                                          scatter_maps, material)
+    elapsed_time = time.perf_counter() - start_time
+
+    return {
+        "Phonons": number_of_phonons,
+        "Timesteps": number_of_timesteps,
+        "Time (s)": elapsed_time,
+        "Phonons per second": number_of_phonons / elapsed_time,
+        "Timesteps per second": number_of_timesteps / elapsed_time,
+        "Peak memory (MB)": peak_memory(),
+    }
+
+
+def main():
+    """Run the requested workloads one by one, each in a new process to measure its own peak memory"""
+    parser = argparse.ArgumentParser(description="Benchmark of phonon tracing in representative structures.")
+    parser.add_argument("--phonons", type=int, default=50, help="Number of phonons in each workload")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed, to trace the same phonons in each run")
+    parser.add_argument("--workloads", nargs="+", choices=list(WORKLOADS), default=list(WORKLOADS), help="Workloads to run")
+    parser.add_argument("--output", help="JSON file for the results, by default they are printed")
+    args = parser.parse_args()
+
+    results = {
+        "Python": platform.python_version(),
+        "Platform": platform.platform(),
+        "Processor": platform.processor(),
+        "Workloads": {},
+    }
+    for name in args.workloads:
+        print(f"Running {name}...", file=sys.stderr)
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            results["Workloads"][name] = executor.submit(run_workload, name, args.phonons, args.seed).result()
+
+    text = json.dumps(results, indent=4)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Tests of the cache of results"""
+
+import os
+import glob
+
+from freepaths import cache
+
+
+def write_files(folder, number_of_files, size):
+    """Write cache files of the given size in bytes, from the oldest to the newest"""
+    filenames = []
+    for number in range(number_of_files):
+        filename = os.path.join(folder, f"{number}.pickle")
+        with open(filename, "wb") as file:
+            file.write(b"0" * size)
+        os.utime(filename, (number, number))
+        filenames.append(filename)
+    return filenames
+
+
+def test_trim_cache_keeps_newest_results(tmp_path):
+    """Oldest results are deleted until the cache is below the limit"""
+    filenames = write_files(tmp_path, 3, 400 * 1024)
+    cache.trim_cache(tmp_path, 1.0)
+    assert sorted(glob.glob(os.path.join(tmp_path, "*.pickle"))) == filenames[1:]
+
+
+def test_trim_cache_skips_vanished_files(tmp_path, monkeypatch):
+    """Files deleted by another simulation during trimming are skipped"""
+    filenames = write_files(tmp_path, 3, 400 * 1024)
+    missing = os.path.join(tmp_path, "missing.pickle")
+    monkeypatch.setattr(cache.glob, "glob", lambda pattern: filenames + [missing])
+    remove = os.remove
+
+    def remove_twice(filename):
+        """Another simulation deletes the file just before this one"""
+        remove(filename)
+        remove(filename)
+
+    monkeypatch.setattr(cache.os, "remove", remove_twice)
+    cache.trim_cache(tmp_path, 1.0)
+    assert not os.path.exists(filenames[0])
+    assert cache.load_cached_results(missing, {}) is False
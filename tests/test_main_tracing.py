@@ -0,0 +1,61 @@
+"""Tests of the main tracing mode"""
+
+import os
+import time
+
+import pytest
+import matplotlib.pyplot as plt
+
+from freepaths.config import Config
+import freepaths.checkpoint
+import freepaths.main_tracing
+
+
+def test_queued_files_are_written_after_interruption(tmp_path, monkeypatch):
+    """Checkpoints queued before an error are written into the results folder, not into the initial folder"""
+    monkeypatch.chdir(tmp_path)
+    cf = Config.from_dict({
+        "OUTPUT_FOLDER_NAME": "Interrupted",
+        "NUMBER_OF_PHONONS": 10,
+        "NUMBER_OF_TIMESTEPS": 100,
+        "CHECKPOINT_EVERY_N_PHONONS": 1,
+        "OUTPUT_TRAJECTORIES_OF_FIRST": 0,
+        "USE_RESULT_CACHE": False,
+    })
+    traced = []
+
+    def interrupted_run_phonon(*args):
+        """Trace a few phonons and then fail"""
+        if len(traced) == 3:
+            raise RuntimeError("Interrupted")
+        traced.append(args[1])
+
+    write_snapshot = freepaths.checkpoint.write_snapshot
+
+    def slow_write_snapshot(filename, snapshot):
+        """Write the checkpoint slowly, so that it is still queued when the error happens"""
+        time.sleep(0.2)
+        write_snapshot(filename, snapshot)
+
+    monkeypatch.setattr(freepaths.main_tracing, "run_phonon", interrupted_run_phonon)
+    monkeypatch.setattr(freepaths.checkpoint, "write_snapshot", slow_write_snapshot)
+    with pytest.raises(RuntimeError):
+        freepaths.main_tracing.main(cf)
+    assert os.getcwd() == str(tmp_path)
+    assert os.path.exists(os.path.join("Results", "Interrupted", "Data", "Checkpoint.pickle"))
+    assert not os.path.exists("Data")
+
+
+def test_figures_are_closed(tmp_path, monkeypatch):
+    """Figures are closed after plotting, so that they do not pile up in the workers of a sweep"""
+    monkeypatch.chdir(tmp_path)
+    cf = Config.from_dict({
+        "OUTPUT_FOLDER_NAME": "Figures",
+        "NUMBER_OF_PHONONS": 10,
+        "NUMBER_OF_TIMESTEPS": 300,
+        "T": 4.0,
+        "OUTPUT_TRAJECTORIES_OF_FIRST": 5,
+        "USE_RESULT_CACHE": False,
+    })
+    freepaths.main_tracing.main(cf)
+    assert plt.get_fignums() == []
@@ -0,0 +1,74 @@
+"""Tests of the Russian roulette"""
+
+import random
+
+import numpy as np
+
+from freepaths.config import Config
+from freepaths.materials import get_material
+from freepaths.phonon import PhononSource
+from freepaths.flight import Flight
+from freepaths.run_phonon import run_phonon
+from freepaths.data import ScatteringData, SegmentData
+from freepaths.maps import ScatteringMap, ThermalMaps
+
+# Long narrow wire, in which many phonons are still in the system at the roulette step:
+PARAMETERS = {
+    "NUMBER_OF_PHONONS": 300,
+    "NUMBER_OF_TIMESTEPS": 4000,
+    "T": 4.0,
+    "SPECIFIC_HEAT_CAPACITY": 0.0176,
+    "WIDTH": 100e-9,
+    "LENGTH": 2000e-9,
+    "PHONON_SOURCE_WIDTH_X": 100e-9,
+    "SIDE_WALL_ROUGHNESS": 5e-9,
+    "NUMBER_OF_PIXELS_X": 10,
+    "NUMBER_OF_PIXELS_Y": 20,
+    "OUTPUT_TRAJECTORIES_OF_FIRST": 0,
+}
+
+
+def trace(parameters):
+    """Trace phonons and return their weights, whether they reached the cold side, and their numbers of timesteps"""
+    cf = Config.from_dict(parameters)
+    material = get_material(cf.media)
+    source = PhononSource(cf, material)
+    scatter_stats, segment_stats = ScatteringData(cf), SegmentData(cf)
+    scatter_maps, thermal_maps = ScatteringMap(), ThermalMaps(cf)
+    random.seed(cf.random_seed)
+    weights = np.zeros(cf.number_of_phonons)
+    reached = np.zeros(cf.number_of_phonons, dtype=bool)
+    steps = np.zeros(cf.number_of_phonons, dtype=int)
+    for index in range(cf.number_of_phonons):
+        phonon = source.phonon(index)
+        flight = Flight(phonon)
+        steps[index] = run_phonon(cf, phonon, flight, scatter_stats, segment_stats, thermal_maps, scatter_maps, material)
+        weights[index] = phonon.weight
+        reached[index] = flight.exit_theta != 0
+    return weights, reached, steps
+
+
+def test_roulette_does_not_change_transmission():
+    """Weighted fraction of phonons reaching the cold side is the same with and without the roulette,
+    and each phonon plays the roulette at most once with the default threshold"""
+    weights, reached, _ = trace(dict(PARAMETERS, RANDOM_SEED=1))
+    roulette_weights, roulette_reached, _ = trace(dict(PARAMETERS, RANDOM_SEED=2, ROULETTE_STEPS=[300, 600, 900],
+                                                    ROULETTE_SURVIVAL_PROBABILITY=0.5))
+    assert np.count_nonzero(roulette_weights == 0) > 0
+    assert set(np.unique(roulette_weights)) <= {0.0, 1.0, 2.0}
+
+    tallies = weights * reached
+    roulette_tallies = roulette_weights * roulette_reached
+    difference = abs(np.mean(tallies) - np.mean(roulette_tallies))
+    standard_error = np.sqrt(np.var(tallies, ddof=1) / tallies.size + np.var(roulette_tallies, ddof=1) / roulette_tallies.size)
+    assert difference < 4 * standard_error
+
+
+def test_number_of_traced_timesteps():
+    """Phonons are traced until they reach the cold side, are stopped by the roulette, or run out of timesteps"""
+    parameters = dict(PARAMETERS, NUMBER_OF_PHONONS=100, NUMBER_OF_TIMESTEPS=1000, RANDOM_SEED=3,
+                      ROULETTE_STEPS=[300, 600, 900], ROULETTE_SURVIVAL_PROBABILITY=0.5)
+    weights, reached, steps = trace(parameters)
+    assert np.all(np.isin(steps[weights == 0], parameters["ROULETTE_STEPS"]))
+    assert np.all(steps[reached] < parameters["NUMBER_OF_TIMESTEPS"])
+    assert np.all(steps[(weights > 0) & ~reached] == parameters["NUMBER_OF_TIMESTEPS"])
@@ -0,0 +1,40 @@
+"""Tests of parameters overwritten by sweeps"""
+
+import os
+
+import numpy as np
+
+from freepaths.config import Config
+from freepaths.sweep import read_sweep_file, sweep_points
+
+EXAMPLES_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "examples")
+
+
+def test_derived_parameter_follows_sweep():
+    """Parameters derived from a swept parameter in the input file take its new value"""
+    cf = Config.from_file(os.path.join(EXAMPLES_FOLDER, "simple_nanowire.py"), {"WIDTH": 5e-7})
+    assert cf.width == 5e-7
+    assert cf.phonon_source_width_x == 5e-7
+
+
+def test_hole_lattice_follows_swept_period():
+    """Hole coordinates calculated from a swept period use the new period"""
+    cf = Config.from_file(os.path.join(EXAMPLES_FOLDER, "phononic_crystal.py"), {"PERIOD_X": 350e-9})
+    assert np.allclose(np.diff(cf.hole_coordinates[:5, 0]), 350e-9)
+
+
+def test_input_file_does_not_modify_user_values():
+    """The input file works on a copy of the values given by the user"""
+    shapes = ["arccircle_v"] * 30
+    cf = Config.from_file(os.path.join(EXAMPLES_FOLDER, "phononic_crystal.py"), {"HOLE_SHAPES": shapes})
+    assert cf.hole_shapes == shapes
+    assert shapes == ["arccircle_v"] * 30
+
+
+def test_parameters_swept_together():
+    """Temperature and specific heat capacity of the example sweep change together"""
+    sweep = read_sweep_file(os.path.join(EXAMPLES_FOLDER, "sweep_temperature_and_width.py"))
+    points = sweep_points(sweep)
+    assert len(points) == 6
+    assert {(point["T"], point["SPECIFIC_HEAT_CAPACITY"]) for point in points} == {(4, 0.0176), (10, 0.275), (300, 714)}
+    assert all(set(point) == {"T", "SPECIFIC_HEAT_CAPACITY", "WIDTH"} for point in points)
@@ -0,0 +1,52 @@
+"""Tests of confidence intervals of the simulation results"""
+
+import os
+
+import numpy as np
+import pytest
+
+from freepaths.config import Config
+from freepaths.uncertainty import RatioOfSums
+import freepaths.main_tracing
+
+
+def test_ratio_of_sums_interval():
+    """Interval is centred on the ratio of the totals and covers the true ratio at the confidence level"""
+    generator = np.random.default_rng(1)
+    covered = 0
+    for _ in range(1000):
+        ratio_of_sums = RatioOfSums()
+        for _ in range(10):
+            denominator = generator.exponential(1.0)
+            ratio_of_sums.add(2.0 * denominator + generator.normal(0.0, 0.5), denominator)
+        ratio, half_width = ratio_of_sums.interval(0.95)
+        x, y = ratio_of_sums.sums[:2]
+        assert ratio == pytest.approx(x / y)
+        covered += abs(ratio - 2.0) <= half_width
+    assert 0.92 <= covered / 1000 <= 0.97
+
+
+def test_reported_conductivity_equals_file(tmp_path, monkeypatch):
+    """Thermal conductivity with its interval is the one written into the Thermal conductivity.csv file"""
+    monkeypatch.chdir(tmp_path)
+    cf = Config.from_dict({
+        "OUTPUT_FOLDER_NAME": "Nanowire",
+        "NUMBER_OF_PHONONS": 60,
+        "PRECISION_BATCH_SIZE": 20,
+        "NUMBER_OF_TIMESTEPS": 3000,
+        "TIMESTEP": 1e-12,
+        "T": 4.0,
+        "SPECIFIC_HEAT_CAPACITY": 0.0176,
+        "WIDTH": 200e-9,
+        "LENGTH": 1000e-9,
+        "PHONON_SOURCE_WIDTH_X": 200e-9,
+        "NUMBER_OF_PIXELS_X": 20,
+        "NUMBER_OF_PIXELS_Y": 50,
+        "OUTPUT_TRAJECTORIES_OF_FIRST": 5,
+        "RANDOM_SEED": 1,
+        "USE_RESULT_CACHE": False,
+    })
+    summary = freepaths.main_tracing.main(cf)
+    data = np.loadtxt(os.path.join("Results", "Nanowire", "Data", "Thermal conductivity.csv"), delimiter=",")
+    assert summary["Thermal conductivity (W/mK)"] == pytest.approx(data[-1, 1], rel=1e-3)
+    assert np.isfinite(summary["Thermal conductivity error (W/mK)"])